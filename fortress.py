@@ -5,16 +5,13 @@ import os
 # This is useful if you run fortress.py from elsewhere, though you typically run it from its dir
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Import functions from your individual modules
-# We'll import only the main function from each for cleaner execution
+# Only the small helper modules are imported up front. Each tool module (and
+# requests, asyncio, ... behind them) is imported when its menu option is
+# first used, and not at all when a running fortress daemon does the work,
+# so the menu and `fortress.py <tool> ...` start almost instantly.
 try:
-    from fortress_pinger import ping_host
-    from fortress_scanner import scan_ports
-    from fortress_webinfo import get_web_info
-    from fortress_subenum import enumerate_subdomains, load_wordlist as load_subdomain_wordlist # Rename to avoid conflict
-    from fortress_dirbuster import check_paths, load_wordlist as load_path_wordlist # Rename to avoid conflict
-    from fortress_geolocate import geolocate_ip
-    from fortress_bannergrab import grab_banner # NEW IMPORT
+    from fortress_journal import Journal, journal_path
+    from fortress_daemon import TOOLS, daemon_running, run_remote, run_tool
 except ImportError as e:
     print(f"[!] Error importing a module: {e}")
     print("[!] Please ensure all 'fortress_*.py' files are in the same directory.")
@@ -35,122 +32,232 @@ def display_menu():
     print("5. Basic Directory/File Existence Check (with wordlist)")
     print("6. Banner Grabbing") # NEW OPTION
     print("7. IP Geolocation Lookup") # CORRECTED TYPO AND NUMBER
+    print("8. Full Recon Pipeline (enumerate -> scan -> banners/web/TLS -> geolocate)")
     print("0. Exit")
     print("="*50)
 
+def offer_resume(path):
+    """
+    Asks whether to resume if an earlier run left a progress journal at path.
+    """
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        answer = input("[?] A previous run with these settings was found. Resume it? (y/n): ").strip().lower()
+        return answer in ("y", "yes")
+    return False
+
+def open_journal(tool, *params):
+    """
+    Opens the progress journal for a tool run, offering to resume if an
+    earlier run with the same settings left one behind.
+    """
+    path = journal_path(tool, *params)
+    return Journal(path, resume=offer_resume(path))
+
+def delegate(tool, argv, journal=None):
+    """
+    Runs the job in the fortress daemon if one is running (see
+    fortress_daemon.py). Returns False if there is none, so the caller
+    runs the job itself. `journal` is the (tool, *params) key of the
+    progress journal the menu would keep; the daemon job is pointed at the
+    same one (and resumes it if the user wants to).
+    """
+    if not daemon_running():
+        return False
+    if journal:
+        path = journal_path(*journal)
+        argv = argv + ["--journal", path] + (["--resume"] if offer_resume(path) else [])
+    try:
+        run_remote(tool, argv)
+    except OSError:
+        return False
+    return True
+
 def main():
     """Main function to run the Tech Fortress toolkit."""
     while True:
         display_menu()
-        choice = input("Enter your choice (0-7): ").strip() # UPDATED RANGE
+        choice = input("Enter your choice (0-8): ").strip() # UPDATED RANGE
 
-        if choice == '1':
-            print("\n--- Host Discovery (Ping) ---")
-            target = input("Enter target IP or hostname: ").strip()
-            if target:
-                ping_host(target)
-            else:
-                print("[!] No target entered.")
-
-        elif choice == '2':
-            print("\n--- Port Scanning ---")
-            target = input("Enter target IP or hostname: ").strip()
-            if target:
-                print("Scanning common ports (20-1024)...")
-                scan_ports(target, range(20, 1025))
-            else:
-                print("[!] No target entered.")
+        journal = None # Progress journal of the current tool run, if it keeps one
+        try:
+            if choice == '1':
+                print("\n--- Host Discovery (Ping) ---")
+                target = input("Enter target IP, hostname, CIDR (e.g., 192.168.1.0/24) or range: ").strip()
+                if not target:
+                    print("[!] No target entered.")
+                    continue
+                from fortress_targets import HostSpace
+                try:
+                    is_sweep = len(HostSpace.parse(target)) > 1
+                except ValueError as e:
+                    print(f"[!] Invalid target: {e}")
+                    continue
+                from fortress_pinger import ping_host, sweep
+                if is_sweep:
+                    sweep(target)
+                else:
+                    ping_host(target)
 
-        elif choice == '3':
-            print("\n--- Basic Web Info Gathering ---")
-            target_url = input("Enter target URL (e.g., http://example.com/): ").strip()
-            if target_url:
-                get_web_info(target_url)
-            else:
-                print("[!] No URL entered.")
-
-        elif choice == '4':
-            print("\n--- Simple Subdomain Enumeration ---")
-            target_domain = input("Enter target domain (e.g., example.com): ").strip()
-            if not target_domain:
-                print("[!] No domain entered.")
-                continue
-
-            default_sub_wordlist = "/usr/share/wordlists/seclists/Discovery/DNS/subdomains-top1million-5000.txt"
-            if not os.path.exists(default_sub_wordlist):
-                print(f"[!] Warning: Default subdomain wordlist not found at '{default_sub_wordlist}'.")
-                print("    Please ensure 'seclists' is installed or manually provide a path.")
-                wordlist_path = input("Enter path to subdomain wordlist (or press Enter for default if installed): ").strip()
-                if not wordlist_path: wordlist_path = default_sub_wordlist
-            else:
-                wordlist_path = default_sub_wordlist
+            elif choice == '2':
+                print("\n--- Port Scanning ---")
+                target = input("Enter target IP or hostname: ").strip()
+                if target:
+                    print("Scanning the 1000 most common ports, most likely first...")
+                    if delegate("scan", ["-t", target, "--top-ports", "1000", "--async"], ("scan", target, "top1000")):
+                        continue
+                    from fortress_targets import top_ports
+                    from fortress_scanner import scan_ports
+                    journal = open_journal("scan", target, "top1000")
+                    scan_ports(target, top_ports(1000), engine="async", journal=journal)
+                else:
+                    print("[!] No target entered.")
 
-            if os.path.exists(wordlist_path):
-                subdomains_to_check = load_subdomain_wordlist(wordlist_path)
-                if subdomains_to_check:
-                    enumerate_subdomains(target_domain, subdomains_to_check)
+            elif choice == '3':
+                print("\n--- Basic Web Info Gathering ---")
+                target_url = input("Enter target URL (e.g., http://example.com/, or several separated by commas): ").strip()
+                if not target_url:
+                    print("[!] No URL entered.")
+                    continue
+                from fortress_webinfo import get_web_info, iter_web_info, report_web_info
+                if "," in target_url or " " in target_url:
+                    urls = [url for url in target_url.replace(",", " ").split() if url]
+                    for url, result in iter_web_info(urls):
+                        report_web_info(url, result)
                 else:
-                    print("[!] Wordlist could not be loaded or is empty.")
-            else:
-                print(f"[!] Subdomain wordlist not found at '{wordlist_path}'.")
-
-        elif choice == '5':
-            print("\n--- Basic Directory/File Existence Check ---")
-            target_url = input("Enter target base URL (e.g., http://example.com/): ").strip()
-            if not target_url:
-                print("[!] No URL entered.")
-                continue # CORRECTED: Added continue here for empty URL
-
-            # Moved this entire block INSIDE choice '5'
-            default_dir_wordlist = "/usr/share/wordlists/seclists/Discovery/Web-Content/common.txt"
-            if not os.path.exists(default_dir_wordlist):
-                print(f"[!] Warning: Default directory/file wordlist not found at '{default_dir_wordlist}'.")
-                print("    Please ensure 'seclists' is installed or manually provide a path.")
-                wordlist_path = input("Enter path to dir/file wordlist (or press Enter for default if installed): ").strip()
-                if not wordlist_path: wordlist_path = default_dir_wordlist
-            else:
-                wordlist_path = default_dir_wordlist
+                    get_web_info(target_url)
 
-            if os.path.exists(wordlist_path):
-                paths_to_check = load_path_wordlist(wordlist_path)
-                if paths_to_check:
-                    check_paths(target_url, paths_to_check)
+            elif choice == '4':
+                print("\n--- Simple Subdomain Enumeration ---")
+                target_domain = input("Enter target domain (e.g., example.com): ").strip()
+                if not target_domain:
+                    print("[!] No domain entered.")
+                    continue
+
+                default_sub_wordlist = "/usr/share/wordlists/seclists/Discovery/DNS/subdomains-top1million-5000.txt"
+                if not os.path.exists(default_sub_wordlist):
+                    print(f"[!] Warning: Default subdomain wordlist not found at '{default_sub_wordlist}'.")
+                    print("    Please ensure 'seclists' is installed or manually provide a path.")
+                    wordlist_path = input("Enter path to subdomain wordlist (or press Enter for default if installed): ").strip()
+                    if not wordlist_path: wordlist_path = default_sub_wordlist
                 else:
-                    print("[!] Wordlist could not be loaded or is empty.")
-            else:
-                print(f"[!] Directory/file wordlist not found at '{wordlist_path}'.")
-
-
-        elif choice == '6':
-            print("\n--- Banner Grabbing ---")
-            target = input("Enter target IP or hostname (e.g., example.com): ").strip()
-            if not target:
-                print("[!] No target entered.")
-                continue
-            try:
-                port = int(input("Enter target port number (e.g., 80, 22): ").strip())
-                if not (0 < port <= 65535):
-                    print("[!] Invalid port number. Port must be between 1 and 65535.")
+                    wordlist_path = default_sub_wordlist
+
+                if os.path.exists(wordlist_path):
+                    wordlist_path = os.path.abspath(wordlist_path)
+                    if delegate("enum", ["-d", target_domain, "-w", wordlist_path], ("subenum", target_domain, wordlist_path, ("A",))):
+                        continue
+                    from fortress_subenum import enumerate_subdomains, load_wordlist as load_subdomain_wordlist # Rename to avoid conflict
+                    subdomains_to_check = load_subdomain_wordlist(wordlist_path)
+                    if subdomains_to_check:
+                        journal = open_journal("subenum", target_domain, os.path.abspath(wordlist_path), ("A",))
+                        enumerate_subdomains(target_domain, subdomains_to_check, journal=journal)
+                    else:
+                        print("[!] Wordlist could not be loaded or is empty.")
+                else:
+                    print(f"[!] Subdomain wordlist not found at '{wordlist_path}'.")
+
+            elif choice == '5':
+                print("\n--- Basic Directory/File Existence Check ---")
+                target_url = input("Enter target base URL (e.g., http://example.com/): ").strip()
+                if not target_url:
+                    print("[!] No URL entered.")
+                    continue # CORRECTED: Added continue here for empty URL
+
+                # Moved this entire block INSIDE choice '5'
+                default_dir_wordlist = "/usr/share/wordlists/seclists/Discovery/Web-Content/common.txt"
+                if not os.path.exists(default_dir_wordlist):
+                    print(f"[!] Warning: Default directory/file wordlist not found at '{default_dir_wordlist}'.")
+                    print("    Please ensure 'seclists' is installed or manually provide a path.")
+                    wordlist_path = input("Enter path to dir/file wordlist (or press Enter for default if installed): ").strip()
+                    if not wordlist_path: wordlist_path = default_dir_wordlist
+                else:
+                    wordlist_path = default_dir_wordlist
+
+                if os.path.exists(wordlist_path):
+                    wordlist_path = os.path.abspath(wordlist_path)
+                    if delegate("dirbust", ["-u", target_url, "-w", wordlist_path], ("dirbuster", target_url, wordlist_path, [], 0)):
+                        continue
+                    from fortress_dirbuster import check_paths, load_wordlist as load_path_wordlist # Rename to avoid conflict
+                    paths_to_check = load_path_wordlist(wordlist_path)
+                    if paths_to_check:
+                        journal = open_journal("dirbuster", target_url, os.path.abspath(wordlist_path), [], 0)
+                        check_paths(target_url, paths_to_check, journal=journal)
+                    else:
+                        print("[!] Wordlist could not be loaded or is empty.")
+                else:
+                    print(f"[!] Directory/file wordlist not found at '{wordlist_path}'.")
+
+
+            elif choice == '6':
+                print("\n--- Banner Grabbing ---")
+                target = input("Enter target IP or hostname (e.g., example.com): ").strip()
+                if not target:
+                    print("[!] No target entered.")
                     continue
-            except ValueError:
-                print("[!] Invalid port number. Please enter an integer.")
-                continue # CORRECTED: Indentation for this continue
-            grab_banner(target, port) # This will now be reached
-
-        elif choice == '7':
-            print("\n--- IP Geolocation Lookup ---")
-            target_ip = input("Enter target IP address (e.g., 8.8.8.8): ").strip()
-            if target_ip:
-                geolocate_ip(target_ip)
-            else:
-                print("[!] No IP address entered.")
+                try:
+                    port = int(input("Enter target port number (e.g., 80, 22): ").strip())
+                    if not (0 < port <= 65535):
+                        print("[!] Invalid port number. Port must be between 1 and 65535.")
+                        continue
+                except ValueError:
+                    print("[!] Invalid port number. Please enter an integer.")
+                    continue # CORRECTED: Indentation for this continue
+                if delegate("banner", ["-t", target, "-p", str(port)]):
+                    continue
+                from fortress_bannergrab import grab_banner
+                grab_banner(target, port) # This will now be reached
 
-        elif choice == '0':
-            print("\nExiting Tech Fortress. Stay safe and ethical, comrade!")
-            sys.exit(0)
+            elif choice == '7':
+                print("\n--- IP Geolocation Lookup ---")
+                target_ip = input("Enter target IP address (e.g., 8.8.8.8, or several separated by commas): ").strip()
+                if not target_ip:
+                    print("[!] No IP address entered.")
+                    continue
+                ips = [ip for ip in target_ip.replace(",", " ").split() if ip]
+                if delegate("geo", ips):
+                    continue
+                from fortress_geolocate import geolocate_ip, geolocate_many, report_geolocation
+                if len(ips) > 1:
+                    for ip, data in geolocate_many(ips).items():
+                        report_geolocation(ip, data)
+                else:
+                    geolocate_ip(target_ip)
 
-        else:
-            print("[!] Invalid choice. Please enter a number between 0 and 7.") # UPDATED RANGE
+            elif choice == '8':
+                print("\n--- Full Recon Pipeline ---")
+                targets = input("Enter targets or a target file (default: target.txt): ").strip() or "target.txt"
+                wordlist = input("Subdomain wordlist to enumerate with (leave empty to skip): ").strip() or None
+                if wordlist and not os.path.isfile(wordlist):
+                    print(f"[!] Error: Wordlist file not found at '{wordlist}'.")
+                    continue
+                if delegate("pipeline", targets.replace(",", " ").split() + (["-w", wordlist] if wordlist else [])):
+                    continue
+                from fortress_pipeline import run_pipeline
+                run_pipeline(targets.replace(",", " ").split(), wordlist=wordlist).print_summary()
+
+            elif choice == '0':
+                print("\nExiting Tech Fortress. Stay safe and ethical, comrade!")
+                sys.exit(0)
+
+            else:
+                print("[!] Invalid choice. Please enter a number between 0 and 8.") # UPDATED RANGE
+        except ImportError as e:
+            print(f"[!] Error importing a module: {e}")
+        except KeyboardInterrupt:
+            if journal:
+                print("\n[!] Interrupted. Progress is saved; choose the same options again to resume.")
+            else:
+                print("\n[!] Interrupted.")
+        finally:
+            if journal:
+                journal.close()
 
 if __name__ == "__main__":
+    # `fortress.py --batch [targets...] [options]` runs the recon pipeline without the menu,
+    # `fortress.py scan|enum|dirbust|banner|geo|store [options]` runs one tool; both go
+    # through the fortress daemon if one is running
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        sys.exit(run_tool("pipeline", sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] in TOOLS:
+        sys.exit(run_tool(sys.argv[1], sys.argv[2:]))
     main()
@@ -1,46 +1,106 @@
 import socket
 import sys
+import time
+import asyncio
 import argparse
 
-def grab_banner(target_host, target_port, timeout=5):
+from fortress_cache import resolve
+from fortress_scheduler import get_scheduler, stream_map, stream_map_async
+from fortress_targets import parse_targets, parse_ports
+from fortress_probes import ProbeDatabase, ProbeFileError, get_database, describe
+from fortress_sink import emit, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import get_metrics, add_metrics_arguments, start_from_args as start_metrics
+
+LISTEN_TIMEOUT = 2 # How long a listen-only probe waits for a service to speak first
+
+metrics = get_metrics("banner") # Exchange counters and latency (see fortress_metrics)
+
+def probe_payload(target_host, target_port, database=None):
+    """
+    What to send right after connecting: the payload of the most likely probe
+    for the port in the service probe database. None means just listen.
+    """
+    probe = (database or get_database()).probes_for(target_port)[0]
+    return probe.payload_for(target_host) or None
+
+def read_until_idle(sock, timeout=5, idle=0.5, max_bytes=4096):
     """
-    Attempts to grab a banner from the specified host and port.
+    Reads from a connected socket until the peer goes quiet for `idle` seconds
+    (after the first data, which may take up to `timeout`), closes, or
+    `max_bytes` have arrived. Returns the bytes read.
+    """
+    data = bytearray()
+    wait = timeout
+    while len(data) < max_bytes:
+        sock.settimeout(wait)
+        try:
+            chunk = sock.recv(max_bytes - len(data))
+        except socket.timeout:
+            break
+        if not chunk:
+            break
+        data += chunk
+        wait = idle # Once it talks, a short silence means it is done
+    if not data and wait == timeout:
+        raise socket.timeout("no data received")
+    return bytes(data)
+
+def grab_banner(target_host, target_port, timeout=5, database=None, max_probes=3):
+    """
+    Attempts to grab a banner from the specified host and port and identify
+    the service behind it. Probes from the service probe database are tried
+    most likely first (one connection each) until one is recognised.
+    Returns the match dict (see ProbeDatabase.match) or None.
     """
     print(f"\n[*] Attempting banner grab for {target_host} on port {target_port}...")
+    database = database or get_database()
     try:
-        # Create a socket object
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout) # Set a timeout for connection and data reception
-
-        # Connect to the target
-        sock.connect((target_host, target_port))
-
-        # For HTTP, send a simple GET request to provoke a response
-        # For other services, simply receiving data often works
-        if target_port == 80 or target_port == 443: # Common web ports
-            # Basic HTTP GET request
-            sock.sendall(b"GET / HTTP/1.1\r\nHost: " + target_host.encode() + b"\r\n\r\n")
-        elif target_port == 21: # FTP
-            # A simple FTP request might get a banner
-            sock.sendall(b"HELP\r\n")
-        elif target_port == 25 or target_port == 587: # SMTP
-            # SMTP requires HELO/EHLO
-            sock.sendall(b"EHLO test.com\r\n")
-        elif target_port == 23: # Telnet
-            # Just connect and wait
-            pass # No initial send for telnet usually
-
-        # Receive data (banner)
-        banner = sock.recv(1024).decode('utf-8', errors='ignore').strip() # Read up to 1024 bytes
-
-        if banner:
+        # Resolve through the shared cache so repeated grabs don't repeat lookups
+        target_ip = resolve(target_host)
+
+        banner = b""
+        match = None
+        for attempt, probe in enumerate(database.probes_for(target_port)[:max_probes]):
+            # Create a socket object
+            sock = socket.socket(socket.AF_INET6 if ":" in target_ip else socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(timeout) # Set a timeout for connection and data reception
+            try:
+                # Connect to the target
+                sock.connect((target_ip, target_port))
+                payload = probe.payload_for(target_host)
+                if payload:
+                    sock.sendall(payload)
+                # Receive data (banner) until the service goes quiet
+                try:
+                    data = read_until_idle(sock, timeout if payload else min(timeout, LISTEN_TIMEOUT))
+                except socket.timeout:
+                    data = b""
+            except OSError:
+                if attempt == 0:
+                    raise # Could not connect at all; reported below
+                break
+            finally:
+                sock.close()
+            result = database.match(probe, data) if data else None
+            if result and not result.get("soft"):
+                database.record_hit(target_port, probe)
+                banner, match = data, result
+                break
+            banner = banner or data
+            match = match or result
+
+        text = banner.decode('utf-8', errors='ignore').strip()
+        if text:
             print(f"[+] Banner received from {target_host}:{target_port}:")
-            for line in banner.splitlines():
+            for line in text.splitlines():
                 print(f"    {line}")
         else:
             print(f"[-] No banner received from {target_host}:{target_port}.")
-
-        sock.close()
+        if match:
+            print(f"[+] Service: {describe(match)}")
+        if text or match:
+            emit("banner", None, host=target_host, port=target_port, banner=text, service=match)
+        return match
 
     except socket.timeout:
         print(f"[!] Timeout: Could not connect or receive data from {target_host}:{target_port}.")
@@ -53,20 +113,215 @@ def grab_banner(target_host, target_port, timeout=5):
     except Exception as e:
         print(f"[!] An unexpected error occurred: {e}")
 
-if __name__ == "__main__":
+async def _exchange_async(ip, port, payload, first_wait, idle, max_bytes, deadline, connect_timeout):
+    # One connection: connect, send the payload, read until idle/cap/deadline.
+    # Connection failures raise; anything after that returns what was read.
+    loop = asyncio.get_running_loop()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), connect_timeout)
+    data = bytearray()
+    try:
+        if payload:
+            writer.write(payload)
+        wait = first_wait
+        while len(data) < max_bytes:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                chunk = await asyncio.wait_for(reader.read(max_bytes - len(data)), min(wait, remaining))
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            data += chunk
+            wait = idle
+    except OSError:
+        pass # Reset mid-answer; keep what arrived
+    finally:
+        writer.close()
+    return bytes(data)
+
+async def _grab_async(host, port, timeout, idle, max_bytes, max_time, scheduler, database, max_probes):
+    # Tries probes most likely first until one answer is recognised
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_time
+    try:
+        ip = await loop.run_in_executor(None, resolve, host) if not _is_address(host) else host
+    except (socket.gaierror, UnicodeError):
+        return host, port, None, "could not resolve", None
+    banner = b""
+    match = None
+    for attempt, probe in enumerate(database.probes_for(port)[:max_probes]):
+        if loop.time() >= deadline:
+            break
+        if scheduler:
+            await scheduler.throttle(ip)
+        payload = probe.payload_for(host)
+        metrics.begin()
+        started = loop.time()
+        try:
+            data = await _exchange_async(ip, port, payload, timeout if payload else min(timeout, LISTEN_TIMEOUT),
+                                         idle, max_bytes, deadline, timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            metrics.end("timeout" if isinstance(e, asyncio.TimeoutError) else
+                        "refused" if isinstance(e, ConnectionRefusedError) else "error")
+            if attempt:
+                break # It answered before; keep what we have
+            if isinstance(e, asyncio.TimeoutError):
+                return host, port, None, "connect timed out", None
+            if isinstance(e, ConnectionRefusedError):
+                return host, port, None, "connection refused", None
+            return host, port, None, e.strerror or str(e), None
+        except (ValueError, OverflowError, UnicodeError) as e:
+            # Bad address, port or host name for the probe payload
+            metrics.end("error")
+            if attempt:
+                break
+            return host, port, None, str(e) or type(e).__name__, None
+        metrics.end("answer" if data else "silent", loop.time() - started)
+        result = database.match(probe, data) if data else None
+        if result and not result.get("soft"):
+            database.record_hit(port, probe)
+            return host, port, data, None, result
+        banner = banner or data
+        match = match or result
+    return host, port, banner, None, match
+
+def _is_address(host):
+    try:
+        socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+        return True
+    except OSError:
+        return False
+
+def _grabber(timeout, idle, max_bytes, max_time, scheduler, database, max_probes):
+    # The per-pair coroutine function shared by the async and blocking grabs
+    scheduler = scheduler or get_scheduler()
+    database = database or get_database()
+
+    async def grab(pair):
+        host, port = pair
+        return await _grab_async(host, int(port), timeout, idle, max_bytes, max_time, scheduler, database, max_probes)
+
+    return grab
+
+async def grab_banners_async(pairs, concurrency=200, timeout=5, idle=0.5, max_bytes=4096, max_time=15, scheduler=None,
+                             database=None, max_probes=3):
+    """
+    Async generator grabbing banners from many (host, port) pairs with up to
+    `concurrency` connections in flight on one event loop. Each connection is
+    read until the service is quiet for `idle` seconds (the first data may take
+    up to `timeout`), closes, sends `max_bytes`, or `max_time` passes. Up to
+    `max_probes` probes from the service probe database are tried per port,
+    most likely first, until the service is identified.
+
+    `pairs` may be any iterable, including a slow or blocking one such as a
+    generator fed by a running scan; it is consumed from a helper thread.
+    Yields (host, port, banner bytes or None, error message or None, match
+    dict or None) as each grab completes.
+    """
+    grab = _grabber(timeout, idle, max_bytes, max_time, scheduler, database, max_probes)
+    async for result in stream_map_async(pairs, concurrency, grab):
+        yield result
+
+def grab_banners(pairs, concurrency=200, timeout=5, idle=0.5, max_bytes=4096, max_time=15, scheduler=None,
+                 database=None, max_probes=3):
+    """
+    Blocking generator around grab_banners_async: runs the event loop in a
+    background thread and yields (host, port, banner, error, match) as grabs
+    finish.
+    """
+    return stream_map(pairs, concurrency, _grabber(timeout, idle, max_bytes, max_time, scheduler, database, max_probes))
+
+def report_banner(host, port, banner, error, match=None):
+    """
+    Reports one bulk grab result. Returns True if a banner was received.
+    """
+    if error:
+        emit("banner", f"[-] {host}:{port}: {error}", host=host, port=port, error=error)
+        return False
+    service = f" [{describe(match)}]" if match else ""
+    text = banner.decode('utf-8', errors='ignore').strip()
+    if not text:
+        emit("banner", f"[-] {host}:{port}{service}: no banner", host=host, port=port, banner="", service=match)
+        return False
+    lines = [line if len(line) <= 200 else line[:200] + "..." for line in text.splitlines()]
+    message = "\n".join([f"[+] {host}:{port}{service}: {lines[0]}"] + [f"    {line}" for line in lines[1:]])
+    emit("banner", message, host=host, port=port, banner=text, service=match)
+    return True
+
+def read_pairs(stream):
+    """
+    Yields (host, port) from lines like "host:port", "host port" or the
+    scanner's "[+] 10.0.0.5:22 is OPEN", skipping anything else (including
+    ports outside 1-65535). Lines are handled as they arrive, so scanner
+    output can be piped straight in.
+    """
+    for line in stream:
+        words = line.replace("[+]", " ").split()
+        if len(words) >= 2 and words[1].isdigit():
+            host, port = words[0], words[1]
+        elif words and words[0].rpartition(":")[2].isdigit():
+            host, _, port = words[0].rpartition(":")
+            host = host.strip("[]")
+        else:
+            continue
+        if 0 < int(port) <= 65535:
+            yield host, int(port)
+
+def main(argv=None):
+    """
+    Command-line entry point (also used by the fortress daemon).
+    """
     print("--- Tech Fortress Banner Grabbing Module ---")
     print("This tool attempts to retrieve service banners from specified ports.")
 
     parser = argparse.ArgumentParser(description="Banner Grabbing Tool.")
-    parser.add_argument("-t", "--target", help="Target IP address or hostname (e.g., example.com or 192.168.1.1)", required=True)
-    parser.add_argument("-p", "--port", type=int, help="Target port number (e.g., 80, 22, 21)", required=True)
-    parser.add_argument("--timeout", type=int, default=5, help="Connection and reception timeout in seconds (default: 5)")
+    parser.add_argument("-t", "--target", help="Target IP/hostname, CIDR, IP range or target file (e.g., example.com or 192.168.1.0/24)")
+    parser.add_argument("-p", "--port", help="Target port(s) (e.g., 80, 22,80,443 or 1-1024)")
+    parser.add_argument("-i", "--input", help="Read host:port pairs from a file, or '-' for stdin (e.g., piped scanner output)")
+    parser.add_argument("--timeout", type=float, default=5, help="Connection and first-data timeout in seconds (default: 5)")
+    parser.add_argument("--idle", type=float, default=0.5, help="Stop reading after this many quiet seconds (default: 0.5)")
+    parser.add_argument("--max-bytes", type=int, default=4096, help="Most bytes to read per banner (default: 4096)")
+    parser.add_argument("-c", "--concurrency", type=int, default=200, help="Connections in flight for bulk grabs (default: 200)")
+    parser.add_argument("--probes", help="Service probe database (default: fortress-service-probes.txt next to this script)")
+    parser.add_argument("--max-probes", type=int, default=3, help="Most probes to try per port (default: 3)")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+    start_metrics(args)
 
-    if not (0 < args.port <= 65535):
-        print("[!] Invalid port number. Port must be between 1 and 65535.")
+    try:
+        database = ProbeDatabase.load(args.probes) if args.probes else get_database()
+    except (OSError, ProbeFileError) as e:
+        print(f"[!] Could not load probe database: {e}")
         sys.exit(1)
 
-    grab_banner(args.target, args.port, args.timeout)
+    if args.input:
+        stream = sys.stdin if args.input == "-" else open(args.input, "r")
+        pairs = read_pairs(stream)
+    elif args.target and args.port:
+        hosts = parse_targets(args.target)
+        ports = parse_ports(args.port)
+        if len(hosts) == 1 and len(ports) == 1:
+            grab_banner(args.target, ports.port_at(0), args.timeout, database, args.max_probes)
+            print("\n" + "="*50 + "\n")
+            sys.exit(0)
+        pairs = ((host, port) for host in hosts for port in ports)
+    else:
+        parser.error("give -t and -p, or -i")
+
+    started = time.monotonic()
+    grabbed = total = 0
+    for result in grab_banners(pairs, args.concurrency, args.timeout, args.idle, args.max_bytes,
+                               database=database, max_probes=args.max_probes):
+        total += 1
+        grabbed += report_banner(*result)
+    flush_results()
+    print(f"\n[*] Received {grabbed} banners from {total} services in {time.monotonic() - started:.1f}s.")
     print("\n" + "="*50 + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from contextlib import redirect_stdout
+
+try:
+    import resource # Unix only; peak RSS and the open-file limit
+except ImportError:
+    resource = None
+
+# Names, paths and IPs starting with HIT exist on the stand-ins; everything
+# else is a miss (NXDOMAIN, 404, ...). Every HIT_EVERY-th generated word is a hit.
+HIT = "hit"
+HIT_EVERY = 10
+
+BANNER = b"SSH-2.0-OpenSSH_9.6 bench\r\n"
+
+# ---------------------------------------------------------------------------
+# Local stand-ins (run in their own process, see StandIns)
+# ---------------------------------------------------------------------------
+
+async def _close_at_once(reader, writer):
+    writer.close()
+
+def _banner_handler(delay):
+    async def handle(reader, writer):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(BANNER)
+            await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+    return handle
+
+def _geo_answer(ip):
+    return {"status": "success", "query": ip, "country": "Benchland", "countryCode": "BL",
+            "city": "Bench " + ip.rsplit(".", 1)[-1], "as": "AS64500 Bench"}
+
+def _http_handler(latency, soft_404):
+    # A small keep-alive HTTP/1.1 server: HIT paths answer 200 with a title,
+    # the rest 404 (or a soft 404: 200 with the path echoed back), and POST
+    # /batch answers like the ip-api.com batch endpoint.
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+                length = int(headers.get("Content-Length", headers.get("content-length", 0)))
+                body = await reader.readexactly(length) if length else b""
+                if latency:
+                    await asyncio.sleep(latency)
+                status = "200 OK"
+                content_type = "text/html"
+                if method == "POST" and path.startswith("/batch"):
+                    queries = json.loads(body or b"[]")
+                    payload = json.dumps([_geo_answer(q["query"] if isinstance(q, dict) else q) for q in queries]).encode()
+                    content_type = "application/json"
+                elif path.lstrip("/").startswith(HIT) or path == "/":
+                    payload = b"<html><head><title>Bench page</title></head><body>" + b"x" * 2048 + b"</body></html>"
+                elif soft_404:
+                    payload = b"<html><head><title>Not here</title></head><body>No page " + path.encode() + b"</body></html>"
+                else:
+                    status = "404 Not Found"
+                    payload = b"<html><head><title>404</title></head><body>Not found</body></html>"
+                writer.write(f"HTTP/1.1 {status}\r\nServer: bench\r\nContent-Type: {content_type}\r\n"
+                             f"Content-Length: {len(payload)}\r\nX-Rl: 1000\r\nX-Ttl: 0\r\n\r\n".encode())
+                if method != "HEAD":
+                    writer.write(payload)
+                await writer.drain()
+                if headers.get("Connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, OSError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+class _DnsStandIn(asyncio.DatagramProtocol):
+    # Answers A queries for HIT names with 10.0.0.x and NXDOMAIN otherwise
+    def __init__(self, latency):
+        self.latency = latency
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, self._answer, data, addr)
+        else:
+            self._answer(data, addr)
+
+    def _answer(self, data, addr):
+        if len(data) < 12:
+            return
+        position = 12
+        labels = []
+        while position < len(data) and data[position]:
+            length = data[position]
+            labels.append(data[position + 1:position + 1 + length])
+            position += 1 + length
+        question = data[12:position + 5] # Name, terminator, type and class
+        qtype = struct.unpack("!H", data[position + 1:position + 3])[0] if position + 3 <= len(data) else 0
+        hit = bool(labels) and labels[0].startswith(HIT.encode())
+        flags = 0x8180 if hit else 0x8183
+        answers = 1 if hit and qtype == 1 else 0
+        response = data[:2] + struct.pack("!HHHHH", flags, 1, answers, 0, 0) + question
+        if answers:
+            response += struct.pack("!HHHIH", 0xC00C, 1, 1, 300, 4) + bytes([10, 0, 0, sum(labels[0]) % 250 + 1])
+        self.transport.sendto(response, addr)
+
+def _free_ports(count):
+    # Ports nothing listens on (the kernel just handed them out and took them back)
+    ports = []
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sockets.append(sock)
+        ports.append(sock.getsockname()[1])
+    for sock in sockets:
+        sock.close()
+    return ports
+
+async def _serve(config, conn):
+    open_ports = []
+    banner_ports = []
+    servers = []
+    for _ in range(config["open_ports"]):
+        server = await asyncio.start_server(_close_at_once, "127.0.0.1", 0, backlog=1024)
+        servers.append(server)
+        open_ports.append(server.sockets[0].getsockname()[1])
+    handler = _banner_handler(config["banner_delay"])
+    for _ in range(config["banner_ports"]):
+        server = await asyncio.start_server(handler, "127.0.0.1", 0, backlog=1024)
+        servers.append(server)
+        banner_ports.append(server.sockets[0].getsockname()[1])
+    http = await asyncio.start_server(_http_handler(config["http_latency"], config["soft_404"]), "127.0.0.1", 0, backlog=1024)
+    servers.append(http)
+    loop = asyncio.get_running_loop()
+    dns, _ = await loop.create_datagram_endpoint(lambda: _DnsStandIn(config["dns_latency"]), local_addr=("127.0.0.1", 0))
+    taken = set(open_ports + banner_ports)
+    closed_ports = [port for port in _free_ports(config["closed_ports"]) if port not in taken]
+    conn.send({
+        "open_ports": open_ports,
+        "banner_ports": banner_ports,
+        "closed_ports": closed_ports,
+        "http": f"http://127.0.0.1:{http.sockets[0].getsockname()[1]}",
+        "dns": f"127.0.0.1:{dns.get_extra_info('sockname')[1]}",
+    })
+    # Serve until the parent closes its end of the pipe
+    await loop.run_in_executor(None, _wait_closed, conn)
+    for server in servers:
+        server.close()
+    dns.close()
+
+def _wait_closed(conn):
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+
+def _standin_main(config, conn):
+    _raise_fd_limit(config["open_ports"] + config["banner_ports"] + 4096)
+    asyncio.run(_serve(config, conn))
+
+def _raise_fd_limit(wanted):
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+class StandIns:
+    """
+    Starts every local stand-in in a separate process: a listener farm
+    (open ports that accept and close, banner ports that speak after a delay,
+    and ports nobody listens on), a keep-alive HTTP server (pages, 404 or
+    soft-404, and a fake ip-api.com /batch endpoint) and a stub DNS server.
+    Use as a context manager; .endpoints describes where everything is.
+    """
+
+    def __init__(self, open_ports=200, banner_ports=100, closed_ports=2000, banner_delay=0.0,
+                 http_latency=0.0, soft_404=False, dns_latency=0.0):
+        self.config = {
+            "open_ports": open_ports,
+            "banner_ports": banner_ports,
+            "closed_ports": closed_ports,
+            "banner_delay": banner_delay,
+            "http_latency": http_latency,
+            "soft_404": soft_404,
+            "dns_latency": dns_latency,
+        }
+        self.endpoints = None
+        self._process = None
+        self._conn = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_standin_main, args=(self.config, child), daemon=True)
+        self._process.start()
+        child.close()
+        if not self._conn.poll(30):
+            self._process.terminate()
+            raise RuntimeError("stand-ins did not start")
+        self.endpoints = self._conn.recv()
+        return self
+
+    def __exit__(self, *exc):
+        self._conn.close()
+        self._process.join(5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+# ---------------------------------------------------------------------------
+# Benchmarks (each runs in a fresh process, so RSS and threads are its own)
+# ---------------------------------------------------------------------------
+
+def _words(count, prefix=""):
+    return [f"{prefix}{HIT if i % HIT_EVERY == 0 else 'miss'}{i}" for i in range(count)]
+
+def _bench_scan(endpoints, scale):
+    from fortress_scanner import scan_ports
+    ports = (endpoints["open_ports"] + endpoints["banner_ports"] + endpoints["closed_ports"]) * max(1, scale)
+    scan_ports("127.0.0.1", ports, timeout=1, engine="async", concurrency=2000)
+    return "scan", len(ports)
+
+def _bench_scan_threads(endpoints, scale):
+    from fortress_scanner import scan_ports
+    ports = endpoints["open_ports"] + endpoints["closed_ports"][:800]
+    ports = ports * max(1, scale)
+    scan_ports("127.0.0.1", ports, timeout=1, max_threads=100)
+    return "scan", len(ports)
+
+def _bench_dirbust(endpoints, scale):
+    from fortress_dirbuster import check_paths
+    words = _words(2000 * scale)
+    check_paths(endpoints["http"] + "/", words, workers=20, timeout=5)
+    return "dirbust", len(words)
+
+def _bench_subenum(endpoints, scale):
+    from fortress_subenum import enumerate_subdomains
+    words = _words(20000 * scale)
+    enumerate_subdomains("bench.test", words, resolvers=[endpoints["dns"]], concurrency=500)
+    return "dns", len(words)
+
+def _bench_banners(endpoints, scale):
+    from fortress_bannergrab import grab_banners
+    pairs = [("127.0.0.1", port) for port in endpoints["banner_ports"]] * max(1, scale)
+    for _ in grab_banners(pairs, concurrency=200, timeout=5):
+        pass
+    return "banner", len(pairs)
+
+def _bench_webinfo(endpoints, scale):
+    from fortress_webinfo import iter_web_info
+    urls = [f"{endpoints['http']}/{word}" for word in _words(1000 * scale)]
+    for _ in iter_web_info(urls, workers=20):
+        pass
+    return "web", len(urls)
+
+def _bench_geo(endpoints, scale):
+    from fortress_geolocate import geolocate_many
+    ips = [f"203.0.{i // 250 % 250}.{i % 250 + 1}" for i in range(5000 * scale)]
+    geolocate_many(ips, cache=None, api_base=endpoints["http"], concurrency=4, rate=1000)
+    return "geo", len(ips)
+
+BENCHMARKS = {
+    "scan": _bench_scan,
+    "scan-threads": _bench_scan_threads,
+    "dirbust": _bench_dirbust,
+    "subenum": _bench_subenum,
+    "banners": _bench_banners,
+    "webinfo": _bench_webinfo,
+    "geo": _bench_geo,
+}
+
+class _ThreadSampler:
+    # Records the largest number of live threads (not counting itself)
+    def __init__(self, interval=0.005):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.peak = max(self.peak, threading.active_count() - 1)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 if sys.platform != "darwin" else peak / 1048576, 1) # KiB on Linux, bytes on macOS
+
+def _bench_main(name, endpoints, scale, conn):
+    try:
+        from fortress_metrics import get_metrics, percentile
+        from fortress_sink import configure
+        _raise_fd_limit(65536)
+        configure(console=False) # Results are not the point here
+        sampler = _ThreadSampler()
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            module, items = BENCHMARKS[name](endpoints, scale)
+        elapsed = time.perf_counter() - started
+        threads = sampler.stop()
+        counts, buckets, _ = get_metrics(module).snapshot()
+        probes = counts.get("probes", 0)
+        p50 = percentile(buckets, 0.5)
+        p99 = percentile(buckets, 0.99)
+        conn.send({
+            "name": name,
+            "items": items,
+            "probes": probes,
+            "seconds": round(elapsed, 3),
+            "rate": round(probes / elapsed, 1) if elapsed else None,
+            "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+            "outcomes": {event: value for event, value in counts.items() if event not in ("probes", "in_flight")},
+            "peak_rss_mb": _peak_rss_mb(),
+            "peak_threads": threads,
+        })
+    except Exception as e:
+        conn.send({"name": name, "error": f"{type(e).__name__}: {e}"})
+
+def run_benchmark(name, endpoints, scale=1, timeout=600):
+    """
+    Runs one benchmark in a fresh process against the stand-ins and returns
+    its result dict (probes, seconds, rate, p50/p99 latency, peak RSS and
+    threads, outcome counts), or a dict with an "error" key.
+    """
+    context = multiprocessing.get_context("spawn")
+    conn, child = context.Pipe()
+    process = context.Process(target=_bench_main, args=(name, endpoints, scale, child))
+    process.start()
+    child.close()
+    try:
+        if conn.poll(timeout):
+            return conn.recv()
+        return {"name": name, "error": f"no result after {timeout}s"}
+    except EOFError:
+        return {"name": name, "error": f"benchmark process died (exit code {process.exitcode})"}
+    finally:
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+
+def _version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _number(value, unit=""):
+    return "-" if value is None else f"{value:,.1f}{unit}"
+
+def print_results(results):
+    print(f"\n{'benchmark':<14} {'probes':>8} {'seconds':>8} {'probes/s':>10} {'p50':>9} {'p99':>9} {'RSS MB':>7} {'threads':>7}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['name']:<14} [!] {result['error']}")
+            continue
+        print(f"{result['name']:<14} {result['probes']:>8} {result['seconds']:>8.2f} {_number(result['rate']):>10} "
+              f"{_number(result['p50_ms'], 'ms'):>9} {_number(result['p99_ms'], 'ms'):>9} "
+              f"{_number(result['peak_rss_mb']):>7} {result['peak_threads']:>7}")
+
+def compare(results, baseline, tolerance=10.0):
+    """
+    Prints the change of every benchmark against a previous --json file and
+    returns the names that got more than `tolerance` percent slower (lower
+    probes/s or higher p99).
+    """
+    previous = {result["name"]: result for result in baseline.get("results", []) if "error" not in result}
+    regressions = []
+    print(f"\n--- Compared with {baseline.get('version') or 'baseline'} ---")
+    for result in results:
+        old = previous.get(result["name"])
+        if "error" in result or old is None:
+            continue
+        changes = []
+        slower = False
+        if old.get("rate") and result.get("rate"):
+            change = (result["rate"] - old["rate"]) / old["rate"] * 100
+            changes.append(f"probes/s {change:+.1f}%")
+            slower = slower or change < -tolerance
+        if old.get("p99_ms") and result.get("p99_ms"):
+            change = (result["p99_ms"] - old["p99_ms"]) / old["p99_ms"] * 100
+            changes.append(f"p99 {change:+.1f}%")
+            slower = slower or change > tolerance
+        if old.get("peak_rss_mb") and result.get("peak_rss_mb"):
+            changes.append(f"RSS {(result['peak_rss_mb'] - old['peak_rss_mb']) / old['peak_rss_mb'] * 100:+.1f}%")
+        print(f"{'[-]' if slower else '[+]'} {result['name']}: {', '.join(changes) or 'no comparable numbers'}")
+        if slower:
+            regressions.append(result["name"])
+    return regressions
+
+if __name__ == "__main__":
+    print("--- Tech Fortress Benchmark Suite ---")
+    print("Runs the fortress modules against local stand-ins (no network needed).")
+
+    parser = argparse.ArgumentParser(description="Benchmarks fortress modules against local stand-in servers.")
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--scale", type=int, default=1, help="Multiply every workload by this (default: 1)")
+    parser.add_argument("--repeat", type=int, default=1, help="Run each benchmark this many times and keep the fastest (default: 1)")
+    parser.add_argument("--open-ports", type=int, default=200, help="Listening ports in the farm (default: 200)")
+    parser.add_argument("--banner-ports", type=int, default=100, help="Ports that send a banner (default: 100)")
+    parser.add_argument("--closed-ports", type=int, default=2000, help="Ports nothing listens on (default: 2000)")
+    parser.add_argument("--banner-delay", type=float, default=0.0, help="Seconds before a banner port speaks (default: 0)")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="Seconds the HTTP stand-in waits before answering (default: 0)")
+    parser.add_argument("--soft-404", action="store_true", help="Answer missing pages with 200 instead of 404")
+    parser.add_argument("--dns-latency", type=float, default=0.0, help="Seconds the DNS stand-in waits before answering (default: 0)")
+    parser.add_argument("--json", metavar="FILE", help="Write the results as JSON (to compare later versions against)")
+    parser.add_argument("--compare", metavar="FILE", help="Compare with an earlier --json file; exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Percent slower that counts as a regression (default: 10)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        print(f"[!] Unknown benchmark(s): {', '.join(unknown)}. Choose from: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+
+    # Keep caches and journals of the runs out of the user's ~/.fortress
+    state = tempfile.TemporaryDirectory(prefix="fortress-bench-")
+    os.environ["FORTRESS_HOME"] = state.name
+    _raise_fd_limit(args.open_ports + args.banner_ports + 4096)
+
+    results = []
+    with StandIns(args.open_ports, args.banner_ports, args.closed_ports, args.banner_delay,
+                  args.http_latency, args.soft_404, args.dns_latency) as standins:
+        print(f"[*] Stand-ins up: {len(standins.endpoints['open_ports'])} open, {len(standins.endpoints['banner_ports'])} banner, "
+              f"{len(standins.endpoints['closed_ports'])} closed ports; HTTP {standins.endpoints['http']}; DNS {standins.endpoints['dns']}")
+        for name in args.benchmarks or list(BENCHMARKS):
+            best = None
+            for _ in range(max(1, args.repeat)):
+                print(f"[*] Running {name}...")
+                result = run_benchmark(name, standins.endpoints, args.scale)
+                if best is None or "error" in best or ("error" not in result and result["seconds"] < best["seconds"]):
+                    best = result
+            results.append(best)
+    state.cleanup()
+
+    print_results(results)
+
+    if args.json:
+        report = {
+            "version": _version(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[*] Results written to {args.json}")
+
+    if args.compare:
+        try:
+            with open(args.compare, "r") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[!] Could not read {args.compare}: {e}")
+            sys.exit(1)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"[-] Slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
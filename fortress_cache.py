@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import atexit
+import socket
+import threading
+import ipaddress
+from collections import OrderedDict
+
+# Where fortress keeps state between runs (resolver snapshot, journals, ...)
+STATE_DIR = os.environ.get("FORTRESS_HOME", os.path.expanduser("~/.fortress"))
+DEFAULT_SNAPSHOT = os.path.join(STATE_DIR, "resolve-cache.json")
+
+NEGATIVE = () # Cached "does not resolve"
+
+class ResolutionCache:
+    """
+    Process-wide name -> addresses cache with TTLs, negative caching and an
+    LRU bound. Safe to use from scanner threads and event loops alike.
+    """
+
+    def __init__(self, max_entries=100000, default_ttl=300, negative_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl # For answers without a TTL (system resolver)
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict() # name -> (expires at, addresses tuple)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        """
+        Returns a tuple of addresses, NEGATIVE for a cached failure, or None on a miss.
+        """
+        name = name.lower().rstrip(".")
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[name]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, name, addresses, ttl=None):
+        """
+        Stores addresses for a name; an empty list records a negative answer.
+        """
+        name = name.lower().rstrip(".")
+        addresses = tuple(addresses)
+        if ttl is None:
+            ttl = self.default_ttl if addresses else self.negative_ttl
+        with self._lock:
+            self._entries[name] = (time.time() + ttl, addresses)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, path):
+        """
+        Loads a snapshot written by save(), skipping entries that have expired.
+        """
+        try:
+            with open(path, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            for name, (expires, addresses) in snapshot.items():
+                if expires > now:
+                    self._entries[name] = (expires, tuple(addresses))
+                    loaded += 1
+        return loaded
+
+    def save(self, path):
+        now = time.time()
+        with self._lock:
+            snapshot = {name: [expires, list(addresses)]
+                        for name, (expires, addresses) in self._entries.items() if expires > now}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, path) # Never leave a half-written snapshot behind
+
+# The shared cache every fortress module resolves through
+cache = ResolutionCache()
+
+def _is_ip(name):
+    try:
+        ipaddress.ip_address(name)
+        return True
+    except ValueError:
+        return False
+
+def resolve_all(name):
+    """
+    Returns every address for `name` (IPv4 first), using the shared cache.
+    Raises socket.gaierror if the name does not resolve, like gethostbyname.
+    """
+    if _is_ip(name):
+        return (name,)
+    addresses = cache.get(name)
+    if addresses is None:
+        try:
+            infos = socket.getaddrinfo(name, None, proto=socket.IPPROTO_TCP)
+        except socket.gaierror:
+            cache.put(name, NEGATIVE)
+            raise
+        v4 = [info[4][0] for info in infos if info[0] == socket.AF_INET]
+        v6 = [info[4][0] for info in infos if info[0] == socket.AF_INET6]
+        addresses = tuple(dict.fromkeys(v4 + v6))
+        cache.put(name, addresses)
+    if not addresses:
+        raise socket.gaierror(socket.EAI_NONAME, f"Name or service not known (cached): {name}")
+    return addresses
+
+def resolve(name):
+    """
+    Cached drop-in for socket.gethostbyname: one address, IPv4 preferred.
+    """
+    return resolve_all(name)[0]
+
+def enable_snapshot(path=DEFAULT_SNAPSHOT):
+    """
+    Warms the cache from an on-disk snapshot and writes it back at exit.
+    """
+    cache.load(path)
+    atexit.register(cache.save, path)
+
+def install_requests_hook():
+    """
+    Routes the name lookups made by `requests` (via urllib3) through the shared
+    cache. Only the TCP connect target is swapped, so Host headers and TLS SNI
+    still carry the original hostname.
+    """
+    try:
+        from urllib3.util import connection
+    except ImportError:
+        return
+    if getattr(connection.create_connection, "_fortress_cached", False):
+        return
+    original = connection.create_connection
+
+    def create_connection(address, *args, **kwargs):
+        host, port = address
+        try:
+            host = resolve(host)
+        except socket.gaierror:
+            pass # Let urllib3 raise its usual error
+        return original((host, port), *args, **kwargs)
+
+    create_connection._fortress_cached = True
+    connection.create_connection = create_connection
+
+# FORTRESS_DNS_CACHE=1 (default location) or =/path/to/snapshot.json starts runs warm
+if os.environ.get("FORTRESS_DNS_CACHE"):
+    _snapshot = os.environ["FORTRESS_DNS_CACHE"]
+    enable_snapshot(DEFAULT_SNAPSHOT if _snapshot == "1" else _snapshot)
@@ -0,0 +1,451 @@
+import io
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import socket
+import argparse
+import importlib
+import threading
+import traceback
+
+import fortress_sink
+from fortress_cache import STATE_DIR
+from fortress_sink import add_output_arguments, configure_from_args
+from fortress_metrics import get_metrics, add_metrics_arguments, start_from_args as start_metrics
+
+DEFAULT_SOCKET = os.environ.get("FORTRESS_SOCKET", os.path.join(STATE_DIR, "daemon.sock"))
+
+# Job name -> the module whose main(argv) runs it
+TOOLS = {
+    "scan": "fortress_scanner",
+    "enum": "fortress_subenum",
+    "dirbust": "fortress_dirbuster",
+    "banner": "fortress_bannergrab",
+    "geo": "fortress_geolocate",
+    "pipeline": "fortress_pipeline",
+    "store": "fortress_store",
+}
+
+# The protocol is JSON lines in both directions. A client sends one request:
+#   {"command": "run", "tool": "scan", "argv": [...], "cwd": "..."}
+#   {"command": "status"} or {"command": "stop"}
+# and, while its job runs, may send {"command": "cancel"}. The daemon answers
+# with messages of these types:
+#   out / err   text the job printed to stdout / stderr
+#   emit        a batch of result records [kind, message, fields]
+#   metrics     export_all() of the daemon's metrics for this job
+#   exit        the job is over; "code" is its exit status
+
+def _encode(value):
+    # JSON has no bytes (raw banners, certificates): send them as hex
+    if isinstance(value, (bytes, bytearray)):
+        return {"$bytes": bytes(value).hex()}
+    return str(value)
+
+def _decode(item):
+    if len(item) == 1 and "$bytes" in item:
+        return bytes.fromhex(item["$bytes"])
+    return item
+
+def _message(**fields):
+    return (json.dumps(fields, separators=(",", ":"), default=_encode) + "\n").encode("utf-8")
+
+class _Client:
+    """
+    The daemon's end of one client connection. Once the client has gone away
+    its messages are silently dropped.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.alive = True
+        self._lock = threading.Lock()
+
+    def send(self, **fields):
+        data = _message(**fields)
+        with self._lock:
+            if not self.alive:
+                return
+            try:
+                self.conn.sendall(data)
+            except OSError:
+                self.alive = False
+
+    def put(self, item):
+        # What fortress_shard.ForwardingSink calls: ("emit" | "metrics", worker, value)
+        kind, _, value = item
+        self.send(type=kind, value=value)
+
+class _ClientStream:
+    """
+    Stands in for sys.stdout / sys.stderr while a job runs, so whatever the
+    job prints ends up on the client's terminal. Text is sent a line at a
+    time rather than one message per write() call.
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, client, kind):
+        self.client = client
+        self.kind = kind
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self._buffer.append(text)
+            if "\n" in text or "\r" in text:
+                self._send()
+        return len(text)
+
+    def _send(self):
+        text = "".join(self._buffer)
+        self._buffer = []
+        if text:
+            self.client.send(type=self.kind, text=text)
+
+    def flush(self):
+        with self._lock:
+            self._send()
+
+    def isatty(self):
+        return False
+
+class _Job:
+    def __init__(self, client, tool, argv, cwd):
+        self.client = client
+        self.tool = tool
+        self.argv = argv
+        self.cwd = cwd
+        self.cancelled = False
+        self.finished = threading.Event()
+
+    def describe(self):
+        return " ".join([self.tool] + self.argv)
+
+class FortressDaemon:
+    """
+    Keeps the fortress modules loaded in one long-running process and runs
+    jobs for thin clients connecting over a Unix socket.
+
+    Everything the modules keep at module level stays warm between jobs: the
+    imported code (requests and friends), the DNS resolution cache, the
+    geolocation cache, the probe database and the keep-alive connection
+    pools of the HTTP sessions. Jobs run one at a time, in the order they
+    arrive, on the main thread (so a cancel can interrupt them like Ctrl-C
+    would); their output, results and metrics are streamed back to the
+    client that asked.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.path = path
+        self.jobs = queue.Queue()
+        self.current = None
+        self.completed = 0
+        self._cancelling = False # A cancel's SIGINT may land just after its job ended
+        self.started = time.time()
+
+    def warm_up(self):
+        """
+        Imports every job module and loads the data files up front, so the
+        first job is as quick as the later ones.
+        """
+        for name in TOOLS.values():
+            importlib.import_module(name)
+        from fortress_probes import get_database
+        get_database()
+
+    def serve(self):
+        if os.path.exists(self.path):
+            if daemon_running(self.path):
+                print(f"[!] A fortress daemon is already listening on {self.path}")
+                return 1
+            os.unlink(self.path) # Left behind by a daemon that died
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        print("[*] Loading modules...")
+        self.warm_up()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        os.chmod(self.path, 0o600) # Only this user may submit jobs
+        listener.listen(16)
+        threading.Thread(target=self._accept, args=(listener,), name="daemon-accept", daemon=True).start()
+        signal.signal(signal.SIGINT, self._idle_interrupt)
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.jobs.put(None))
+        print(f"[+] Fortress daemon listening on {self.path} (pid {os.getpid()})")
+
+        try:
+            for job in iter(self.jobs.get, None):
+                self._run(job)
+        except KeyboardInterrupt:
+            print("\n[!] Daemon interrupted by user.")
+        finally:
+            listener.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        print(f"[*] Daemon stopped after {self.completed} jobs.")
+        return 0
+
+    def _accept(self, listener):
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return # Listener closed on shutdown
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        client = _Client(conn)
+        reader = conn.makefile("rb")
+        try:
+            request = json.loads(reader.readline() or b"{}")
+        except (OSError, ValueError):
+            request = {}
+        command = request.get("command")
+
+        if command == "status":
+            job = self.current
+            client.send(type="status", pid=os.getpid(), uptime=time.time() - self.started, completed=self.completed,
+                        queued=self.jobs.qsize(), running=job.describe() if job else None)
+        elif command == "stop":
+            self.jobs.put(None) # After the jobs already queued
+            client.send(type="err", text="[*] The daemon will stop once the queued jobs are done.\n")
+        elif command == "run":
+            tool = request.get("tool")
+            if tool not in TOOLS:
+                client.send(type="err", text=f"[!] Unknown tool: {tool} (choose from {', '.join(sorted(TOOLS))})\n")
+                client.send(type="exit", code=2)
+            else:
+                job = _Job(client, tool, list(request.get("argv", [])), request.get("cwd") or os.getcwd())
+                waiting = self.jobs.qsize() + (self.current is not None)
+                if waiting:
+                    client.send(type="err", text=f"[*] Queued behind {waiting} other job(s)...\n")
+                self.jobs.put(job)
+                # Until the job is done, a cancel (or the client going away) stops it
+                try:
+                    for line in reader:
+                        if json.loads(line).get("command") == "cancel":
+                            break
+                except (OSError, ValueError):
+                    pass
+                if not job.finished.is_set():
+                    self.cancel(job)
+                job.finished.wait()
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def cancel(self, job):
+        job.cancelled = True
+        if self.current is job:
+            # Exactly what Ctrl-C does to a job run from the terminal
+            self._cancelling = True
+            signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+
+    def _idle_interrupt(self, signum, frame):
+        # SIGINT between jobs: Ctrl-C on the daemon's terminal stops it
+        if self._cancelling:
+            self._cancelling = False
+            return
+        raise KeyboardInterrupt
+
+    def _run(self, job):
+        if job.cancelled:
+            job.finished.set()
+            return
+        try:
+            try:
+                self._cancelling = False
+                self.current = job
+                # While a job runs, SIGINT is handled as in any script, so
+                # asyncio.run and the modules' KeyboardInterrupt handlers
+                # wind the job down cleanly
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                code = self._call(job)
+            finally:
+                self.current = None
+                signal.signal(signal.SIGINT, self._idle_interrupt)
+        except KeyboardInterrupt:
+            code = 130 # Cancelled just as the job was finishing
+        self.completed += 1
+        job.client.send(type="exit", code=code)
+        job.finished.set()
+
+    def _call(self, job):
+        """
+        Runs one job's main(argv) with stdout, stderr, the result sink and
+        the working directory pointed at the client. Returns the exit code.
+        """
+        from fortress_shard import ForwardingSink
+        from fortress_metrics import reset_all
+        import fortress_scheduler
+
+        module = importlib.import_module(TOOLS[job.tool])
+        saved = sys.stdout, sys.stderr, sys.stdin, sys.argv, os.getcwd()
+        sys.argv = [os.path.basename(module.__file__)] + job.argv # For usage and error lines
+        sys.stdout = _ClientStream(job.client, "out")
+        sys.stderr = _ClientStream(job.client, "err")
+        sys.stdin = io.StringIO("") # Nobody to answer prompts; input() raises EOFError
+        reset_all() # The client gets this job's numbers only
+        fortress_sink.install(ForwardingSink(job.client, 0))
+        code = 0
+        try:
+            os.chdir(job.cwd)
+            module.main(job.argv)
+        except SystemExit as e:
+            if isinstance(e.code, int) or e.code is None:
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except EOFError:
+            print("\n[!] This job wants interactive input; give it everything on the command line or run it without the daemon.")
+            code = 1
+        except KeyboardInterrupt:
+            print("\n[!] Job cancelled.")
+            code = 130
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            fortress_scheduler.reset() # A --rate limit must not carry over to the next job
+            geolocate = sys.modules.get("fortress_geolocate")
+            if geolocate:
+                geolocate.geo_cache.prefix = None # Nor a cache prefix
+                geolocate.geo_cache.save() # atexit only saves it when the daemon stops
+            fortress_sink.close() # Sends the last results and the final metrics
+            sys.stdout.flush()
+            sys.stderr.flush()
+            sys.stdout, sys.stderr, sys.stdin, sys.argv = saved[:4]
+            os.chdir(saved[4])
+        return code
+
+def connect(path=DEFAULT_SOCKET):
+    """
+    Opens a connection to the daemon. Raises OSError if none is listening.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except OSError:
+        conn.close()
+        raise
+    return conn
+
+def daemon_running(path=DEFAULT_SOCKET):
+    try:
+        connect(path).close()
+    except OSError:
+        return False
+    return True
+
+def request(command, path=DEFAULT_SOCKET):
+    """
+    Sends a simple command ("status" or "stop") and returns the answers.
+    """
+    conn = connect(path)
+    with conn:
+        conn.sendall(_message(command=command))
+        return [json.loads(line) for line in conn.makefile("rb")]
+
+def run_remote(tool, argv, path=DEFAULT_SOCKET):
+    """
+    Runs `tool` with command-line arguments `argv` in the daemon and relays
+    its output here. The result and metrics options (--output, --quiet,
+    --stats, --progress, ...) are applied in this process, to the results and
+    metrics the daemon streams back. Returns the job's exit code; raises
+    OSError if no daemon is listening.
+    """
+    conn = connect(path)
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    local, argv = parser.parse_known_args(argv)
+    configure_from_args(local)
+    start_metrics(local)
+
+    conn.sendall(_message(command="run", tool=tool, argv=argv, cwd=os.getcwd()))
+    reader = conn.makefile("rb")
+    while True:
+        try:
+            for line in reader:
+                message = json.loads(line, object_hook=_decode)
+                kind = message.get("type")
+                if kind == "out":
+                    sys.stdout.write(message["text"])
+                    sys.stdout.flush()
+                elif kind == "err":
+                    sys.stderr.write(message["text"])
+                    sys.stderr.flush()
+                elif kind == "emit":
+                    for record_kind, text, fields in message["value"]:
+                        fortress_sink.emit(record_kind, text, **fields)
+                elif kind == "metrics":
+                    for name, exported in message["value"].items():
+                        get_metrics(name).absorb("daemon", exported)
+                elif kind == "exit":
+                    fortress_sink.flush()
+                    conn.close()
+                    return message["code"]
+            print("[!] Lost the connection to the daemon.")
+            return 1
+        except KeyboardInterrupt:
+            # Ask the daemon to stop the job, then keep relaying what it prints
+            print("\n[*] Cancelling the job (press Ctrl+C again to stop waiting)...")
+            try:
+                conn.sendall(_message(command="cancel"))
+                continue
+            except OSError:
+                return 130
+        except OSError as e:
+            print(f"[!] Lost the connection to the daemon: {e}")
+            return 1
+
+def run_tool(tool, argv, path=DEFAULT_SOCKET):
+    """
+    Runs a job in the daemon if one is listening, otherwise in this process.
+    Returns the exit code.
+    """
+    try:
+        return run_remote(tool, argv, path)
+    except OSError:
+        pass
+    try:
+        importlib.import_module(TOOLS[tool]).main(argv)
+    except SystemExit as e:
+        return e.code
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tech Fortress daemon: keeps the modules, caches and connection pools warm in one process and runs scan / enum / dirbust / banner / geo jobs for thin clients over a Unix socket.")
+    parser.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help=f"Socket path (default: {DEFAULT_SOCKET}, or $FORTRESS_SOCKET)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve", help="Start the daemon in the foreground")
+    commands.add_parser("status", help="Show whether a daemon is running and what it is doing")
+    commands.add_parser("stop", help="Stop the daemon once its queued jobs are done")
+    run_parser = commands.add_parser("run", help="Run a job, e.g.: run scan -t 10.0.0.1 --top-ports 100 (in this process if no daemon is running)")
+    run_parser.add_argument("tool", choices=sorted(TOOLS), help="Which tool to run")
+    run_parser.add_argument("args", nargs=argparse.REMAINDER, help="The tool's own options")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        sys.exit(FortressDaemon(args.socket).serve())
+    if args.command == "run":
+        sys.exit(run_tool(args.tool, args.args, args.socket))
+    try:
+        answers = request(args.command, args.socket)
+    except OSError:
+        print(f"[-] No fortress daemon is listening on {args.socket}")
+        sys.exit(1)
+    for answer in answers:
+        if answer.get("type") == "status":
+            print(f"[+] Fortress daemon running (pid {answer['pid']}, up {answer['uptime']:.0f}s, {answer['completed']} jobs done, {answer['queued']} queued)")
+            print(f"[*] Running: {answer['running'] or 'nothing'}")
+        else:
+            print(answer.get("text", "").rstrip())
@@ -1,69 +1,299 @@
 import requests
 import sys
+import os
+import time
+import uuid
+import hashlib
 import argparse
+from concurrent.futures import wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse, urljoin
 
-def load_wordlist(filepath):
+from fortress_cache import install_requests_hook
+from fortress_wordlist import load_wordlist # Shared, memory-mapped and lazy
+from fortress_scheduler import ProbeScheduler, get_scheduler, configure as configure_scheduler
+from fortress_journal import Journal, OffsetTracker, iter_from, journal_path
+from fortress_sink import emit, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import get_metrics, add_metrics_arguments, start_from_args as start_metrics
+
+install_requests_hook() # Resolve request hosts through the shared cache
+
+metrics = get_metrics("dirbust") # Request counters and latency (see fortress_metrics)
+
+def make_session(workers, hosts=4):
     """
-    Loads items from a wordlist file into a list.
+    Creates a requests.Session whose per-host keep-alive pool holds one
+    connection per worker, so no request waits for (or re-does) a handshake.
+    Pools for up to `hosts` hosts are kept around at once.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(1, hosts), pool_maxsize=max(1, workers), max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_sessions = {} # (workers, hosts) -> session, see shared_session
+
+def shared_session(workers, hosts=4):
     """
+    Like make_session, but hands out the same session for the same sizes, so
+    repeated checks in one long-running process (the fortress daemon) reuse
+    its already-open keep-alive connections.
+    """
+    session = _sessions.get((workers, hosts))
+    if session is None:
+        session = _sessions[(workers, hosts)] = make_session(workers, hosts)
+    return session
+
+def iter_path_results(base_url, paths_list, workers=10, timeout=3, session=None, scheduler=None):
+    """
+    Issues a HEAD for every path with up to `workers` requests in flight over
+    pooled keep-alive connections. Yields (full_url, response or exception)
+    in completion order. Only a bounded number of paths are queued at a time,
+    so arbitrarily long (lazy) wordlists are fine. Requests are submitted to
+    a ProbeScheduler (the process-wide one if configured) so its rate and
+    per-host limits apply.
+    """
+    session = session or make_session(workers)
+    own_scheduler = scheduler is None and get_scheduler() is None
+    scheduler = scheduler or get_scheduler() or ProbeScheduler(workers=workers)
+    host = urlparse(base_url).netloc
+
+    def probe(full_url):
+        metrics.begin()
+        started = time.monotonic()
+        try:
+            response = session.head(full_url, timeout=timeout, allow_redirects=False)
+        except Exception as e:
+            metrics.end("timeout" if isinstance(e, requests.exceptions.Timeout) else "error")
+            return full_url, e
+        metrics.end(f"http_{response.status_code // 100}xx", time.monotonic() - started)
+        return full_url, response
+
+    paths = iter(paths_list)
+    in_flight = set()
     try:
-        with open(filepath, 'r') as f:
-            # Read lines, strip whitespace (like newlines), and filter out empty lines
-            wordlist = [line.strip() for line in f if line.strip()]
-        print(f"[*] Loaded {len(wordlist)} items from wordlist: {filepath}")
-        return wordlist
-    except FileNotFoundError:
-        print(f"[!] Error: Wordlist file not found at '{filepath}'.")
-        return [] # Return empty list instead of sys.exit for integration
-    except Exception as e:
-        print(f"[!] An error occurred while loading wordlist: {e}")
-        return [] # Return empty list for integration
-
-def check_paths(base_url, paths_list):
+        while True:
+            while len(in_flight) < workers * 2:
+                path = next(paths, None)
+                if path is None:
+                    break
+                in_flight.add(scheduler.submit(host, probe, urljoin(base_url, path)))
+            if not in_flight:
+                return
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        if own_scheduler:
+            scheduler.shutdown()
+
+def report_path(full_url, result):
+    """
+    Reports one path result. Returns True if it counts as a finding.
+    """
+    if isinstance(result, requests.exceptions.Timeout):
+        # print(f"[!] Timeout for {full_url}") # Suppress for cleaner output in main script
+        return False
+    if isinstance(result, requests.exceptions.ConnectionError):
+        print(f"[!] Connection Error for {full_url}. Is the host reachable?")
+        return False
+    if isinstance(result, requests.exceptions.RequestException):
+        print(f"[!] An unexpected error occurred with {full_url}: {result}")
+        return False
+    if isinstance(result, Exception):
+        print(f"[!] An unexpected error occurred: {result}")
+        return False
+
+    status_code = result.status_code
+    if status_code == 200:
+        emit("path", f"[+] Found: {full_url} (Status: {status_code} OK)", url=full_url, status=status_code)
+        return True
+    elif status_code == 403:
+        emit("path", f"[!] Forbidden: {full_url} (Status: {status_code} - Access Denied)", url=full_url, status=status_code)
+        return True
+    elif status_code == 301 or status_code == 302:
+        location = result.headers.get('Location')
+        emit("path", f"[>] Redirect: {full_url} (Status: {status_code} to {location or 'N/A'})", url=full_url, status=status_code, location=location)
+        return True
+    return False
+
+class NotFoundFingerprint:
+    """
+    What the server sends for a path that cannot exist: status code, body length,
+    redirect target and body hash, with the requested path cut out of the body
+    and Location so servers that echo it back still match.
+    """
+
+    def __init__(self, status, length, echoes, location, body_hash):
+        self.status = status
+        self.length = length # Body length without the echoed path, or None if unstable
+        self.echoes = echoes # How often the requested path appears in the body
+        self.location = location # Redirect target with the path replaced by a marker
+        self.body_hash = body_hash
+
+    def matches(self, response, relative_path):
+        """
+        Cheap check using only what a HEAD response carries (plus the body for GETs).
+        relative_path is the path below the base URL, e.g. "admin/login.php".
+        """
+        if response.status_code != self.status:
+            return False
+        # The server may echo just the last segment or the whole relative path
+        echoed = {relative_path, relative_path.rstrip('/'), relative_path.rstrip('/').rsplit('/', 1)[-1]}
+        if self.location is not None:
+            location = urljoin(response.url, response.headers.get('Location', ''))
+            return any(location.replace(token, "\0") == self.location for token in echoed)
+        if response.request.method == "GET" and self.body_hash is not None:
+            return any(_body_hash(response.content, token) == self.body_hash for token in echoed)
+        length = response.headers.get('Content-Length')
+        if self.length is None or length is None:
+            return self.length is None and self.status != 200 # Unstable 200s can't be told apart safely
+        return any(int(length) == self.length + self.echoes * len(token) for token in echoed)
+
+def _body_hash(body, token):
+    return hashlib.sha1(body.replace(token.encode(), b"\0")).hexdigest()
+
+def calibrate(base_url, session, timeout=3):
+    """
+    Fingerprints the server's "not found" answer by requesting a few random
+    paths that cannot exist (a bare name, a name with an extension, and a name
+    with a trailing slash). Done once; every recursion level reuses the result.
+    Returns a list of NotFoundFingerprint.
+    """
+    fingerprints = []
+    for suffix in ("", "", ".html", "/"):
+        name = uuid.uuid4().hex[:12]
+        try:
+            response = session.get(urljoin(base_url, name + suffix), timeout=timeout, allow_redirects=False)
+        except requests.exceptions.RequestException:
+            continue
+        body = response.content
+        # Cut out whatever form of the requested path the server echoes back
+        token = name + suffix if (name + suffix).encode() in body else name
+        location = None
+        if 'Location' in response.headers:
+            location = urljoin(response.url, response.headers['Location']).replace(name + suffix, "\0").replace(name, "\0")
+        fingerprint = NotFoundFingerprint(
+            response.status_code,
+            len(body) - body.count(token.encode()) * len(token),
+            body.count(token.encode()),
+            location,
+            _body_hash(body, token),
+        )
+        for known in fingerprints:
+            if (known.status, known.location) == (fingerprint.status, fingerprint.location):
+                if known.length != fingerprint.length:
+                    known.length = None # Body varies between requests; only status/redirect are reliable
+                if known.body_hash != fingerprint.body_hash:
+                    known.body_hash = None
+                break
+        else:
+            fingerprints.append(fingerprint)
+    # A plain 404 needs no filtering beyond what report_path already does
+    return [f for f in fingerprints if f.status != 404]
+
+def is_directory(full_url, response):
+    """
+    Guesses whether a found path is a directory worth descending into.
+    """
+    if full_url.endswith('/'):
+        return True
+    if response.status_code in (301, 302):
+        return urljoin(full_url, response.headers.get('Location', '')).split('?')[0] == full_url + '/'
+    return response.status_code in (200, 403) and '.' not in full_url.rsplit('/', 1)[-1]
+
+def _candidates(base_url, prefix, paths_list, extensions, tracker=None, start=0):
+    # Every word (plus its extensions) below prefix. With a tracker, all of a
+    # word's candidates are registered before any is handed out, so the
+    # watermark never passes a word that is only partly checked.
+    for position, path in iter_from(paths_list, start):
+        candidates = [prefix + path]
+        if '.' not in path and not path.endswith('/'):
+            candidates.extend(prefix + path + extension for extension in extensions)
+        if tracker:
+            for candidate in candidates:
+                tracker.issue(urljoin(base_url, candidate), position)
+        yield from candidates
+
+def check_paths(base_url, paths_list, workers=10, timeout=3, extensions=(), max_depth=0, calibrate_404=True, journal=None):
     """
     Checks for the existence of specified paths on a base URL.
+    Up to `workers` requests run concurrently over a keep-alive connection pool;
+    results are printed as they arrive. Responses matching the server's
+    calibrated "not found" fingerprint (soft 404s) are dropped. Every word is
+    also tried with each of `extensions` (e.g. [".php", ".bak"]), and directories
+    found are searched again with the same wordlist up to `max_depth` levels
+    deep (paths_list must then be re-iterable, e.g. a list).
+    With a journal, progress is checkpointed per directory; a resumed run
+    skips the words already checked and picks up the directories found so far.
+    Returns the list of found URLs.
     """
     print(f"\n[*] Starting directory/file existence check for: {base_url}")
-    found_count = 0
+    found = []
 
     # Ensure base_url ends with a slash for consistent joining
     if not base_url.endswith('/'):
         base_url += '/'
 
-    for path in paths_list:
-        full_url = urljoin(base_url, path)
-        try:
-            response = requests.head(full_url, timeout=3)
-            status_code = response.status_code
-
-            if status_code == 200:
-                print(f"[+] Found: {full_url} (Status: {status_code} OK)")
-                found_count += 1
-            elif status_code == 403:
-                print(f"[!] Forbidden: {full_url} (Status: {status_code} - Access Denied)")
-                found_count += 1
-            elif status_code == 301 or status_code == 302:
-                print(f"[>] Redirect: {full_url} (Status: {status_code} to {response.headers.get('Location', 'N/A')})")
-                found_count += 1
-
-        except requests.exceptions.Timeout:
-            # print(f"[!] Timeout for {full_url}") # Suppress for cleaner output in main script
-            pass
-        except requests.exceptions.ConnectionError:
-            print(f"[!] Connection Error for {full_url}. Is the host reachable?")
-        except requests.exceptions.RequestException as e:
-            print(f"[!] An unexpected error occurred with {full_url}: {e}")
-        except Exception as e:
-            print(f"[!] An unexpected error occurred: {e}")
+    session = shared_session(workers)
+    fingerprints = calibrate(base_url, session, timeout) if calibrate_404 else []
+    for fingerprint in fingerprints:
+        print(f"[*] Soft-404 detected (Status: {fingerprint.status}); matching responses will be filtered.")
+
+    previous = journal.state.findings_of("path") if journal else []
+    if previous:
+        print(f"[*] Resuming ({len(previous)} paths found so far)")
+        found.extend(dict.fromkeys(f["url"] for f in previous))
 
-    if found_count == 0:
+    filtered = 0
+    level = [""]
+    for depth in range(max_depth + 1):
+        directories = []
+        for prefix in level:
+            if prefix:
+                print(f"[*] Recursing into {urljoin(base_url, prefix)}")
+            tracker = OffsetTracker(journal, scope=prefix) if journal else None
+            start = journal.state.position(prefix) if journal else 0
+            candidates = _candidates(base_url, prefix, paths_list, extensions, tracker, start)
+            for full_url, result in iter_path_results(base_url, candidates, workers, timeout, session):
+                if tracker:
+                    tracker.complete(full_url)
+                if not isinstance(result, Exception):
+                    relative_path = full_url[len(base_url):]
+                    if any(f.matches(result, relative_path) for f in fingerprints):
+                        filtered += 1
+                        continue
+                if report_path(full_url, result):
+                    directory = depth < max_depth and is_directory(full_url, result)
+                    if full_url not in found:
+                        found.append(full_url)
+                    if directory:
+                        directories.append(full_url[len(base_url):].rstrip('/') + '/')
+                    if journal:
+                        journal.found("path", url=full_url, prefix=prefix, directory=directory)
+            # Directories an earlier, interrupted run already found here
+            directories.extend(f["url"][len(base_url):].rstrip('/') + '/' for f in previous if f["prefix"] == prefix and f["directory"])
+        level = list(dict.fromkeys(directories))
+        if not level:
+            break
+
+    if filtered:
+        print(f"[*] Filtered {filtered} soft-404 responses.")
+    flush_results()
+    if not found:
         print(f"[*] No common files or directories found for {base_url} from the provided list.")
     else:
-        print(f"[*] Existence check for {base_url} completed. Found {found_count} potential paths.")
+        print(f"[*] Existence check for {base_url} completed. Found {len(found)} potential paths.")
+    return found
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    """
+    Command-line entry point (also used by the fortress daemon).
+    """
     print("--- Tech Fortress Basic File/Directory Existence Checker Module ---")
     print("This tool attempts to find common files and directories on a target web server.")
     print("Note: This uses external wordlists.")
@@ -71,8 +301,22 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Tech Fortress Basic File/Directory Existence Checker Module. This tool attempts to find common files and directories on a target web server using a wordlist.")
     parser.add_argument("-u", "--url", help="Target base URL (e.g., http://example.com/)", required=True)
     parser.add_argument("-w", "--wordlist", help="Path to the directory/file wordlist file (e.g., /usr/share/wordlists/seclists/Discovery/Web-Content/common.txt)", required=True)
+    parser.add_argument("-c", "--workers", type=int, default=10, help="Concurrent requests over the keep-alive pool (default: 10)")
+    parser.add_argument("--timeout", type=float, default=3, help="Per-request timeout in seconds (default: 3)")
+    parser.add_argument("-x", "--extensions", default="", help="Comma-separated extensions to also try for each word (e.g., .php,.bak)")
+    parser.add_argument("-r", "--recursion-depth", type=int, default=0, help="How many directory levels to recurse into (default: 0)")
+    parser.add_argument("--no-calibrate", action="store_true", help="Skip soft-404 calibration")
+    parser.add_argument("--rate", type=int, help="Maximum requests per second (default: unlimited)")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run with the same arguments from its journal")
+    parser.add_argument("--journal", help="Progress journal file (default: one per command line under ~/.fortress/journal)")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record progress")
+    parser.add_argument("-P", "--processes", type=int, default=1, help="Spread the wordlist over this many processes (0 = one per core; no journal)")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+    start_metrics(args)
 
     target_url = args.url.strip()
     wordlist_path = args.wordlist.strip()
@@ -90,5 +334,30 @@ if __name__ == "__main__":
         print("[!] The provided wordlist is empty or could not be loaded. Exiting.")
         sys.exit(1)
 
-    check_paths(target_url, paths_to_check)
+    extensions = [e if e.startswith('.') else '.' + e for e in args.extensions.split(',') if e.strip()]
+    if args.processes != 1:
+        from fortress_shard import check_paths_sharded
+        try:
+            check_paths_sharded(target_url, wordlist_path, args.processes or None, args.workers, args.timeout, extensions,
+                                args.recursion_depth, not args.no_calibrate, args.rate)
+        except KeyboardInterrupt:
+            print("\n[!] Interrupted.")
+        print("\n" + "="*50 + "\n")
+        sys.exit(0)
+    if args.rate:
+        configure_scheduler(rate=args.rate, workers=args.workers)
+    journal = None
+    if not args.no_journal:
+        journal_params = (target_url, os.path.abspath(wordlist_path), extensions, args.recursion_depth)
+        journal = Journal(args.journal or journal_path("dirbuster", *journal_params), resume=args.resume)
+    try:
+        check_paths(target_url, paths_to_check, args.workers, args.timeout, extensions, args.recursion_depth, not args.no_calibrate, journal)
+    except KeyboardInterrupt:
+        print("\n[!] Interrupted. Progress is saved; re-run with --resume to continue.")
+    finally:
+        if journal:
+            journal.close()
     print("\n" + "="*50 + "\n")
+
+if __name__ == "__main__":
+    main()
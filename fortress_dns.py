@@ -0,0 +1,349 @@
+import random
+import struct
+import socket
+import asyncio
+import argparse
+
+from fortress_scheduler import ProbeScheduler, get_scheduler
+from fortress_metrics import get_metrics
+
+# Record types we ask for or understand in answers
+QTYPES = {"A": 1, "NS": 2, "CNAME": 5, "PTR": 12, "MX": 15, "TXT": 16, "AAAA": 28}
+QTYPE_NAMES = {value: name for name, value in QTYPES.items()}
+QTYPE_OPT = 41 # EDNS0 pseudo-record
+
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+
+metrics = get_metrics("dns") # Query counters and latency (see fortress_metrics)
+
+FALLBACK_RESOLVERS = ["1.1.1.1", "8.8.8.8", "9.9.9.9"]
+
+class DnsError(Exception):
+    """Raised when a DNS message cannot be encoded or decoded."""
+
+def encode_query(qid, name, qtype=1, edns_size=1232):
+    """
+    Builds a recursive query for `name`. An EDNS0 OPT record advertises a larger
+    UDP payload so that most answers fit without falling back to TCP.
+    """
+    header = struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 1 if edns_size else 0) # RD=1
+    question = b""
+    for label in name.strip(".").split("."):
+        try:
+            encoded = label.encode("idna") if not label.isascii() else label.encode()
+        except UnicodeError:
+            raise DnsError(f"Invalid label in name '{name}'")
+        if not encoded or len(encoded) > 63:
+            raise DnsError(f"Invalid label in name '{name}'")
+        question += bytes([len(encoded)]) + encoded
+    question += b"\x00" + struct.pack("!HH", qtype, 1) # Class IN
+    opt = b"\x00" + struct.pack("!HHIH", QTYPE_OPT, edns_size, 0, 0) if edns_size else b""
+    return header + question + opt
+
+def _read_name(data, offset):
+    labels = []
+    jumped = False
+    end = offset
+    for _ in range(128): # Bounds compression-pointer loops
+        if offset >= len(data):
+            raise DnsError("Name runs past end of message")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data):
+                raise DnsError("Truncated compression pointer")
+            if not jumped:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumped = True
+        elif length == 0:
+            if not jumped:
+                end = offset + 1
+            return ".".join(labels), end
+        else:
+            labels.append(data[offset + 1:offset + 1 + length].decode("ascii", errors="replace"))
+            offset += 1 + length
+    raise DnsError("Too many compression pointers")
+
+def decode_response(data):
+    """
+    Parses a DNS response. Returns a dict with id, truncated, rcode and
+    answers as a list of (name, type name, ttl, value) tuples.
+    """
+    if len(data) < 12:
+        raise DnsError("Message shorter than a DNS header")
+    qid, flags, qdcount, ancount, _, _ = struct.unpack("!HHHHHH", data[:12])
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+    answers = []
+    for _ in range(ancount):
+        name, offset = _read_name(data, offset)
+        if offset + 10 > len(data):
+            raise DnsError("Truncated resource record")
+        rtype, _, ttl, rdlength = struct.unpack("!HHIH", data[offset:offset + 10])
+        offset += 10
+        rdata = data[offset:offset + rdlength]
+        if rtype == 1 and rdlength == 4:
+            value = socket.inet_ntop(socket.AF_INET, rdata)
+        elif rtype == 28 and rdlength == 16:
+            value = socket.inet_ntop(socket.AF_INET6, rdata)
+        elif rtype in (2, 5, 12):
+            value, _ = _read_name(data, offset)
+        else:
+            value = rdata
+        answers.append((name.lower(), QTYPE_NAMES.get(rtype, str(rtype)), ttl, value))
+        offset += rdlength
+    return {
+        "id": qid,
+        "truncated": bool(flags & 0x0200),
+        "rcode": flags & 0x000F,
+        "answers": answers,
+    }
+
+def system_resolvers():
+    """
+    Nameservers from /etc/resolv.conf, or public resolvers if none are listed.
+    """
+    servers = []
+    try:
+        with open("/etc/resolv.conf", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    servers.append(parts[1])
+    except OSError:
+        pass
+    return servers or list(FALLBACK_RESOLVERS)
+
+def _parse_resolver(spec):
+    # "1.1.1.1", "1.1.1.1:53", "[::1]:5353" or an (ip, port) tuple
+    if isinstance(spec, tuple):
+        return spec
+    if spec.startswith("["):
+        host, _, port = spec[1:].partition("]:")
+        return host, int(port or 53)
+    if spec.count(":") == 1:
+        host, port = spec.split(":")
+        return host, int(port)
+    return spec, 53
+
+class _ResolverProtocol(asyncio.DatagramProtocol):
+    def __init__(self, upstream):
+        self.upstream = upstream
+
+    def datagram_received(self, data, addr):
+        self.upstream._on_datagram(data)
+
+    def error_received(self, exc):
+        pass # ICMP errors surface as timeouts and are retried
+
+class _Upstream:
+    """
+    One configured resolver: its UDP endpoint and outstanding query ids.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.transport = None
+        self.pending = {} # qid -> future
+        self.sent = 0
+        self.failures = 0
+
+    async def open(self, loop):
+        family = socket.AF_INET6 if ":" in self.address[0] else socket.AF_INET
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _ResolverProtocol(self), remote_addr=self.address, family=family)
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+        for future in self.pending.values():
+            if not future.done():
+                future.cancel()
+
+    def new_id(self):
+        while True:
+            qid = random.getrandbits(16)
+            if qid not in self.pending:
+                return qid
+
+    def _on_datagram(self, data):
+        if len(data) < 2:
+            return
+        qid = struct.unpack("!H", data[:2])[0]
+        future = self.pending.pop(qid, None)
+        if future is not None and not future.done():
+            future.set_result(data)
+
+class AsyncResolver:
+    """
+    Minimal asynchronous stub resolver that speaks DNS over UDP itself.
+
+    Queries are spread round-robin over a pool of upstream resolvers, each with
+    its own rate limit (`rate` queries per second, enforced through a
+    ProbeScheduler keyed by resolver; pass `scheduler` to share one). Lost
+    queries are retried on the next resolver, and truncated answers are
+    re-asked over TCP.
+
+        async with AsyncResolver(["1.1.1.1", "8.8.8.8"]) as resolver:
+            answers = await resolver.query("www.example.com", "A")
+    """
+
+    def __init__(self, resolvers=None, timeout=2.0, retries=2, rate=None, scheduler=None):
+        self.timeout = timeout
+        self.retries = retries
+        if scheduler is None and rate is None:
+            scheduler = get_scheduler() # Share the process-wide limits if configured
+        self.scheduler = scheduler or ProbeScheduler(per_target_rate=rate)
+        self.upstreams = [_Upstream(_parse_resolver(r)) for r in (resolvers or system_resolvers())]
+        self._next = 0
+        self._loop = None
+
+    async def __aenter__(self):
+        self._loop = asyncio.get_running_loop()
+        for upstream in self.upstreams:
+            await upstream.open(self._loop)
+        return self
+
+    async def __aexit__(self, *exc):
+        for upstream in self.upstreams:
+            upstream.close()
+
+    def _pick(self):
+        upstream = self.upstreams[self._next % len(self.upstreams)]
+        self._next += 1
+        return upstream
+
+    async def _query_tcp(self, upstream, packet):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(*upstream.address), self.timeout)
+        try:
+            writer.write(struct.pack("!H", len(packet)) + packet)
+            await writer.drain()
+            length = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), self.timeout))[0]
+            return await asyncio.wait_for(reader.readexactly(length), self.timeout)
+        finally:
+            writer.close()
+
+    async def query(self, name, qtype="A"):
+        """
+        Resolves one name. Returns the decoded response dict (see decode_response),
+        or None if every attempt timed out.
+        """
+        qtype_code = QTYPES[qtype] if isinstance(qtype, str) else qtype
+        for _ in range(self.retries + 1):
+            upstream = self._pick()
+            await self.scheduler.throttle(upstream.address)
+            qid = upstream.new_id()
+            packet = encode_query(qid, name, qtype_code)
+            future = self._loop.create_future()
+            upstream.pending[qid] = future
+            upstream.sent += 1
+            metrics.begin()
+            started = self._loop.time()
+            try:
+                upstream.transport.sendto(packet)
+                data = await asyncio.wait_for(future, self.timeout)
+            except (asyncio.TimeoutError, OSError) as e:
+                metrics.end("timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                upstream.pending.pop(qid, None)
+                upstream.failures += 1
+                continue
+            metrics.end("answer", self._loop.time() - started)
+            try:
+                response = decode_response(data)
+                if response["truncated"]:
+                    response = decode_response(await self._query_tcp(upstream, packet))
+            except (DnsError, asyncio.TimeoutError, asyncio.IncompleteReadError, OSError):
+                upstream.failures += 1
+                continue
+            if response["rcode"] == RCODE_SERVFAIL:
+                continue # Try another resolver
+            return response
+        return None
+
+    async def resolve(self, name, record_types=("A",)):
+        """
+        Resolves `name` for each record type. Returns (addresses, cnames, ttl)
+        where ttl is the smallest TTL seen, or None if the name does not exist.
+        """
+        addresses = []
+        cnames = []
+        ttl = None
+        for qtype in record_types:
+            response = await self.query(name, qtype)
+            if response is None or response["rcode"] != RCODE_NOERROR:
+                continue
+            for _, rtype, record_ttl, value in response["answers"]:
+                if rtype == "CNAME" and value not in cnames:
+                    cnames.append(value)
+                elif rtype in ("A", "AAAA") and value not in addresses:
+                    addresses.append(value)
+                else:
+                    continue
+                ttl = record_ttl if ttl is None else min(ttl, record_ttl)
+        if not addresses and not cnames:
+            return None
+        return addresses, cnames, ttl
+
+    async def resolve_many(self, names, concurrency=1000, record_types=("A",)):
+        """
+        Async generator resolving an iterable of names with up to `concurrency`
+        queries in flight. Yields (name, result) as answers arrive, where result
+        is what resolve() returns.
+        """
+        names = iter(names)
+        results = asyncio.Queue()
+        done = object()
+        errors = [] # Anything but a DnsError, re-raised by the consumer
+
+        async def worker():
+            try:
+                for name in names:
+                    try:
+                        result = await self.resolve(name, record_types)
+                    except DnsError:
+                        result = None
+                    await results.put((name, result))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                results.put_nowait(done) # Always, or the consumer would wait forever
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        remaining = len(workers)
+        try:
+            while remaining:
+                item = await results.get()
+                if item is done:
+                    remaining -= 1
+                    if errors:
+                        raise errors[0]
+                else:
+                    yield item
+        finally:
+            for task in workers:
+                task.cancel()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tech Fortress DNS lookup tool (built-in async resolver).")
+    parser.add_argument("names", nargs="+", help="Names to resolve")
+    parser.add_argument("-t", "--type", default="A", choices=sorted(QTYPES), help="Record type (default: A)")
+    parser.add_argument("-r", "--resolver", action="append", help="Resolver to use, e.g. 1.1.1.1 or 127.0.0.1:5353 (repeatable)")
+    args = parser.parse_args()
+
+    async def main():
+        async with AsyncResolver(args.resolver) as resolver:
+            for name in args.names:
+                response = await resolver.query(name, args.type)
+                if response is None:
+                    print(f"[!] No answer for {name} (timed out).")
+                elif response["rcode"] != RCODE_NOERROR:
+                    print(f"[-] {name}: rcode {response['rcode']}")
+                else:
+                    for rname, rtype, ttl, value in response["answers"]:
+                        print(f"[+] {rname} {ttl} {rtype} {value}")
+
+    asyncio.run(main())
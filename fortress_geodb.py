@@ -0,0 +1,334 @@
+import os
+import sys
+import csv
+import mmap
+import json
+import time
+import socket
+import struct
+import bisect
+import argparse
+from array import array
+
+from fortress_cache import STATE_DIR
+
+try:
+    import numpy # Optional; makes lookup_many vectorized
+except ImportError:
+    numpy = None
+
+DEFAULT_INDEX = os.path.join(STATE_DIR, "geodb.idx")
+MAGIC = b"FGEODB1\n"
+HEADER = struct.Struct("<QQQQ") # IPv4 ranges, IPv6 ranges, records, length of the field-name JSON
+
+# Columns after start/end in a CSV without a header row (the DB-IP "city lite" layout)
+DEFAULT_FIELDS = ["continent", "countryCode", "regionName", "city", "lat", "lon"]
+
+# Header names used by common free databases -> the keys ip-api.com answers with
+FIELD_ALIASES = {
+    "country_code": "countryCode", "country_iso_code": "countryCode", "cc": "countryCode",
+    "country_name": "country", "region": "regionName", "region_name": "regionName",
+    "state": "regionName", "stateprov": "regionName", "subdivision_1_name": "regionName",
+    "city_name": "city", "latitude": "lat", "longitude": "lon", "zip_code": "zip",
+    "postal_code": "zip", "time_zone": "timezone", "asn": "as", "as_name": "org",
+}
+
+def _parse_address(text):
+    # Returns (version, integer) for a dotted/colon address or a plain integer
+    text = text.strip()
+    if text.isdigit():
+        value = int(text)
+        return (4 if value < 1 << 32 else 6), value
+    if ":" in text:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, text), "big")
+    return 4, int.from_bytes(socket.inet_aton(text), "big")
+
+def _pad(data):
+    # Keeps every array section 8-byte aligned so it can be cast in place
+    return data + b"\0" * (-len(data) % 8)
+
+def import_csv(csv_path, index_path=DEFAULT_INDEX, fields=None):
+    """
+    Converts a CSV range database (start, end, location columns...) into the
+    binary index GeoDatabase maps. Start/end may be addresses or integers;
+    IPv4 and IPv6 rows may be mixed. Identical locations are stored once.
+    A header row, if present, names the location columns; otherwise `fields`
+    (default DEFAULT_FIELDS) does. Returns the number of ranges imported.
+    """
+    v4 = ([], [], []) # starts, ends, record ids
+    v6 = ([], [], [])
+    records = {} # location tuple -> record id (interning)
+    with open(csv_path, "r", newline="", encoding="utf-8", errors="replace") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                start_version, start = _parse_address(row[0])
+                end_version, end = _parse_address(row[1])
+            except (OSError, ValueError, IndexError):
+                if fields is None and not v4[0] and not v6[0]:
+                    fields = [FIELD_ALIASES.get(name.strip().lower(), name.strip()) for name in row[2:]]
+                continue # Header or malformed row
+            if start_version != end_version or end < start:
+                continue
+            location = tuple(value.strip() for value in row[2:])
+            record = records.setdefault(location, len(records))
+            ranges = v4 if start_version == 4 else v6
+            ranges[0].append(start)
+            ranges[1].append(end)
+            ranges[2].append(record)
+    fields = fields or DEFAULT_FIELDS
+
+    def sort_ranges(ranges):
+        order = sorted(range(len(ranges[0])), key=ranges[0].__getitem__)
+        return [[column[i] for i in order] for column in ranges]
+
+    v4 = sort_ranges(v4)
+    v6 = sort_ranges(v6)
+    mask = (1 << 64) - 1
+    blobs = [_pad(array("I", v4[0]).tobytes()), _pad(array("I", v4[1]).tobytes()), _pad(array("I", v4[2]).tobytes())]
+    for column in v6[:2]:
+        blobs.append(array("Q", (value >> 64 for value in column)).tobytes())
+        blobs.append(array("Q", (value & mask for value in column)).tobytes())
+    blobs.append(_pad(array("I", v6[2]).tobytes()))
+    encoded = [json.dumps(list(location)).encode() for location in records]
+    offsets = array("Q", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    blobs.append(offsets.tobytes())
+    blobs.append(b"".join(encoded))
+
+    names = _pad(json.dumps(fields).encode())
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(len(v4[0]), len(v6[0]), len(records), len(names)))
+        f.write(names)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(temp_path, index_path)
+    return len(v4[0]) + len(v6[0])
+
+def _rank(starts, values):
+    """
+    For each value, how many of the sorted `starts` are <= it (numpy's
+    searchsorted(side="right")). Big batches are sorted first (value and
+    original position packed into one uint64, which sorts much faster than an
+    argsort) and merged against `starts` in a single pass, which avoids a
+    cache-missing binary search per value.
+    """
+    if len(values) < len(starts) // 4:
+        return numpy.searchsorted(starts, values, side="right").astype(numpy.int64)
+    count = len(values)
+    packed = (values.astype(numpy.uint64) << numpy.uint64(32)) | numpy.arange(count, dtype=numpy.uint64)
+    packed.sort()
+    ordered = (packed >> numpy.uint64(32)).astype(numpy.uint32)
+    # Every start lands before the first query that is >= it; a running count
+    # of those landings is the rank of each sorted query
+    landed = numpy.searchsorted(ordered, starts, side="left")
+    ranks = numpy.cumsum(numpy.bincount(landed, minlength=count + 1)[:count])
+    result = numpy.empty(count, dtype=numpy.int64)
+    result[(packed & numpy.uint64(0xFFFFFFFF)).astype(numpy.int64)] = ranks
+    return result
+
+class GeoDatabase:
+    """
+    Read-only, memory-mapped view of an index written by import_csv.
+
+    IPv4 ranges are three sorted uint32 arrays (start, end, record id) and
+    IPv6 ranges the same with 128-bit bounds split into two uint64 arrays.
+    Nothing is parsed when the index is opened; a lookup is one binary search
+    over the mapping plus decoding the (cached) location record.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX):
+        if sys.byteorder != "little":
+            raise ValueError("GeoDatabase indexes are little-endian only")
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a fortress geolocation index")
+        offset = len(MAGIC)
+        self.v4_count, self.v6_count, self.record_count, names_length = HEADER.unpack_from(self._mm, offset)
+        offset += HEADER.size
+        self.fields = json.loads(bytes(self._mm[offset:offset + names_length]).rstrip(b"\0"))
+        offset += names_length
+        self._views = [memoryview(self._mm)]
+
+        def take(typecode, count, size):
+            nonlocal offset
+            section = self._views[0][offset:offset + count * size].cast(typecode)
+            self._views.append(section)
+            offset += count * size + (-(count * size) % 8)
+            return section
+
+        self.v4_starts = take("I", self.v4_count, 4)
+        self.v4_ends = take("I", self.v4_count, 4)
+        self.v4_records = take("I", self.v4_count, 4)
+        self.v6_start_hi = take("Q", self.v6_count, 8)
+        self.v6_start_lo = take("Q", self.v6_count, 8)
+        self.v6_end_hi = take("Q", self.v6_count, 8)
+        self.v6_end_lo = take("Q", self.v6_count, 8)
+        self.v6_records = take("I", self.v6_count, 4)
+        self._offsets = take("Q", self.record_count + 1, 8)
+        self._blob = offset
+        self._decoded = {} # record id -> dict, filled on demand
+
+    def __len__(self):
+        return self.v4_count + self.v6_count
+
+    def record(self, record_id):
+        """
+        The location dict for a record id (decoded once, then cached).
+        """
+        location = self._decoded.get(record_id)
+        if location is None:
+            start = self._blob + self._offsets[record_id]
+            end = self._blob + self._offsets[record_id + 1]
+            location = dict(zip(self.fields, json.loads(self._mm[start:end])))
+            self._decoded[record_id] = location
+        return location
+
+    def locate4(self, value):
+        """
+        Record id for an IPv4 address given as an integer, or -1.
+        """
+        i = bisect.bisect_right(self.v4_starts, value) - 1
+        if i >= 0 and value <= self.v4_ends[i]:
+            return self.v4_records[i]
+        return -1
+
+    def locate6(self, value):
+        """
+        Record id for an IPv6 address given as an integer, or -1.
+        """
+        hi, lo = value >> 64, value & 0xFFFFFFFFFFFFFFFF
+        starts_hi, starts_lo = self.v6_start_hi, self.v6_start_lo
+        low, high = 0, self.v6_count
+        while low < high: # bisect_right over (hi, lo) pairs
+            middle = (low + high) // 2
+            if (hi, lo) < (starts_hi[middle], starts_lo[middle]):
+                high = middle
+            else:
+                low = middle + 1
+        i = low - 1
+        if i >= 0 and (hi, lo) <= (self.v6_end_hi[i], self.v6_end_lo[i]):
+            return self.v6_records[i]
+        return -1
+
+    def locate(self, ip):
+        try:
+            version, value = _parse_address(ip)
+        except (OSError, ValueError):
+            return -1
+        return self.locate4(value) if version == 4 else self.locate6(value)
+
+    def lookup(self, ip):
+        """
+        Geolocates one address. Returns an answer shaped like ip-api.com's
+        (status "success" plus location fields, or status "fail").
+        """
+        record_id = self.locate(ip)
+        if record_id < 0:
+            return {"status": "fail", "message": "not in offline database", "query": ip}
+        return dict(self.record(record_id), status="success", query=ip)
+
+    def locate_many(self, ips):
+        """
+        Record ids (-1 for misses) for many IPv4 addresses at once. `ips` may be
+        address strings, integers or a numpy uint32 array. With numpy the search
+        runs as one vectorized searchsorted over the mapped arrays and returns an
+        int64 array; without it a list is returned.
+        """
+        if numpy is None:
+            if ips and isinstance(ips[0], str):
+                return [self.locate(ip) for ip in ips]
+            return [self.locate4(value) for value in ips]
+        if isinstance(ips, numpy.ndarray):
+            values = ips.astype(numpy.uint32, copy=False)
+        else:
+            ips = list(ips)
+            if ips and isinstance(ips[0], str):
+                # inet_aton is the fastest way from dotted quads to big-endian words
+                values = numpy.frombuffer(b"".join(map(socket.inet_aton, ips)), dtype=">u4").astype(numpy.uint32)
+            else:
+                values = numpy.asarray(ips, dtype=numpy.uint32)
+        starts = numpy.frombuffer(self.v4_starts, dtype=numpy.uint32)
+        if not len(starts):
+            return numpy.full(len(values), -1, dtype=numpy.int64)
+        ends = numpy.frombuffer(self.v4_ends, dtype=numpy.uint32)
+        records = numpy.frombuffer(self.v4_records, dtype=numpy.uint32)
+        index = _rank(starts, values) - 1
+        clipped = numpy.maximum(index, 0)
+        hit = (index >= 0) & (values <= ends[clipped])
+        return numpy.where(hit, records[clipped].astype(numpy.int64), -1)
+
+    def lookup_many(self, ips):
+        """
+        Geolocates many addresses. Returns a dict of ip -> answer (see lookup).
+        IPv4 addresses go through locate_many; IPv6 ones are looked up one by one.
+        """
+        results = {}
+        v4 = []
+        for ip in dict.fromkeys(ips):
+            if ":" in ip:
+                results[ip] = self.lookup(ip)
+            else:
+                v4.append(ip)
+        try:
+            record_ids = self.locate_many(v4)
+        except OSError: # A malformed address somewhere; fall back to one by one
+            record_ids = [self.locate(ip) for ip in v4]
+        for ip, record_id in zip(v4, record_ids):
+            record_id = int(record_id)
+            if record_id < 0:
+                results[ip] = {"status": "fail", "message": "not in offline database", "query": ip}
+            else:
+                results[ip] = dict(self.record(record_id), status="success", query=ip)
+        return results
+
+    def close(self):
+        # Drop the array views first; an mmap cannot close while they exist
+        for view in reversed(self._views):
+            view.release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tech Fortress offline geolocation database.")
+    parser.add_argument("--import-csv", metavar="CSV", help="Build the index from a CSV range database (start,end,location...)")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help=f"Index file (default: {DEFAULT_INDEX})")
+    parser.add_argument("--fields", help="Comma-separated names of the CSV's location columns if it has no header row")
+    parser.add_argument("ips", nargs="*", help="Addresses to look up")
+    args = parser.parse_args()
+
+    if args.import_csv:
+        print(f"[*] Importing {args.import_csv} ...")
+        started = time.time()
+        fields = [name.strip() for name in args.fields.split(",")] if args.fields else None
+        try:
+            count = import_csv(args.import_csv, args.index, fields)
+        except OSError as e:
+            print(f"[!] Import failed: {e}")
+            sys.exit(1)
+        print(f"[+] Imported {count} ranges into {args.index} in {time.time() - started:.1f}s")
+
+    if args.ips:
+        try:
+            database = GeoDatabase(args.index)
+        except (OSError, ValueError) as e:
+            print(f"[!] Could not open index: {e}")
+            sys.exit(1)
+        for ip, answer in database.lookup_many(args.ips).items():
+            if answer["status"] == "success":
+                print(f"[+] {ip}: " + ", ".join(f"{key}={value}" for key, value in answer.items() if key not in ("status", "query")))
+            else:
+                print(f"[-] {ip}: {answer['message']}")
@@ -1,35 +1,225 @@
 import requests
 import sys
+import os
+import json
+import time
+import atexit
+import argparse
+import threading
 import ipaddress # To validate IP addresses
+from collections import OrderedDict
+from concurrent.futures import wait
 
-def geolocate_ip(ip_address):
+from fortress_cache import STATE_DIR
+from fortress_scheduler import ProbeScheduler
+from fortress_geodb import GeoDatabase, DEFAULT_INDEX as DEFAULT_GEO_INDEX
+from fortress_sink import emit, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import get_metrics, add_metrics_arguments, start_from_args as start_metrics
+
+# Base URL of the geolocation API; point it at a local stand-in for testing
+API_BASE = os.environ.get("FORTRESS_GEO_API", "http://ip-api.com")
+DEFAULT_GEO_CACHE = os.path.join(STATE_DIR, "geo-cache.json")
+
+BATCH_SIZE = 100 # Most IPs ip-api.com accepts in one batch POST
+BATCH_RATE = 15 / 60 # Batch requests per second on the free tier (15 per minute)
+FIELDS = "status,message,query,country,countryCode,region,regionName,city,zip,lat,lon,timezone,isp,org,as"
+
+metrics = get_metrics("geo") # Batch request counters and latency (see fortress_metrics)
+
+class GeoCache:
+    """
+    On-disk geolocation cache: ip (or network prefix) -> API answer, with a TTL
+    and LRU eviction. Failed lookups the API answers itself (private or
+    reserved ranges) are cached too; network errors are not.
+
+    With prefix=(24, 48), addresses share the entry of their IPv4 /24 or
+    IPv6 /48, which trades some accuracy for far fewer lookups on big sweeps.
+    The prefix can also be given per call, so one shared cache can serve
+    runs with and without it.
+    """
+
+    def __init__(self, path=DEFAULT_GEO_CACHE, max_entries=100000, ttl=7 * 86400, prefix=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix = prefix
+        self._entries = OrderedDict() # key -> (expires at, answer dict)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+
+    def key(self, ip, prefix=None):
+        prefix = prefix or self.prefix
+        if not prefix:
+            return ip
+        address = ipaddress.ip_address(ip)
+        length = prefix[0] if address.version == 4 else prefix[1]
+        return str(ipaddress.ip_network(f"{ip}/{length}", strict=False))
+
+    def _load(self):
+        # Reads the snapshot on first use, so importing the module stays cheap
+        self._loaded = True
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, (expires, answer) in snapshot.items():
+            if expires > now:
+                self._entries[key] = (expires, answer)
+
+    def get(self, ip, prefix=None):
+        """
+        Returns the cached answer for ip, or None on a miss.
+        """
+        key = self.key(ip, prefix)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            answer = dict(entry[1])
+        answer["query"] = ip # A prefix entry was stored under another address
+        return answer
+
+    def put(self, ip, answer, prefix=None):
+        key = self.key(ip, prefix)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._entries[key] = (time.time() + self.ttl, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            snapshot = dict(self._entries)
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, self.path) # Never leave a half-written cache behind
+
+# The cache every lookup goes through unless told otherwise (saved at exit)
+geo_cache = GeoCache()
+atexit.register(geo_cache.save)
+
+class RateLimitGate:
+    """
+    Follows the API's own rate-limit headers: X-Rl is the number of requests
+    left in the current window and X-Ttl the seconds until it resets. When
+    the window is used up (or a 429 comes back) every worker waits it out.
+    """
+
+    def __init__(self):
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self.blocked_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def update(self, response):
+        remaining = response.headers.get("X-Rl")
+        reset = response.headers.get("X-Ttl")
+        if response.status_code != 429 and remaining != "0":
+            return
+        try:
+            delay = int(reset) + 1
+        except (TypeError, ValueError):
+            delay = 60 # No hint: the free tier's window is one minute
+        with self._lock:
+            if self.blocked_until < time.monotonic(): # Report each pause once, not per worker
+                print(f"[*] Geolocation API rate limit reached; waiting {delay}s...")
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+def print_geolocation(data):
+    """
+    Prints one successful API answer.
+    """
+    emit("geo", None, ip=data.get('query'), **{key: value for key, value in data.items() if key != "query"})
+    print("\n--- Geolocation Details ---")
+    print(f"    IP Address: {data.get('query')}")
+    print(f"    Country:    {data.get('country')} ({data.get('countryCode')})")
+    print(f"    Region:     {data.get('regionName')} ({data.get('region')})")
+    print(f"    City:       {data.get('city')}")
+    print(f"    ZIP Code:   {data.get('zip')}")
+    print(f"    Latitude:   {data.get('lat')}")
+    print(f"    Longitude:  {data.get('lon')}")
+    print(f"    Timezone:   {data.get('timezone')}")
+    print(f"    ISP:        {data.get('isp')}")
+    print(f"    Org:        {data.get('org')}")
+    print(f"    AS:         {data.get('as')}")
+
+def report_geolocation(ip, data):
+    """
+    One-line report of a bulk answer. Returns True if the IP was located.
+    """
+    fields = {key: value for key, value in data.items() if key != "query"}
+    if data.get("status") == "success":
+        emit("geo", f"[+] {ip}: {data.get('city')}, {data.get('regionName')}, {data.get('country') or data.get('countryCode')} ({data.get('as')})", ip=ip, **fields)
+        return True
+    emit("geo", f"[-] {ip}: {data.get('message', 'Unknown error.')}", ip=ip, **fields)
+    return False
+
+def geolocate_ip(ip_address, cache=geo_cache, api_base=None, database=None, prefix=None):
     """
     Fetches geolocation information for a given IP address using ip-api.com.
+    Answers are served from (and stored in) `cache`, by network if `prefix`
+    is given (see GeoCache); pass cache=None to always ask the API. With an
+    offline GeoDatabase no network request is made. Returns the answer dict,
+    or None if the lookup failed.
     """
-    api_url = f"http://ip-api.com/json/{ip_address}"
+    api_url = f"{api_base or API_BASE}/json/{ip_address}"
     print(f"\n[*] Querying geolocation for: {ip_address}")
 
+    if database is not None:
+        data = database.lookup(ip_address)
+        if data["status"] == "success":
+            print_geolocation(data)
+        else:
+            print(f"[!] Geolocation failed for {ip_address}: {data['message']}")
+        return data
+
+    data = cache.get(ip_address, prefix) if cache else None
+    if data:
+        print("[*] (cached)")
+        if data.get("status") == "success":
+            print_geolocation(data)
+        else:
+            print(f"[!] Geolocation failed for {ip_address}: {data.get('message', 'Unknown error.')}")
+        return data
+
     try:
-        response = requests.get(api_url, timeout=5)
+        response = requests.get(api_url, params={"fields": FIELDS}, timeout=5)
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
 
         data = response.json() # Parse JSON response
 
+        if data and data.get("status") in ("success", "fail") and cache:
+            cache.put(ip_address, data, prefix)
         if data and data.get("status") == "success":
-            print("\n--- Geolocation Details ---")
-            print(f"    IP Address: {data.get('query')}")
-            print(f"    Country:    {data.get('country')} ({data.get('countryCode')})")
-            print(f"    Region:     {data.get('regionName')} ({data.get('region')})")
-            print(f"    City:       {data.get('city')}")
-            print(f"    ZIP Code:   {data.get('zip')}")
-            print(f"    Latitude:   {data.get('lat')}")
-            print(f"    Longitude:  {data.get('lon')}")
-            print(f"    Timezone:   {data.get('timezone')}")
-            print(f"    ISP:        {data.get('isp')}")
-            print(f"    Org:        {data.get('org')}")
-            print(f"    AS:         {data.get('as')}")
+            print_geolocation(data)
+            return data
         elif data and data.get("status") == "fail":
             print(f"[!] Geolocation failed for {ip_address}: {data.get('message', 'Unknown error.')}")
+            return data
         else:
             print(f"[!] Unexpected response from API for {ip_address}: {response.text}")
 
@@ -46,11 +236,161 @@ def geolocate_ip(ip_address):
     except Exception as e:
         print(f"[!] An unexpected error occurred: {e}")
 
-if __name__ == "__main__":
+def _post_batch(session, api_url, ips, gate, timeout, retries=3):
+    # One batch POST; waits out the API's rate limit and retries on a 429
+    payload = [{"query": ip} for ip in ips]
+    for _ in range(retries + 1):
+        gate.wait()
+        metrics.begin()
+        started = time.monotonic()
+        try:
+            response = session.post(api_url, params={"fields": FIELDS}, json=payload, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            metrics.end("timeout" if isinstance(e, requests.exceptions.Timeout) else "error")
+            raise
+        gate.update(response)
+        if response.status_code == 429:
+            metrics.end("rate_limited", time.monotonic() - started)
+            continue
+        metrics.end("answer" if response.ok else "error", time.monotonic() - started)
+        response.raise_for_status()
+        return response.json()
+    raise requests.exceptions.HTTPError(f"Still rate limited after {retries} retries", response=response)
+
+_session = None
+
+def _api_session():
+    # One session per process, so later lookups reuse the open API connections
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+def geolocate_many(ip_addresses, cache=geo_cache, api_base=None, concurrency=2, rate=BATCH_RATE, timeout=10, database=None,
+                   prefix=None):
+    """
+    Geolocates many IPs at once. Addresses are deduplicated and checked
+    against `cache` (by network if `prefix` is given, see GeoCache); the
+    rest go to the API's batch endpoint, BATCH_SIZE per POST, with at most
+    `concurrency` POSTs in flight and no more than `rate` POSTs per second
+    (on top of the API's own X-Rl / X-Ttl limits).
+    With an offline GeoDatabase everything is answered locally instead.
+    Returns a dict of ip -> answer dict (status "success" or "fail");
+    addresses whose batch could not be fetched are left out.
+    """
+    if database is not None:
+        valid = []
+        for ip in ip_addresses:
+            try:
+                ipaddress.ip_address(ip)
+                valid.append(ip)
+            except ValueError:
+                print(f"[!] Skipping '{ip}': not a valid IP address.")
+        return database.lookup_many(valid)
+
+    results = {}
+    missing = []
+    shared = {} # Cache key -> the IPs that will share its answer (prefix caching)
+    for ip in dict.fromkeys(ip_addresses):
+        try:
+            ipaddress.ip_address(ip)
+        except ValueError:
+            print(f"[!] Skipping '{ip}': not a valid IP address.")
+            continue
+        data = cache.get(ip, prefix) if cache else None
+        if data:
+            results[ip] = data
+            continue
+        key = cache.key(ip, prefix) if cache else ip
+        if key not in shared:
+            shared[key] = []
+            missing.append(ip) # Only the first IP of a prefix is sent
+        shared[key].append(ip)
+
+    if missing:
+        batches = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+        print(f"[*] Geolocating {len(missing)} IPs in {len(batches)} batch requests ({len(results)} cached)...")
+        api_url = f"{api_base or API_BASE}/batch"
+        session = _api_session()
+        gate = RateLimitGate()
+        # Burst of one window's worth of requests, then `rate` per second
+        scheduler = ProbeScheduler(per_target_rate=rate, per_target_concurrency=concurrency,
+                                   workers=concurrency, burst=max(1, rate * 60))
+        futures = {scheduler.submit(api_url, _post_batch, session, api_url, batch, gate, timeout): batch
+                   for batch in batches}
+        try:
+            wait(futures)
+            for future, batch in futures.items():
+                try:
+                    answers = future.result()
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    print(f"[!] Batch of {len(batch)} IPs failed: {e}")
+                    continue
+                for ip, data in zip(batch, answers): # Answers come back in request order
+                    if data.get("status") not in ("success", "fail"):
+                        continue
+                    if cache:
+                        cache.put(ip, data, prefix)
+                    for other in shared[cache.key(ip, prefix) if cache else ip]:
+                        results[other] = dict(data, query=other)
+        finally:
+            scheduler.shutdown()
+    if cache:
+        cache.save()
+    return results
+
+def main(argv=None):
+    """
+    Command-line entry point (also used by the fortress daemon).
+    """
     print("--- Tech Fortress IP Geolocation Module ---")
     print("This tool fetches approximate geographical information for an IP address.")
     print("Data provided by ip-api.com")
 
+    parser = argparse.ArgumentParser(description="Tech Fortress IP Geolocation Module.")
+    parser.add_argument("ips", nargs="*", help="IP addresses to look up in bulk (default: interactive mode)")
+    parser.add_argument("-f", "--file", help="File with one IP address per line to look up in bulk")
+    parser.add_argument("--api", help=f"Base URL of the geolocation API (default: {API_BASE})")
+    parser.add_argument("-c", "--concurrency", type=int, default=2, help="Batch requests in flight (default: 2)")
+    parser.add_argument("--prefix", action="store_true", help="Cache by /24 (IPv4) or /48 (IPv6) network instead of by address")
+    parser.add_argument("--no-cache", action="store_true", help="Always query the API")
+    parser.add_argument("--offline", action="store_true", help="Answer from an offline index built with fortress_geodb.py instead of the API")
+    parser.add_argument("--db", default=DEFAULT_GEO_INDEX, help=f"Offline index to use with --offline (default: {DEFAULT_GEO_INDEX})")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+    start_metrics(args)
+
+    database = None
+    if args.offline:
+        try:
+            database = GeoDatabase(args.db)
+        except (OSError, ValueError) as e:
+            print(f"[!] Could not open offline database: {e}")
+            print("    Build one with: python fortress_geodb.py --import-csv <ranges.csv>")
+            sys.exit(1)
+        print(f"[*] Using offline database {args.db} ({len(database)} ranges)")
+
+    cache = None if args.no_cache else geo_cache
+    prefix = (24, 48) if args.prefix else None # Per run: the daemon shares geo_cache between jobs
+
+    bulk_ips = list(args.ips)
+    if args.file:
+        try:
+            with open(args.file, "r") as f:
+                bulk_ips.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+        except OSError as e:
+            print(f"[!] Could not read '{args.file}': {e}")
+            sys.exit(1)
+
+    if bulk_ips:
+        results = geolocate_many(bulk_ips, cache, args.api, args.concurrency, database=database, prefix=prefix)
+        located = sum(report_geolocation(ip, data) for ip, data in results.items())
+        flush_results()
+        print(f"[*] Geolocated {located} of {len(set(bulk_ips))} IPs.")
+        sys.exit(0)
+
     while True:
         target_ip = input("Enter target IP address (e.g., 8.8.8.8 or 'exit' to quit): ").strip()
 
@@ -69,5 +409,8 @@ if __name__ == "__main__":
             print(f"[!] '{target_ip}' is not a valid IP address. Please enter a valid IPv4 or IPv6 address.")
             continue
 
-        geolocate_ip(target_ip)
+        geolocate_ip(target_ip, cache, args.api, database, prefix)
         print("\n" + "="*50 + "\n") # Separator for multiple lookups
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+
+from fortress_cache import STATE_DIR
+
+JOURNAL_DIR = os.path.join(STATE_DIR, "journal")
+
+class Journal:
+    """
+    Append-only progress journal for long scans.
+
+    One record per line:
+        H {json}           job parameters (e.g. the probe-order seed)
+        D <unit>           a finished work unit (e.g. "10.0.0.1:443")
+        W <scope> <n>      all work in `scope` up to position n is finished (resume from n)
+        F {json}           a finding (open port, subdomain, path, ...)
+
+    Records are buffered in memory and written + fsync'ed in batches (every
+    `batch` records or `interval` seconds), so the hot path only appends to a
+    list. A crash loses at most one batch, which is simply redone on resume.
+    With resume=True the existing file is read into `state` first; otherwise
+    it is truncated.
+    """
+
+    def __init__(self, path, resume=False, batch=1000, interval=1.0):
+        self.path = path
+        self.batch = batch
+        self.interval = interval
+        self.state = JournalState()
+        if resume:
+            self.state = load_journal(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "ab" if resume else "wb")
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def _append(self, line):
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.batch:
+                self._flush_locked()
+            elif len(self._buffer) % 64 == 0 and time.monotonic() - self._last_flush >= self.interval:
+                self._flush_locked()
+
+    def header(self, **params):
+        self._append("H " + json.dumps(params) + "\n")
+        self.flush()
+
+    def done(self, unit):
+        self._append(f"D {unit}\n")
+
+    def watermark(self, position, scope=""):
+        self._append(f"W {scope} {position}\n")
+
+    def found(self, kind, **fields):
+        fields["type"] = kind
+        self._append("F " + json.dumps(fields) + "\n")
+
+    def _flush_locked(self):
+        if self._buffer and not self._closed:
+            self._file.write("".join(self._buffer).encode())
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class JournalState:
+    """
+    What a previous run recorded: parameters, finished units, per-scope
+    watermarks and findings.
+    """
+
+    def __init__(self):
+        self.params = {}
+        self.done = set()
+        self.watermarks = {}
+        self.findings = []
+
+    def is_done(self, unit):
+        return unit in self.done
+
+    def position(self, scope=""):
+        return self.watermarks.get(scope, 0)
+
+    def findings_of(self, kind):
+        return [f for f in self.findings if f.get("type") == kind]
+
+def load_journal(path):
+    """
+    Reads a journal back. A torn last line (crash mid-write) is ignored.
+    """
+    state = JournalState()
+    try:
+        with open(path, "rb") as f:
+            data = f.read().decode("utf-8", errors="replace")
+    except FileNotFoundError:
+        return state
+    for line in data.split("\n")[:-1]: # Anything after the last newline is incomplete
+        kind, _, rest = line.partition(" ")
+        try:
+            if kind == "D":
+                state.done.add(rest)
+            elif kind == "W":
+                scope, _, position = rest.rpartition(" ")
+                state.watermarks[scope] = max(state.watermarks.get(scope, 0), int(position))
+            elif kind == "F":
+                state.findings.append(json.loads(rest))
+            elif kind == "H":
+                state.params.update(json.loads(rest))
+        except ValueError:
+            continue
+    return state
+
+class OffsetTracker:
+    """
+    Turns out-of-order completions into an in-order watermark.
+
+    Work is issued in position order; when the oldest outstanding unit finishes,
+    the watermark advances past every consecutive finished unit. Memory is
+    bounded by the number of units in flight, not by the size of the job.
+    """
+
+    def __init__(self, journal=None, scope=""):
+        self.journal = journal
+        self.scope = scope
+        self._order = [] # Distinct positions in issue order (consumed from _head)
+        self._head = 0
+        self._keys = {} # key -> positions issued under that key
+        self._outstanding = {} # position -> units issued for it that have not finished
+
+    def issue(self, key, position):
+        """
+        Registers a unit of work. One position may be issued several times
+        (e.g. a word tried with several extensions); it only counts as finished
+        once every unit issued for it has completed.
+        """
+        self._keys.setdefault(key, []).append(position)
+        if position not in self._outstanding:
+            self._outstanding[position] = 0
+            self._order.append(position)
+        self._outstanding[position] += 1
+
+    def complete(self, key):
+        positions = self._keys.get(key)
+        if not positions:
+            return
+        position = positions.pop(0)
+        if not positions:
+            del self._keys[key]
+        self._outstanding[position] -= 1
+        advanced = None
+        order = self._order
+        while self._head < len(order) and self._outstanding[order[self._head]] == 0:
+            advanced = order[self._head]
+            del self._outstanding[advanced]
+            self._head += 1
+        if self._head > 4096: # Drop the consumed prefix now and then
+            del order[:self._head]
+            self._head = 0
+        if advanced is not None and self.journal:
+            self.journal.watermark(advanced, self.scope)
+
+def iter_from(items, start=0):
+    """
+    Yields (position, item) for items from `start` on. Wordlists report byte
+    offsets (so resuming seeks straight to the spot); other iterables use the
+    1-based index.
+    """
+    if hasattr(items, "iter_with_offsets"):
+        yield from items.iter_with_offsets(start)
+        return
+    for index, item in enumerate(items, 1):
+        if index > start:
+            yield index, item
+
+def journal_path(tool, *params):
+    """
+    Default journal location for a job, derived from the tool and its parameters
+    so the same command line finds its own journal again.
+    """
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return os.path.join(JOURNAL_DIR, f"{tool}-{digest}.log")
@@ -0,0 +1,415 @@
+import os
+import sys
+import time
+import atexit
+import threading
+
+# Latency histogram layout (HDR-style log-linear buckets over microseconds):
+# values below SUB_BUCKETS get a bucket each, every power of two above that is
+# split into SUB_BUCKETS equal buckets, so any value is within ~6% of its
+# bucket. 40 powers of two reach far beyond any timeout we use.
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+BUCKETS = SUB_BUCKETS * 40
+
+# Histogram boundaries (seconds) for the Prometheus export
+PROMETHEUS_LE = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Shards kept before those of finished threads are folded together
+RETIRE_AT = 256
+
+def _bucket(micros):
+    if micros < SUB_BUCKETS:
+        return max(0, micros)
+    shift = micros.bit_length() - SUB_BITS - 1
+    return min(BUCKETS - 1, SUB_BUCKETS * (shift + 1) + (micros >> shift) - SUB_BUCKETS)
+
+def _bucket_value(index):
+    # Upper edge (microseconds) of a bucket, the value a percentile reports
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+class _Shard:
+    # One thread's counters; only that thread ever writes to it
+    __slots__ = ("counts", "buckets", "total_micros", "first", "last", "owner")
+
+    def __init__(self, owner=None):
+        self.owner = owner # The writing thread (None for absorbed totals)
+        self.counts = {}
+        self.buckets = [0] * BUCKETS
+        self.total_micros = 0
+        self.first = None # monotonic time of the first probe
+        self.last = None # ... and of the last finished one
+
+class ModuleMetrics:
+    """
+    Counters, an in-flight gauge and a latency histogram for one module.
+
+    Every thread updates its own shard (no locks, no shared writes on the hot
+    path); readers add the shards up. Events are free-form names such as
+    "probes", "open", "refused", "timeout" or "error".
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._local = threading.local()
+        self._shards = []
+        self._remote = {} # source -> shard holding another process's totals
+        self._retired = None # Totals of threads that have finished
+        self._retire_at = RETIRE_AT
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+                if len(self._shards) >= self._retire_at:
+                    self._retire_finished()
+            return shard
+
+    def _retire_finished(self):
+        # Folds the shards of finished threads into one (caller holds the
+        # lock), so a thread-per-probe scan does not leave a shard per thread
+        live = []
+        for shard in self._shards:
+            if shard.owner is None or shard.owner.is_alive():
+                live.append(shard)
+                continue
+            retired = self._retired
+            if retired is None:
+                retired = self._retired = _Shard()
+                live.append(retired)
+            for event, value in list(shard.counts.items()):
+                retired.counts[event] = retired.counts.get(event, 0) + value
+            for index, value in enumerate(shard.buckets):
+                if value:
+                    retired.buckets[index] += value
+            retired.total_micros += shard.total_micros
+            if shard.first is not None and (retired.first is None or shard.first < retired.first):
+                retired.first = shard.first
+            if shard.last is not None and (retired.last is None or shard.last > retired.last):
+                retired.last = shard.last
+        self._shards = live
+        self._retire_at = max(RETIRE_AT, 2 * len(live)) # Keeps the folding amortised
+
+    def count(self, event, amount=1):
+        counts = self._shard().counts
+        counts[event] = counts.get(event, 0) + amount
+
+    def observe(self, seconds):
+        """
+        Records one latency sample.
+        """
+        shard = self._shard()
+        micros = int(seconds * 1000000)
+        shard.buckets[_bucket(micros)] += 1
+        shard.total_micros += micros
+
+    def begin(self):
+        """
+        A probe went out: counts it and raises the in-flight gauge.
+        """
+        shard = self._shard()
+        if shard.first is None:
+            shard.first = time.monotonic()
+        counts = shard.counts
+        counts["probes"] = counts.get("probes", 0) + 1
+        counts["in_flight"] = counts.get("in_flight", 0) + 1
+
+    def end(self, event, seconds=None):
+        """
+        A probe finished with `event` (e.g. "open", "timeout"), optionally
+        taking `seconds`.
+        """
+        shard = self._shard()
+        shard.last = time.monotonic()
+        counts = shard.counts
+        counts["in_flight"] = counts.get("in_flight", 0) - 1
+        counts[event] = counts.get(event, 0) + 1
+        if seconds is not None:
+            self.observe(seconds)
+
+    def elapsed(self):
+        """
+        Seconds from the first probe to the last finished one (or to now while
+        probes are still in flight).
+        """
+        with self._lock:
+            shards = list(self._shards)
+        firsts = [shard.first for shard in shards if shard.first is not None]
+        if not firsts:
+            return 0.0
+        lasts = [shard.last for shard in shards if shard.last is not None]
+        end = max(lasts) if lasts and not self.snapshot()[0].get("in_flight") else time.monotonic()
+        return max(0.0, end - min(firsts))
+
+    def export(self):
+        """
+        This process's totals as a picklable dict (see absorb).
+        """
+        counts, buckets, total = self.snapshot()
+        with self._lock:
+            shards = [shard for shard in self._shards if shard not in self._remote.values()]
+        firsts = [shard.first for shard in shards if shard.first is not None]
+        lasts = [shard.last for shard in shards if shard.last is not None]
+        return {"counts": counts, "buckets": buckets, "total": total,
+                "first": min(firsts) if firsts else None, "last": max(lasts) if lasts else None}
+
+    def absorb(self, source, exported):
+        """
+        Takes in the latest export() of another process (`source` tells them
+        apart); a newer export from the same source replaces the older one.
+        """
+        with self._lock:
+            shard = self._remote.get(source)
+            if shard is None:
+                shard = self._remote[source] = _Shard()
+                self._shards.append(shard)
+        shard.counts = dict(exported["counts"])
+        shard.buckets = list(exported["buckets"])
+        shard.total_micros = int(exported["total"] * 1000000)
+        shard.first = exported["first"]
+        shard.last = exported["last"]
+
+    def reset(self):
+        """
+        Starts counting from zero again. Meant for quiet moments between runs
+        in a long-lived process (the fortress daemon); shards of threads that
+        have finished are dropped so they do not pile up.
+        """
+        with self._lock:
+            self._shards = [shard for shard in self._shards if shard.owner is not None and shard.owner.is_alive()]
+            self._remote = {}
+            self._retired = None
+            self._retire_at = RETIRE_AT
+            for shard in self._shards:
+                shard.counts = {}
+                shard.buckets = [0] * BUCKETS
+                shard.total_micros = 0
+                shard.first = shard.last = None
+
+    def snapshot(self):
+        """
+        Returns (counts dict, histogram bucket list, latency sum in seconds).
+        """
+        with self._lock:
+            self._retire_finished()
+            shards = list(self._shards)
+        counts = {}
+        buckets = [0] * BUCKETS
+        total = 0
+        for shard in shards:
+            for event, value in list(shard.counts.items()):
+                counts[event] = counts.get(event, 0) + value
+            for index, value in enumerate(shard.buckets):
+                if value:
+                    buckets[index] += value
+            total += shard.total_micros
+        return counts, buckets, total / 1000000
+
+def percentile(buckets, fraction):
+    """
+    Latency (seconds) below which `fraction` of the samples fall, or None.
+    """
+    samples = sum(buckets)
+    if not samples:
+        return None
+    wanted = max(1, int(samples * fraction + 0.5))
+    seen = 0
+    for index, value in enumerate(buckets):
+        seen += value
+        if seen >= wanted:
+            return _bucket_value(index) / 1000000
+    return None
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+def get_metrics(name):
+    """
+    The metrics of module `name`, created on first use.
+    """
+    metrics = _modules.get(name)
+    if metrics is None:
+        with _modules_lock:
+            metrics = _modules.setdefault(name, ModuleMetrics(name))
+    return metrics
+
+def export_all():
+    """
+    export() of every module, keyed by module name.
+    """
+    return {name: metrics.export() for name, metrics in list(_modules.items())}
+
+def reset_all():
+    """
+    reset() of every module.
+    """
+    for metrics in list(_modules.values()):
+        metrics.reset()
+
+def _milliseconds(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+def _active():
+    # Modules that have seen any traffic, in a stable order
+    return [metrics for _, metrics in sorted(_modules.items()) if metrics.snapshot()[0].get("probes")]
+
+class Reporter:
+    """
+    Background thread that shows a live progress line on stderr (every
+    second) and/or rewrites a Prometheus textfile (every `interval` seconds).
+    """
+
+    def __init__(self, progress=False, prometheus=None, interval=5.0):
+        self.progress = progress
+        self.prometheus = prometheus
+        self.interval = interval
+        self._stop = threading.Event()
+        self._last = {} # module -> (time, probes) of the previous tick
+        self._thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self._thread.start()
+
+    def _rate(self, metrics, probes, now):
+        previous = self._last.get(metrics.name)
+        self._last[metrics.name] = (now, probes)
+        if previous is None or now <= previous[0]:
+            return probes / max(metrics.elapsed(), 1e-6)
+        return (probes - previous[1]) / (now - previous[0])
+
+    def progress_line(self):
+        now = time.monotonic()
+        parts = []
+        for metrics in _active():
+            counts, buckets, _ = metrics.snapshot()
+            outcomes = " ".join(f"{event} {value}" for event, value in sorted(counts.items())
+                                if event not in ("probes", "in_flight") and value)
+            parts.append(f"{metrics.name}: {counts['probes']} ({self._rate(metrics, counts['probes'], now):,.0f}/s, "
+                         f"{counts.get('in_flight', 0)} in flight) {outcomes} p50 {_milliseconds(percentile(buckets, 0.5))}")
+        return " | ".join(parts)
+
+    def _run(self):
+        next_export = time.monotonic() + self.interval
+        while not self._stop.wait(1.0):
+            if self.progress:
+                line = self.progress_line()
+                if line:
+                    sys.stderr.write("\r[*] " + line[:max(20, _terminal_width() - 5)] + "\033[K")
+                    sys.stderr.flush()
+            if self.prometheus and time.monotonic() >= next_export:
+                write_prometheus(self.prometheus)
+                next_export = time.monotonic() + self.interval
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        if self.progress:
+            sys.stderr.write("\r\033[K")
+            sys.stderr.flush()
+        if self.prometheus:
+            write_prometheus(self.prometheus)
+
+def _terminal_width():
+    try:
+        return os.get_terminal_size(sys.stderr.fileno()).columns
+    except OSError:
+        return 120
+
+def print_summary():
+    """
+    Prints totals, rates and latency percentiles of every active module.
+    """
+    active = _active()
+    if not active:
+        return
+    print("\n--- Probe Statistics ---")
+    for metrics in active:
+        counts, buckets, total = metrics.snapshot()
+        elapsed = metrics.elapsed()
+        outcomes = ", ".join(f"{event} {value}" for event, value in sorted(counts.items())
+                             if event not in ("probes", "in_flight") and value)
+        print(f"    {metrics.name}: {counts['probes']} probes in {elapsed:.1f}s ({counts['probes'] / max(elapsed, 1e-6):,.0f}/s)")
+        if outcomes:
+            print(f"        outcomes: {outcomes}")
+        samples = sum(buckets)
+        if samples:
+            print(f"        latency:  p50 {_milliseconds(percentile(buckets, 0.5))}  p90 {_milliseconds(percentile(buckets, 0.9))}  "
+                  f"p99 {_milliseconds(percentile(buckets, 0.99))}  max {_milliseconds(percentile(buckets, 1.0))}  "
+                  f"mean {_milliseconds(total / samples)} ({samples} samples)")
+
+def write_prometheus(path):
+    """
+    Writes every module's metrics in the Prometheus text format, replacing
+    `path` atomically (for node_exporter's textfile collector).
+    """
+    lines = [
+        "# HELP fortress_probes_total Probes sent, by module.",
+        "# TYPE fortress_probes_total counter",
+    ]
+    snapshots = [(metrics.name, metrics.snapshot()) for _, metrics in sorted(_modules.items())]
+    for name, (counts, _, _) in snapshots:
+        lines.append(f'fortress_probes_total{{module="{name}"}} {counts.get("probes", 0)}')
+    lines += ["# HELP fortress_events_total Probe outcomes (open, refused, timeout, error, ...), by module.",
+              "# TYPE fortress_events_total counter"]
+    for name, (counts, _, _) in snapshots:
+        for event, value in sorted(counts.items()):
+            if event not in ("probes", "in_flight"):
+                lines.append(f'fortress_events_total{{module="{name}",event="{event}"}} {value}')
+    lines += ["# HELP fortress_in_flight Probes currently waiting for an answer, by module.",
+              "# TYPE fortress_in_flight gauge"]
+    for name, (counts, _, _) in snapshots:
+        lines.append(f'fortress_in_flight{{module="{name}"}} {counts.get("in_flight", 0)}')
+    lines += ["# HELP fortress_latency_seconds Probe latency, by module.",
+              "# TYPE fortress_latency_seconds histogram"]
+    for name, (_, buckets, total) in snapshots:
+        cumulative = 0
+        index = 0
+        for le in PROMETHEUS_LE:
+            limit = le * 1000000
+            while index < BUCKETS and _bucket_value(index) <= limit:
+                cumulative += buckets[index]
+                index += 1
+            lines.append(f'fortress_latency_seconds_bucket{{module="{name}",le="{le}"}} {cumulative}')
+        samples = sum(buckets)
+        lines.append(f'fortress_latency_seconds_bucket{{module="{name}",le="+Inf"}} {samples}')
+        lines.append(f'fortress_latency_seconds_sum{{module="{name}"}} {total:.6f}')
+        lines.append(f'fortress_latency_seconds_count{{module="{name}"}} {samples}')
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temporary, path)
+    except OSError as e:
+        print(f"[!] Could not write metrics to {path}: {e}")
+
+_reporter = None
+
+def start(progress=False, stats=False, prometheus=None, interval=5.0):
+    """
+    Starts live reporting: a progress line, a summary at exit and/or a
+    Prometheus textfile. Counting itself is always on.
+    """
+    global _reporter
+    if stats:
+        atexit.register(print_summary)
+    if progress or prometheus:
+        _reporter = Reporter(progress, prometheus, interval)
+        atexit.register(_reporter.stop) # atexit runs last-in first-out: the line is cleared before the summary
+
+def add_metrics_arguments(parser):
+    """
+    Adds the shared --progress / --stats / --prometheus options.
+    """
+    parser.add_argument("--progress", action="store_true", help="Show a live progress line (probes/s, in flight, outcomes, latency) on stderr")
+    parser.add_argument("--stats", action="store_true", help="Print probe counts, rates and latency percentiles at the end")
+    parser.add_argument("--prometheus", metavar="FILE", help="Keep a Prometheus textfile with the probe metrics up to date")
+
+def start_from_args(args):
+    start(args.progress, args.stats, args.prometheus)
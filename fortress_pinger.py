@@ -1,6 +1,30 @@
 import os
 import sys
 import subprocess # More robust than os.system for capturing output
+import socket
+import struct
+import select
+import time
+import queue
+import asyncio
+import threading
+import argparse
+from collections import deque
+
+from fortress_targets import HostSpace, PortSpace, ProbeSpace, parse_targets
+from fortress_scheduler import ProbeScheduler, get_scheduler
+from fortress_sink import emit, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import get_metrics, add_metrics_arguments, start_from_args as start_metrics
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
+
+# Probed when ICMP is not permitted; a SYN-ACK *or* a RST proves the host is up
+COMMON_TCP_PORTS = (80, 443, 22, 445, 3389, 139, 8080, 21, 25, 53)
+
+metrics = get_metrics("ping") # Echo request counters and RTTs (see fortress_metrics)
 
 def ping_host(target):
     """
@@ -19,7 +43,7 @@ def ping_host(target):
             check=True # Raise an exception for non-zero exit codes (e.g., host unreachable)
         )
         # If ping is successful, it will not raise CalledProcessError
-        print(f"[+] {target} is UP!")
+        emit("host_up", f"[+] {target} is UP!", host=target, method="ping")
         # print(process.stdout) # Uncomment to see full ping output
     except subprocess.CalledProcessError as e:
         # Host is down or unreachable
@@ -31,10 +55,264 @@ def ping_host(target):
     except Exception as e:
         print(f"[!] An unexpected error occurred while pinging {target}: {e}")
 
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def _open_icmp_socket(family):
+    """
+    Opens a non-blocking ICMP socket: the unprivileged datagram kind first
+    (needs net.ipv4.ping_group_range), then a raw socket if we are root.
+    Returns (sock, raw) or raises PermissionError.
+    """
+    proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+    for kind in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            sock = socket.socket(family, kind, proto)
+            sock.setblocking(False)
+            return sock, kind == socket.SOCK_RAW
+        except OSError:
+            continue
+    raise PermissionError("ICMP sockets are not permitted for this user")
+
+class IcmpSweeper:
+    """
+    Sends ICMP echo requests to many hosts from one socket per address family
+    and matches replies back by source address and sequence number.
+    """
+
+    def __init__(self, timeout=1.0, retries=1, window=4096, rate=None, scheduler=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.window = min(window, 65535) # Sequence numbers are 16 bits
+        # Pacing: `rate` echo requests per second, or a shared ProbeScheduler
+        self.scheduler = scheduler or (ProbeScheduler(rate=rate) if rate else get_scheduler())
+        self.ident = os.getpid() & 0xFFFF # Only checked on raw sockets; the kernel owns it on datagram sockets
+        self._sockets = {} # family -> (sock, raw)
+        self._pending = {} # seq -> (ip, sent time, attempt, generation)
+        self._deadlines = deque() # (deadline, seq, generation), in send order
+        self._resend = deque() # (ip, attempt) to send before pulling new hosts
+        self._seq = 0
+        self._generation = 0 # Counts sends; tells a reused seq from its earlier probe
+
+    def _socket_for(self, family):
+        if family not in self._sockets:
+            self._sockets[family] = _open_icmp_socket(family)
+        return self._sockets[family]
+
+    def open(self):
+        """
+        Fails early (PermissionError) if ICMP is not available at all.
+        """
+        self._socket_for(socket.AF_INET)
+
+    def close(self):
+        for sock, _ in self._sockets.values():
+            sock.close()
+        self._sockets = {}
+
+    def _next_seq(self):
+        while True:
+            self._seq = (self._seq + 1) & 0xFFFF
+            if self._seq not in self._pending:
+                return self._seq
+
+    def _send(self, ip, attempt):
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        sock, raw = self._socket_for(family)
+        seq = self._next_seq()
+        kind = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMP6_ECHO_REQUEST
+        payload = struct.pack("!d", time.time())
+        header = struct.pack("!BBHHH", kind, 0, 0, self.ident, seq)
+        # The kernel fills in the ICMPv6 checksum itself
+        checksum = _checksum(header + payload) if family == socket.AF_INET else 0
+        packet = struct.pack("!BBHHH", kind, 0, checksum, self.ident, seq) + payload
+        sock.sendto(packet, (ip, 0))
+        metrics.begin()
+        now = time.monotonic()
+        self._generation += 1
+        self._pending[seq] = (ip, now, attempt, self._generation)
+        self._deadlines.append((now + self.timeout, seq, self._generation))
+
+    def _read_replies(self, sock, raw, family):
+        while True:
+            try:
+                data, addr = sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            if raw and family == socket.AF_INET:
+                data = data[(data[0] & 0x0F) * 4:] # Strip the IPv4 header
+            if len(data) < 8:
+                continue
+            kind, _, _, ident, seq = struct.unpack("!BBHHH", data[:8])
+            if kind not in (ICMP_ECHO_REPLY, ICMP6_ECHO_REPLY):
+                continue
+            if raw and ident != self.ident:
+                continue # Someone else's ping
+            entry = self._pending.get(seq)
+            if entry is None or entry[0] != addr[0]:
+                continue
+            del self._pending[seq]
+            rtt = time.monotonic() - entry[1]
+            metrics.end("reply", rtt)
+            yield entry[0], rtt
+
+    def sweep(self, hosts):
+        """
+        Generator yielding (ip, rtt) for every host in `hosts` that answers.
+        """
+        hosts = iter(hosts)
+        exhausted = False
+        while True:
+            # Send while there is room in the window (and the rate allows it)
+            while len(self._pending) < self.window:
+                if self.scheduler and self.scheduler.ready_in() > 0:
+                    break
+                if self._resend:
+                    ip, attempt = self._resend.popleft()
+                elif not exhausted:
+                    ip = next(hosts, None)
+                    if ip is None:
+                        exhausted = True
+                        continue
+                    attempt = 0
+                else:
+                    break
+                try:
+                    if self.scheduler:
+                        self.scheduler.take(ip)
+                    self._send(ip, attempt)
+                except (BlockingIOError, InterruptedError):
+                    self._resend.appendleft((ip, attempt)) # Socket buffer full; drain replies first
+                    break
+                except OSError:
+                    metrics.count("error") # Unreachable network, bad address etc. - host is not up
+
+            if exhausted and not self._pending and not self._resend:
+                return
+
+            now = time.monotonic()
+            wait = self._deadlines[0][0] - now if self._deadlines else 0.05
+            if self.scheduler and (self._resend or not exhausted):
+                wait = min(wait, self.scheduler.ready_in())
+            readable, _, _ = select.select([sock for sock, _ in self._sockets.values()], [], [], max(0, wait))
+            for family, (sock, raw) in self._sockets.items():
+                if sock in readable:
+                    yield from self._read_replies(sock, raw, family)
+
+            # Expire requests that were not answered in time
+            now = time.monotonic()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, seq, generation = self._deadlines.popleft()
+                entry = self._pending.get(seq)
+                if entry is None or entry[3] != generation:
+                    continue # Answered already, and seq may have wrapped round to a newer probe
+                del self._pending[seq]
+                metrics.end("timeout")
+                if entry[2] < self.retries:
+                    self._resend.append((entry[0], entry[2] + 1))
+
+def tcp_sweep(hosts, ports=COMMON_TCP_PORTS, timeout=1.0, concurrency=2000, scheduler=None):
+    """
+    Generator yielding (ip, port) for the first TCP answer (open or refused)
+    from each host. Runs the async connect engine in a background thread.
+    """
+    from fortress_scanner import AsyncConnectScanner, raise_fd_limit
+
+    results = queue.Queue()
+    seen = set() # Only touched on the event loop thread
+    done = object()
+    errors = []
+
+    def on_answer(ip, port, is_open):
+        if ip not in seen:
+            seen.add(ip)
+            results.put((ip, port))
+            scanner.skip_host(ip) # The host is up; its other ports need not be asked
+
+    probes = ProbeSpace(hosts, PortSpace([(p, p) for p in ports]))
+    scanner = AsyncConnectScanner(timeout, raise_fd_limit(concurrency), retries=0, on_answer=on_answer, scheduler=scheduler)
+
+    def run():
+        try:
+            # Probes are drawn lazily, so hosts that already answered are skipped here
+            asyncio.run(scanner.run(probe for probe in probes if probe[0] not in seen))
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            results.put(done)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = results.get()
+        if item is done:
+            if errors:
+                raise errors[0]
+            return
+        yield item
+
+def sweep_hosts(target_specs, timeout=1.0, retries=1, rate=None, force_tcp=False):
+    """
+    Discovers live hosts among target specs (IPs, CIDRs, ranges, hostnames or
+    target files). Uses ICMP echo when the OS allows it, otherwise TCP connect
+    probes on common ports. Yields (ip, method) as hosts are found up.
+    """
+    hosts = target_specs if isinstance(target_specs, HostSpace) else parse_targets(target_specs).resolved()
+    if not force_tcp:
+        sweeper = IcmpSweeper(timeout, retries, rate=rate)
+        try:
+            sweeper.open()
+        except PermissionError:
+            print("[!] ICMP sockets are not permitted here; falling back to TCP connect probes.")
+        else:
+            try:
+                for ip, rtt in sweeper.sweep(hosts):
+                    yield ip, f"icmp {rtt * 1000:.1f} ms"
+            finally:
+                sweeper.close()
+            return
+    for ip, port in tcp_sweep(hosts, timeout=timeout, scheduler=ProbeScheduler(rate=rate) if rate else None):
+        yield ip, f"tcp/{port}"
+
+def sweep(target_specs, timeout=1.0, retries=1, rate=None, force_tcp=False):
+    """
+    Runs sweep_hosts, printing live hosts as they are found. Returns them.
+    """
+    hosts = parse_targets(target_specs).resolved()
+    print(f"[*] Sweeping {len(hosts)} hosts...")
+    started = time.monotonic()
+    up = []
+    for ip, method in sweep_hosts(hosts, timeout, retries, rate, force_tcp):
+        emit("host_up", f"[+] {ip} is UP! ({method})", host=ip, method=method)
+        up.append(ip)
+    flush_results()
+    print(f"[*] Sweep completed in {time.monotonic() - started:.1f}s. {len(up)} of {len(hosts)} hosts are up.")
+    return up
+
 if __name__ == "__main__":
     print("--- Tech Fortress Host Discovery Module ---")
     print("This tool performs a basic ICMP ping to check host reachability.")
 
+    parser = argparse.ArgumentParser(description="Host discovery. Without --sweep, runs interactively.")
+    parser.add_argument("-s", "--sweep", nargs="+", metavar="TARGET", help="Sweep targets: IPs, CIDRs (10.0.0.0/16), ranges (10.0.0.1-50) or target files")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Seconds to wait for each reply (default: 1.0)")
+    parser.add_argument("--retries", type=int, default=1, help="Retries for unanswered hosts (default: 1)")
+    parser.add_argument("--rate", type=int, help="Maximum probes per second (default: unlimited)")
+    parser.add_argument("--tcp", action="store_true", help="Use TCP connect probes even if ICMP is available")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    start_metrics(args)
+
+    if args.sweep:
+        sweep(args.sweep, args.timeout, args.retries, args.rate, args.tcp)
+        sys.exit(0)
+
     while True:
         target_host = input("Enter target IP address or hostname (e.g., 192.168.1.1 or example.com, or 'exit' to quit): ").strip()
 
@@ -0,0 +1,366 @@
+import time
+import queue
+import socket
+import asyncio
+import argparse
+import ipaddress
+import threading
+
+from fortress_cache import resolve_all
+from fortress_targets import HostSpace, parse_ports
+from fortress_scanner import AsyncConnectScanner, raise_fd_limit, service_name
+from fortress_sink import emit as emit_result, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import add_metrics_arguments, start_from_args as start_metrics
+
+DEFAULT_PORTS = "21,22,23,25,53,80,110,143,443,445,993,995,3306,3389,5432,5900,6379,8000,8080,8443,8888,9200"
+HTTP_PORTS = {80, 81, 591, 3000, 5000, 5601, 8000, 8008, 8080, 8081, 8888, 9000, 9090, 9200}
+HTTPS_PORTS = {443, 4443, 6443, 8443, 9443}
+
+_END = object() # Marks the end of a stage's input
+
+class Stage:
+    """
+    One step of a recon pipeline.
+
+    Items put into a stage are handled by `workers` threads, each calling
+    handler(item, emit); everything a handler emits goes to the stages wired
+    after it with to(). A streaming stage (stream=True) instead gets one call,
+    handler(stage, emit), and pulls items itself with stage.items() or
+    stage.batches(), which suits tools that take a whole (blocking) stream of
+    work such as the bulk banner grabber. A stage's input ends once every
+    stage feeding it has finished, so the end of a run ripples through the
+    whole graph without any stage waiting for another to finish first.
+    """
+
+    def __init__(self, name, handler, workers=1, stream=False, accepts=None, backlog=10000):
+        self.name = name
+        self.handler = handler
+        self.workers = 1 if stream else workers
+        self.stream = stream
+        self.accepts = accepts # Optional filter: only items it returns True for are taken
+        self.inbox = queue.Queue(maxsize=backlog) # A full inbox makes the stages feeding it wait
+        self.downstream = []
+        self.handled = 0
+        self._upstream = 0
+        self._finished_upstream = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def to(self, *stages):
+        for stage in stages:
+            self.downstream.append(stage)
+            stage._upstream += 1
+        return self
+
+    def put(self, item):
+        if self.accepts is None or self.accepts(item):
+            self.inbox.put(item)
+
+    def emit(self, item):
+        for stage in self.downstream:
+            stage.put(item)
+
+    def feed(self, items):
+        """
+        Puts items in from outside the graph, then ends the input (for the
+        first stage of a pipeline, which has no upstream stage).
+        """
+        for item in items:
+            self.put(item)
+        self.upstream_done()
+
+    def upstream_done(self):
+        with self._lock:
+            self._finished_upstream += 1
+            if self._finished_upstream < self._upstream:
+                return
+        for _ in range(self.workers):
+            self.inbox.put(_END)
+
+    def items(self):
+        """
+        Yields input items as they arrive until the input ends.
+        """
+        while True:
+            item = self.inbox.get()
+            if item is _END:
+                return
+            self.handled += 1
+            yield item
+
+    def batches(self, size, wait):
+        """
+        Yields lists of up to `size` items; a partial batch is released once
+        no new item has arrived for `wait` seconds, so nothing sits waiting for
+        a batch to fill up.
+        """
+        batch = []
+        while True:
+            try:
+                item = self.inbox.get(timeout=wait if batch else None)
+            except queue.Empty:
+                yield batch
+                batch = []
+                continue
+            if item is _END:
+                break
+            self.handled += 1
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _work(self):
+        try:
+            if self.stream:
+                self.handler(self, self.emit)
+            else:
+                for item in self.items():
+                    try:
+                        self.handler(item, self.emit)
+                    except Exception as e:
+                        print(f"[!] {self.name}: {item}: {e}")
+        except Exception as e:
+            print(f"[!] {self.name} stage failed: {e}")
+            for _ in self.items():
+                pass # Keep draining so upstream stages are not left hanging
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                for stage in self.downstream:
+                    stage.upstream_done()
+
+    def start(self):
+        self._running = self.workers
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"stage-{self.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+class ReconResults:
+    """
+    Everything a pipeline run learned, per (host name, address).
+    """
+
+    def __init__(self):
+        self.hosts = {} # (name, ip) -> dict
+        self._lock = threading.Lock()
+
+    def record(self, name, ip, **fields):
+        with self._lock:
+            host = self.hosts.setdefault((name, ip), {"ports": {}})
+            port = fields.pop("port", None)
+            if port is None:
+                host.update(fields)
+            else:
+                host["ports"].setdefault(port, {}).update(fields)
+
+    def print_summary(self):
+        print("\n" + "="*50)
+        print("          Recon Summary")
+        print("="*50)
+        if not self.hosts:
+            print("[*] No hosts found.")
+            return
+        for (name, ip), host in sorted(self.hosts.items()):
+            label = f"{name} ({ip})" if name != ip else ip
+            where = f" - {host['location']}" if host.get("location") else ""
+            print(f"\n[+] {label}{where}")
+            if not host["ports"]:
+                print("    No open ports found.")
+            for port, details in sorted(host["ports"].items()):
+                notes = [details[key] for key in ("service", "title", "certificate") if details.get(key)]
+                print(f"    {port}/tcp open" + (f"  {' | '.join(notes)}" if notes else ""))
+
+def _is_address(text):
+    try:
+        ipaddress.ip_address(text)
+        return True
+    except ValueError:
+        return False
+
+def _pairs(stage, addresses):
+    # (name, port) pairs for the bulk tools, remembering which address each name was scanned at
+    for name, ip, port in stage.items():
+        addresses[(name, port)] = ip
+        yield name, port
+
+def run_pipeline(target_specs, ports=DEFAULT_PORTS, wordlist=None, timeout=1, scan_workers=8, scan_concurrency=500,
+                 banners=True, web=True, certs=True, geo=True, geo_database=None, resolvers=None):
+    """
+    Runs subdomain enumeration -> port scan -> banner grab / web info / TLS
+    certificates, plus geolocation of every address, as one streaming graph.
+    Each stage works on results as soon as the previous stage produces them:
+    the first subdomain found is being port scanned while enumeration goes on,
+    and the first open port is being fingerprinted while the scan goes on.
+    target_specs are hostnames, IPs, CIDRs, ranges or target files; with a
+    wordlist, subdomains of every hostname are enumerated as well (through
+    `resolvers` if given).
+    Returns a ReconResults.
+    """
+    ports = ports if hasattr(ports, "port_at") else parse_ports(ports)
+    results = ReconResults()
+    targets = HostSpace.parse(target_specs)
+    concurrency = raise_fd_limit(scan_concurrency * scan_workers) // scan_workers
+
+    def expand(spec, emit):
+        # Every target becomes (name, ip) pairs; names are resolved and, with a wordlist, enumerated
+        if _is_address(spec):
+            emit((spec, spec))
+            return
+        try:
+            for ip in resolve_all(spec):
+                emit((spec, ip))
+        except socket.gaierror:
+            print(f"[!] Error: Could not resolve hostname '{spec}'.")
+        if wordlist:
+            from fortress_subenum import enumerate_subdomains
+            from fortress_wordlist import Wordlist
+            with Wordlist(wordlist) as words:
+                enumerate_subdomains(spec, words, resolvers, on_found=lambda name, addresses: [emit((name, ip)) for ip in addresses])
+
+    scanned = set()
+    scanned_lock = threading.Lock()
+
+    def scan(host, emit):
+        name, ip = host
+        with scanned_lock:
+            if ip in scanned:
+                return # Another name for an address already scanned
+            scanned.add(ip)
+        results.record(name, ip)
+
+        def found(ip, port):
+            emit_result("open_port", f"[+] {name}:{port} is OPEN" + (f" ({ip})" if name != ip else ""),
+                 host=ip, name=name, port=port, service=service_name(port))
+            results.record(name, ip, port=port)
+            emit((name, ip, port))
+
+        scanner = AsyncConnectScanner(timeout, concurrency, on_open=found)
+        asyncio.run(scanner.run((ip, port) for port in ports))
+
+    def grab(stage, emit):
+        from fortress_bannergrab import grab_banners, report_banner
+        from fortress_probes import describe
+        addresses = {}
+        for host, port, banner, error, match in grab_banners(_pairs(stage, addresses)):
+            report_banner(host, port, banner, error, match)
+            if match:
+                results.record(host, addresses[(host, port)], port=port, service=describe(match))
+
+    def webinfo(stage, emit):
+        from fortress_webinfo import iter_web_info, report_web_info
+        from fortress_dirbuster import make_session
+        import urllib3
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        session = make_session(20, hosts=20)
+        session.verify = False # Recon wants the page behind self-signed and expired certificates too
+        where = {}
+
+        def urls():
+            for name, ip, port in stage.items():
+                scheme = "https" if port in HTTPS_PORTS else "http"
+                default = (scheme == "http" and port == 80) or (scheme == "https" and port == 443)
+                url = f"{scheme}://{name}/" if default else f"{scheme}://{name}:{port}/"
+                where[url] = (name, ip, port)
+                yield url
+
+        for url, result in iter_web_info(urls(), session=session):
+            if report_web_info(url, result) and result.get("title"):
+                name, ip, port = where[url]
+                results.record(name, ip, port=port, title=f"\"{result['title']}\"")
+
+    def tls(stage, emit):
+        from fortress_tls import harvest_certificates, report_certificate
+        addresses = {}
+        for host, port, cert, error in harvest_certificates(_pairs(stage, addresses)):
+            if report_certificate(host, port, cert, error):
+                results.record(host, addresses[(host, port)], port=port, certificate=f"cert {cert['common_name'] or cert['subject']}")
+
+    def geolocate(stage, emit):
+        from fortress_geolocate import geolocate_many, report_geolocation
+        seen = set()
+        for batch in stage.batches(100, 2.0):
+            # Private and loopback addresses have no location worth asking for
+            wanted = [ip for name, ip in batch if ip not in seen and ipaddress.ip_address(ip).is_global]
+            seen.update(ip for _, ip in batch)
+            if not wanted:
+                continue
+            answers = geolocate_many(wanted, database=geo_database)
+            for ip in wanted:
+                if ip in answers:
+                    report_geolocation(ip, answers[ip])
+            for name, ip in batch:
+                data = answers.get(ip)
+                if data and data.get("status") == "success":
+                    location = ", ".join(str(data[key]) for key in ("city", "country") if data.get(key))
+                    results.record(name, ip, location=location or data.get("countryCode", ""))
+
+    expand_stage = Stage("expand", expand, workers=4)
+    scan_stage = Stage("scan", scan, workers=scan_workers)
+    expand_stage.to(scan_stage)
+    stages = [expand_stage, scan_stage]
+    if geo:
+        geo_stage = Stage("geolocate", geolocate, stream=True)
+        expand_stage.to(geo_stage)
+        stages.append(geo_stage)
+    if banners:
+        stages.append(Stage("banners", grab, stream=True))
+    if web:
+        stages.append(Stage("webinfo", webinfo, stream=True, accepts=lambda item: item[2] in HTTP_PORTS or item[2] in HTTPS_PORTS))
+    if certs:
+        from fortress_tls import TLS_PORTS
+        stages.append(Stage("tls", tls, stream=True, accepts=lambda item: item[2] in TLS_PORTS))
+    scan_stage.to(*[stage for stage in stages if stage.name in ("banners", "webinfo", "tls")])
+
+    print(f"[*] Recon pipeline: {' -> '.join(stage.name for stage in stages[:2])} -> {', '.join(stage.name for stage in stages[2:]) or 'nothing'}")
+    print(f"[*] Scanning ports: {len(ports)} per host")
+    started = time.monotonic()
+    for stage in stages:
+        stage.start()
+    expand_stage.feed(iter(targets)) # Lazily, so a /8 is never a list in memory
+    for stage in stages:
+        stage.join()
+    flush_results()
+    print(f"\n[*] Pipeline finished in {time.monotonic() - started:.1f}s: {scan_stage.handled} addresses, "
+          f"{sum(len(host['ports']) for host in results.hosts.values())} open ports.")
+    return results
+
+def main(argv=None):
+    """
+    Command-line entry point (also used by `fortress.py --batch`).
+    """
+    parser = argparse.ArgumentParser(description="Tech Fortress recon pipeline: enumerate, scan, fingerprint and geolocate in one pass.")
+    parser.add_argument("targets", nargs="*", default=["target.txt"], help="Targets or target files (default: target.txt)")
+    parser.add_argument("-w", "--wordlist", help="Also enumerate subdomains of every hostname with this wordlist")
+    parser.add_argument("-r", "--resolver", action="append", help="DNS resolver for subdomain enumeration, e.g. 1.1.1.1 (repeatable)")
+    parser.add_argument("-p", "--ports", default=DEFAULT_PORTS, help="Ports to scan on every host, e.g. 1-1024 or top1000 (default: common service ports)")
+    parser.add_argument("--timeout", type=float, default=1, help="Port scan timeout in seconds (default: 1)")
+    parser.add_argument("--scan-workers", type=int, default=8, help="Hosts scanned at once (default: 8)")
+    parser.add_argument("--no-banners", action="store_true", help="Skip banner grabbing")
+    parser.add_argument("--no-web", action="store_true", help="Skip web info on HTTP(S) ports")
+    parser.add_argument("--no-certs", action="store_true", help="Skip TLS certificate collection")
+    parser.add_argument("--no-geo", action="store_true", help="Skip geolocation")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+    start_metrics(args)
+
+    results = run_pipeline(args.targets, args.ports, args.wordlist, args.timeout, args.scan_workers,
+                           banners=not args.no_banners, web=not args.no_web, certs=not args.no_certs, geo=not args.no_geo,
+                           resolvers=args.resolver)
+    results.print_summary()
+    print("\n" + "="*50 + "\n")
+
+if __name__ == "__main__":
+    main()
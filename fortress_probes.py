@@ -0,0 +1,310 @@
+import os
+import re
+import heapq
+import argparse
+import threading
+from collections import defaultdict
+
+DEFAULT_PROBES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fortress-service-probes.txt")
+
+ESCAPES = {"r": "\r", "n": "\n", "t": "\t", "0": "\0", "\\": "\\"}
+
+class ProbeFileError(ValueError):
+    """Raised for a malformed line in a probe database."""
+
+def _unescape(text):
+    # \r \n \t \0 \\ and \xHH inside probe payloads
+    out = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            following = text[i + 1]
+            if following == "x" and i + 3 < len(text):
+                out.append(chr(int(text[i + 2:i + 4], 16)))
+                i += 4
+                continue
+            out.append(ESCAPES.get(following, following))
+            i += 2
+            continue
+        out.append(char)
+        i += 1
+    return "".join(out).encode("latin-1")
+
+def _split_delimited(text, start):
+    # text[start] is the delimiter; returns (content, index after the closing delimiter)
+    delimiter = text[start]
+    end = text.find(delimiter, start + 1)
+    if end < 0:
+        raise ProbeFileError(f"Unterminated {delimiter}...{delimiter} in: {text}")
+    return text[start + 1:end], end + 1
+
+def _parse_ports(spec):
+    ports = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            low, high = part.split("-", 1)
+            ports.update(range(int(low), int(high) + 1))
+        elif part:
+            ports.add(int(part))
+    return ports
+
+def _first_byte(pattern, flags):
+    """
+    The byte every match must start with, if the regex pins one down
+    (anchored, case-sensitive, no top-level alternation); otherwise None.
+    """
+    if flags & re.IGNORECASE or not pattern.startswith("^"):
+        return None
+    depth = 0
+    in_class = False
+    i = 1
+    while i < len(pattern): # A top-level | would let a match start anywhere
+        char = pattern[i]
+        if char == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return None
+        i += 1
+    char = pattern[1:2]
+    if char == "\\":
+        following = pattern[2:3]
+        if following == "x":
+            value, used = int(pattern[3:5], 16), 5
+        elif following in ESCAPES:
+            value, used = ord(ESCAPES[following]), 3
+        elif following.isalnum() or not following:
+            return None # \d, \w, \s, ... are classes
+        else:
+            value, used = ord(following), 3
+    elif not char or char in ".[(|*+?{$)":
+        return None
+    else:
+        value, used = ord(char), 2
+    if pattern[used:used + 1] in ("*", "?", "{"):
+        return None # The first byte is optional
+    return value
+
+class MatchRule:
+    """
+    One match/softmatch line: a precompiled bytes regex plus the product,
+    version and info templates filled from its groups.
+    """
+
+    def __init__(self, service, pattern, flags, templates, soft, order):
+        self.service = service
+        self.regex = re.compile(pattern.encode("latin-1"), flags)
+        self.templates = templates # {"product": "$1", ...}
+        self.soft = soft
+        self.order = order # Position in the file; earlier rules win
+        self.first_byte = _first_byte(pattern, flags)
+
+    def apply(self, data):
+        found = self.regex.search(data)
+        if not found:
+            return None
+        result = {"service": self.service}
+        if self.soft:
+            result["soft"] = True
+        for field, template in self.templates.items():
+            value = re.sub(r"\$(\d)", lambda m: (found.group(int(m.group(1))) or b"").decode("utf-8", "replace"), template)
+            value = " ".join(value.split())
+            if value:
+                result[field] = value
+        return result
+
+class Probe:
+    """
+    A payload to send plus the rules that recognise the answers to it.
+    Rules are bucketed by the first byte they can match, so an answer is only
+    tested against rules that could possibly fit it.
+    """
+
+    def __init__(self, name, payload, order):
+        self.name = name
+        self.payload = payload
+        self.order = order
+        self.ports = set()
+        self.rarity = 5
+        self.fallbacks = [] # Names of probes whose rules also apply
+        self.rules = []
+        self._by_first = defaultdict(list)
+        self._anywhere = []
+
+    def add_rule(self, rule):
+        self.rules.append(rule)
+        if rule.first_byte is None:
+            self._anywhere.append(rule)
+        else:
+            self._by_first[rule.first_byte].append(rule)
+
+    def payload_for(self, host):
+        return self.payload.replace(b"{host}", host.encode("idna") if not host.isascii() else host.encode())
+
+    def candidates(self, data):
+        """
+        The rules that can match `data`, in file order.
+        """
+        if not data:
+            return []
+        specific = self._by_first.get(data[0])
+        if not specific:
+            return self._anywhere
+        return heapq.merge(specific, self._anywhere, key=lambda rule: rule.order)
+
+class ProbeDatabase:
+    """
+    A loaded service probe file (see fortress-service-probes.txt).
+
+    probes_for(port) orders the probes to try on a port: probes hinted for
+    the port first, then the rest, each by rarity. Probes that identified a
+    service on that port before move to the front, so on a big scan the
+    winning probe for, say, port 8080 is usually the only one sent.
+    """
+
+    def __init__(self, probes):
+        self.probes = probes
+        self.by_name = {probe.name: probe for probe in probes}
+        self._by_port = defaultdict(list)
+        for probe in probes:
+            for port in probe.ports:
+                self._by_port[port].append(probe)
+        self._wins = defaultdict(lambda: defaultdict(int)) # port -> probe name -> hard matches
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=DEFAULT_PROBES):
+        probes = []
+        probe = None
+        order = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                keyword, _, rest = line.partition(" ")
+                try:
+                    if keyword == "Probe":
+                        name, _, payload = rest.partition(" ")
+                        if not payload.startswith("q"):
+                            raise ProbeFileError("payload must look like q|...|")
+                        content, _ = _split_delimited(payload, 1)
+                        probe = Probe(name, _unescape(content), len(probes))
+                        probes.append(probe)
+                    elif probe is None:
+                        raise ProbeFileError(f"'{keyword}' before any Probe line")
+                    elif keyword == "ports":
+                        probe.ports |= _parse_ports(rest)
+                    elif keyword == "rarity":
+                        probe.rarity = int(rest)
+                    elif keyword == "fallback":
+                        probe.fallbacks.extend(name.strip() for name in rest.split(","))
+                    elif keyword in ("match", "softmatch"):
+                        service, _, spec = rest.partition(" ")
+                        if not spec.startswith("m"):
+                            raise ProbeFileError("pattern must look like m|...|")
+                        pattern, i = _split_delimited(spec, 1)
+                        flags = 0
+                        while i < len(spec) and spec[i] in "si":
+                            flags |= re.DOTALL if spec[i] == "s" else re.IGNORECASE
+                            i += 1
+                        templates = {}
+                        fields = {"p": "product", "v": "version", "i": "info"}
+                        while i < len(spec):
+                            if spec[i] in fields and i + 1 < len(spec):
+                                templates[fields[spec[i]]], i = _split_delimited(spec, i + 1)
+                            else:
+                                i += 1
+                        probe.add_rule(MatchRule(service, pattern, flags, templates, keyword == "softmatch", order))
+                        order += 1
+                    else:
+                        raise ProbeFileError(f"unknown keyword '{keyword}'")
+                except (ProbeFileError, re.error, ValueError) as e:
+                    raise ProbeFileError(f"{path}:{number}: {e}")
+        return cls(probes)
+
+    def probes_for(self, port, max_rarity=7):
+        """
+        Probes to try on `port`, most likely first.
+        """
+        wins = self._wins.get(port, {})
+        hinted = self._by_port.get(port, [])
+        others = [p for p in self.probes if p not in hinted and p.rarity <= max_rarity]
+        key = lambda probe: (-wins.get(probe.name, 0), probe.rarity, probe.order)
+        return sorted(hinted, key=key) + sorted(others, key=key)
+
+    def match(self, probe, data):
+        """
+        Identifies an answer to `probe`. Returns a dict with service and, where
+        the rule extracts them, product/version/info; soft matches (service
+        only) carry soft=True. Returns None if nothing matches.
+        """
+        soft = None
+        for source in [probe] + [self.by_name[name] for name in probe.fallbacks if name in self.by_name]:
+            for rule in source.candidates(data):
+                result = rule.apply(data)
+                if result is None:
+                    continue
+                if not rule.soft:
+                    result["probe"] = probe.name
+                    return result
+                if soft is None:
+                    soft = result
+        return soft
+
+    def record_hit(self, port, probe):
+        with self._lock:
+            self._wins[port][probe.name] += 1
+
+def describe(match):
+    """
+    One-line description like "OpenSSH 8.9p1 (ssh; protocol 2.0)".
+    """
+    if not match:
+        return "unknown"
+    name = " ".join(match[field] for field in ("product", "version") if match.get(field))
+    details = "; ".join([match["service"]] + ([match["info"]] if match.get("info") else []))
+    return f"{name} ({details})" if name else details
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_database():
+    """
+    The default probe database, loaded on first use.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ProbeDatabase.load()
+        return _default
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tech Fortress service probe database tool.")
+    parser.add_argument("--probes", default=DEFAULT_PROBES, help="Probe database file")
+    parser.add_argument("-p", "--port", type=int, help="Show the probe order for this port")
+    parser.add_argument("--match", help="Identify this banner text (escapes like \\r\\n allowed) as an answer to the NULL probe")
+    args = parser.parse_args()
+
+    try:
+        database = ProbeDatabase.load(args.probes)
+    except (OSError, ProbeFileError) as e:
+        print(f"[!] Could not load probe database: {e}")
+        raise SystemExit(1)
+    print(f"[*] Loaded {len(database.probes)} probes with {sum(len(p.rules) for p in database.probes)} match rules")
+    if args.port:
+        for probe in database.probes_for(args.port):
+            print(f"    {probe.name} (rarity {probe.rarity}{', hinted' if args.port in probe.ports else ''})")
+    if args.match:
+        result = database.match(database.by_name.get("NULL", database.probes[0]), _unescape(args.match))
+        print(f"[+] {describe(result)}" if result else "[-] No match")
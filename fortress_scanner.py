@@ -2,25 +2,72 @@ import socket
 import sys
 import threading
 import time
+import asyncio # Non-blocking connect engine (see AsyncConnectScanner)
+import errno
+from collections import deque
+import random
+import queue
 import argparse # Needed if we want to run this standalone with args
 
+from fortress_targets import ProbeSpace, parse_targets, parse_ports
+from fortress_cache import resolve
+from fortress_scheduler import get_scheduler, configure as configure_scheduler
+from fortress_journal import Journal, OffsetTracker, journal_path
+from fortress_sink import emit, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import get_metrics, add_metrics_arguments, start_from_args as start_metrics
+
+try:
+    import resource # Unix only; used to raise the open-file limit for large async windows
+except ImportError:
+    resource = None
+
 # Global list to store open ports
 open_ports = []
 
+metrics = get_metrics("scan") # Probe counters and connect latency (see fortress_metrics)
+
+_service_names = {} # port -> well-known name (or None); getservbyport reads /etc/services every call
+
+def service_name(port):
+    if port not in _service_names:
+        try:
+            _service_names[port] = socket.getservbyport(port)
+        except OSError:
+            _service_names[port] = None
+    return _service_names[port]
+
+def report_open_port(port, host=None):
+    """
+    Reports a confirmed open port together with its well-known service name.
+    """
+    service = service_name(port)
+    if service:
+        emit("open_port", f"[+] Port {port} ({service}) is OPEN", host=host, port=port, service=service)
+    else:
+        emit("open_port", f"[+] Port {port} is OPEN (unknown service)", host=host, port=port, service=None)
+
 # Function to check if a single port is open
 def check_port(target, port, timeout):
+    metrics.begin()
+    started = time.monotonic()
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(timeout)
         result = sock.connect_ex((target, port))
         if result == 0:
-            try:
-                service = socket.getservbyport(port)
-                print(f"[+] Port {port} ({service}) is OPEN")
-            except OSError:
-                print(f"[+] Port {port} is OPEN (unknown service)")
+            metrics.end("open", time.monotonic() - started)
+            report_open_port(port, target)
             open_ports.append(port)
+            sock.close()
+            return True
         sock.close()
+        if result == errno.ECONNREFUSED:
+            metrics.end("refused", time.monotonic() - started)
+        elif result in (errno.EAGAIN, errno.ETIMEDOUT):
+            metrics.end("timeout")
+        else:
+            metrics.end("error")
+        return False
     except socket.gaierror:
         # This is handled at a higher level (scan_ports function)
         pass
@@ -30,33 +77,388 @@ def check_port(target, port, timeout):
         pass
     except Exception as e:
         print(f"[!] An unexpected error occurred checking port {port}: {e}")
+    metrics.end("error")
+    return False
+
+def _check_and_record(target, port, timeout, journal=None, on_open=None):
+    # check_port plus journaling / the on_open callback, for the threaded engine
+    if check_port(target, port, timeout):
+        if journal:
+            journal.found("open_port", host=target, port=port)
+        if on_open:
+            on_open(target, port)
+    if journal:
+        journal.done(f"{target}:{port}")
+
+def raise_fd_limit(wanted):
+    """
+    Raises the soft open-file limit so `wanted` sockets can be open at once.
+    Returns the number of sockets we can actually keep in flight.
+    """
+    if resource is None:
+        return wanted
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        needed = wanted + 64 # Headroom for stdin/stdout, the event loop and the resolver
+        if soft != resource.RLIM_INFINITY and soft < needed:
+            new_soft = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+            soft = new_soft
+        if soft == resource.RLIM_INFINITY:
+            return wanted
+        return max(1, min(wanted, soft - 64))
+    except (ValueError, OSError):
+        return wanted
+
+class HostTiming:
+    """
+    Per-host round-trip estimator in the style of TCP (RFC 6298).
+
+    Every answered probe (open or refused) is an RTT sample. The connect timeout
+    is srtt + 4 * rttvar, clamped to [min_timeout, max_timeout], so a LAN host is
+    given milliseconds while a distant one keeps a longer budget. Evidence of
+    loss (a probe that only answered on a retry) halves the host's window of
+    in-flight probes and doubles its timeout until the next clean sample.
+    """
+
+    def __init__(self, initial_timeout, min_timeout, max_timeout, max_window):
+        self.srtt = None
+        self.rttvar = None
+        self.timeout = initial_timeout # Used until the first sample arrives
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_window = max_window
+        self.window = max_window # Max probes in flight to this host
+        self.inflight = 0
+        self.pending = deque() # Probes waiting for room in the window (or for rate tokens)
+        self.wake = None # Timer that resumes the pending probes once the rate limit allows
+
+    def observe(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.timeout = min(self.max_timeout, max(self.min_timeout, self.srtt + 4 * self.rttvar))
+        if self.window < self.max_window:
+            self.window += 1
+
+    def on_loss(self):
+        self.window = max(1, self.window // 2)
+        self.timeout = min(self.max_timeout, self.timeout * 2)
+
+class AsyncConnectScanner:
+    """
+    Non-blocking TCP connect engine driven by a single asyncio event loop.
+
+    Instead of a coroutine per port, each probe is a non-blocking socket
+    registered with the loop's selector. A fixed window of `concurrency`
+    probes is kept in flight; as each one completes, the next probe is
+    pulled from the (possibly lazy) probe iterator.
+
+    Timeouts adapt per host (see HostTiming): `timeout` is the budget before
+    the first RTT sample and the upper bound afterwards. A probe that times
+    out is retried up to `retries` times before the port counts as filtered.
+
+    An optional ProbeScheduler caps probes per second (globally and per host)
+    and the number of probes in flight to any one host.
+    """
+
+    def __init__(self, timeout=1, concurrency=2000, on_open=None, retries=2, min_timeout=0.1, on_answer=None, scheduler=None, on_complete=None):
+        self.timeout = timeout
+        self.scheduler = scheduler or get_scheduler()
+        self.min_timeout = min(min_timeout, timeout)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.on_open = on_open # Called as on_open(ip, port) for every open port
+        self.on_answer = on_answer # Called as on_answer(ip, port, is_open) for open and refused ports
+        self.on_complete = on_complete # Called as on_complete(ip, port) once a probe is final (incl. filtered)
+        self.open = [] # (ip, port) pairs confirmed open
+        self.hosts = {} # ip -> HostTiming
+        self._inflight = {} # fd -> (sock, ip, port, attempt, started, timer handle)
+        self._queued = 0 # Probes parked in a host's pending queue
+        self._retry = deque() # (ip, port, attempt) probes to send again
+        self._probes = None
+        self._exhausted = False
+        self._loop = None
+        self._done = None
+
+    async def run(self, probes):
+        """
+        Probes every (ip, port) pair from `probes` and returns the open pairs.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._done = self._loop.create_future()
+        self._probes = iter(probes)
+        self._fill()
+        await self._done
+        return self.open
+
+    def skip_host(self, ip):
+        """
+        Drops the probes still waiting for `ip` (queued or due for a retry);
+        those already in flight finish as usual. Call it from the event loop,
+        e.g. from on_answer. on_complete is not called for dropped probes.
+        """
+        host = self.hosts.get(ip)
+        if host and host.pending:
+            self._queued -= len(host.pending)
+            host.pending.clear()
+        if self._retry:
+            self._retry = deque(probe for probe in self._retry if probe[0] != ip)
+
+    def _timing(self, ip):
+        host = self.hosts.get(ip)
+        if host is None:
+            window = self.concurrency
+            if self.scheduler and self.scheduler.per_target_concurrency:
+                window = min(window, self.scheduler.per_target_concurrency)
+            host = self.hosts[ip] = HostTiming(self.timeout, self.min_timeout, self.timeout, window)
+        return host
+
+    def _admit(self, host, ip):
+        # Rate limiting: take a token if one is free, otherwise wake up when it is
+        if self.scheduler is None:
+            return True
+        delay = self.scheduler.ready_in(ip)
+        if delay <= 0:
+            self.scheduler.take(ip)
+            return True
+        if host.wake is None:
+            host.wake = self._loop.call_later(delay, self._wake, host)
+        return False
+
+    def _wake(self, host):
+        host.wake = None
+        self._drain(host)
+        self._fill()
+
+    def _drain(self, host):
+        while host.pending and host.inflight < host.window:
+            ip, port, attempt = host.pending[0]
+            if not self._admit(host, ip):
+                break
+            host.pending.popleft()
+            self._queued -= 1
+            self._start(host, ip, port, attempt)
+
+    def _fill(self):
+        # Top the window back up, retries first; probes that finish synchronously
+        # (immediate refusal on the local stack) never touch the selector.
+        while len(self._inflight) + self._queued < self.concurrency:
+            if self._retry:
+                ip, port, attempt = self._retry.popleft()
+            elif not self._exhausted:
+                probe = next(self._probes, None)
+                if probe is None:
+                    self._exhausted = True
+                    continue
+                ip, port = probe
+                attempt = 0
+            else:
+                break
+            host = self._timing(ip)
+            if not host.pending and host.inflight < host.window and self._admit(host, ip):
+                self._start(host, ip, port, attempt)
+            else:
+                host.pending.append((ip, port, attempt))
+                self._queued += 1
+        if self._exhausted and not self._retry and not self._inflight and not self._queued:
+            if not self._done.done():
+                self._done.set_result(None)
+
+    def _start(self, host, ip, port, attempt):
+        metrics.begin()
+        sock = socket.socket(socket.AF_INET6 if ":" in ip else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        result = sock.connect_ex((ip, port))
+        if result == 0:
+            sock.close()
+            metrics.end("open")
+            self._found(ip, port)
+            self._complete(ip, port)
+        elif result == errno.ECONNREFUSED:
+            sock.close()
+            metrics.end("refused")
+            if self.on_answer:
+                self.on_answer(ip, port, False)
+            self._complete(ip, port)
+        elif result in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            fd = sock.fileno()
+            timer = self._loop.call_later(host.timeout, self._finish, fd, True)
+            self._inflight[fd] = (sock, ip, port, attempt, time.monotonic(), timer)
+            host.inflight += 1
+            self._loop.add_writer(fd, self._finish, fd, False)
+        else:
+            # Refused, unreachable, etc. - definitely not open
+            sock.close()
+            metrics.end("error")
+            self._complete(ip, port)
+
+    def _finish(self, fd, timed_out):
+        entry = self._inflight.pop(fd, None)
+        if entry is None:
+            return
+        sock, ip, port, attempt, started, timer = entry
+        self._loop.remove_writer(fd)
+        timer.cancel()
+        host = self.hosts[ip]
+        host.inflight -= 1
+        if timed_out:
+            metrics.end("timeout")
+            if attempt < self.retries:
+                self._retry.append((ip, port, attempt + 1))
+            else:
+                self._complete(ip, port) # Filtered
+        else:
+            error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            metrics.end("open" if error == 0 else "refused" if error == errno.ECONNREFUSED else "error", time.monotonic() - started)
+            if error in (0, errno.ECONNREFUSED):
+                # Either answer is a round trip; only a reply after a retry means loss
+                if attempt:
+                    host.on_loss()
+                else:
+                    host.observe(time.monotonic() - started)
+            if error == 0:
+                self._found(ip, port)
+            elif error == errno.ECONNREFUSED and self.on_answer:
+                self.on_answer(ip, port, False)
+            self._complete(ip, port)
+        sock.close()
+        self._drain(host)
+        self._fill()
+
+    def _complete(self, ip, port):
+        if self.on_complete:
+            self.on_complete(ip, port)
+
+    def _found(self, ip, port):
+        self.open.append((ip, port))
+        if self.on_open:
+            self.on_open(ip, port)
+        if self.on_answer:
+            self.on_answer(ip, port, True)
+
+async def async_scan_ports(target_ip, port_range_list, timeout=1, concurrency=2000, retries=2, scheduler=None, journal=None, on_open=None):
+    """
+    Scans ports on an already-resolved IP using a single asyncio event loop.
+    Keeps up to `concurrency` connects in flight and returns the open ports.
+    """
+    def report(ip, port):
+        report_open_port(port, ip)
+        if journal:
+            journal.found("open_port", host=ip, port=port)
+        if on_open:
+            on_open(ip, port)
+
+    on_complete = (lambda ip, port: journal.done(f"{ip}:{port}")) if journal else None
+    scanner = AsyncConnectScanner(timeout, concurrency, on_open=report, retries=retries, scheduler=scheduler, on_complete=on_complete)
+    opened = await scanner.run((target_ip, port) for port in port_range_list)
+    return sorted(port for _, port in opened)
+
+def iter_open_ports(target_specs, ports, timeout=1, concurrency=2000, retries=2, scheduler=None, seed=None):
+    """
+    Generator yielding (ip, port) for every open port the moment its connect
+    succeeds, while the rest of the scan keeps running on the async engine in
+    a background thread. target_specs and ports are as for scan_targets;
+    with ordered ports (e.g. top_ports(100)) the likeliest are probed first.
+    Nothing is printed. Closing the generator early stops sending new probes.
+    """
+    hosts = parse_targets(target_specs).resolved()
+    ports = ports if hasattr(ports, "port_at") else parse_ports(ports)
+    probes = ProbeSpace(hosts, ports, seed)
+    found = queue.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def probe_order():
+        for probe in probes:
+            if stop.is_set():
+                return
+            yield probe
+
+    def run():
+        try:
+            scanner = AsyncConnectScanner(timeout, raise_fd_limit(concurrency), on_open=lambda ip, port: found.put((ip, port)),
+                                          retries=retries, scheduler=scheduler)
+            asyncio.run(scanner.run(probe_order()))
+        finally:
+            found.put(finished)
+
+    thread = threading.Thread(target=run, name="scan", daemon=True)
+    thread.start()
+    try:
+        for result in iter(found.get, finished):
+            yield result
+    finally:
+        stop.set()
+        thread.join()
 
 # Main function to scan ports
-def scan_ports(target, port_range_list, timeout=1, max_threads=50):
+def scan_ports(target, port_range_list, timeout=1, max_threads=50, engine="threads", concurrency=2000, retries=2, scheduler=None, journal=None, on_open=None):
     """
-    Scans a list of ports on a target.
+    Scans a list of ports on a target and returns the sorted list of open ports.
     target: IP address or hostname
     port_range_list: an iterable of ports (e.g., a list or a range)
-    timeout: socket timeout in seconds
-    max_threads: maximum number of concurrent threads
+    timeout: socket timeout in seconds (the upper bound for adaptive timeouts in the "async" engine)
+    max_threads: maximum number of concurrent threads ("threads" engine)
+    engine: "threads" (one thread per port) or "async" (single event loop)
+    concurrency: maximum number of in-flight connects ("async" engine)
+    retries: how often a timed-out probe is retried ("async" engine)
+    scheduler: optional ProbeScheduler for rate/concurrency limits (both engines)
+    journal: optional Journal; ports it already lists as done are skipped and
+             its earlier findings are included in the result
+    on_open: optional callback, called as on_open(ip, port) as each open port is found
     """
     global open_ports # Clear previous scan results
     open_ports = []
 
     print(f"\n[*] Starting port scan for {target}...")
-    print(f"[*] Scanning ports: {min(port_range_list)} - {max(port_range_list) if port_range_list else 'N/A'}")
+    print(f"[*] Scanning ports: {describe_ports(port_range_list)}")
 
     try:
         # Resolve hostname to IP address once
-        target_ip = socket.gethostbyname(target)
+        target_ip = resolve(target)
         print(f"[*] Resolved {target} to {target_ip}")
     except socket.gaierror:
         print(f"[!] Error: Could not resolve hostname '{target}'.")
-        return # Exit the function if target is unreachable
+        return [] # Exit the function if target is unreachable
+
+    previous = []
+    if journal:
+        previous = [f["port"] for f in journal.state.findings_of("open_port") if f["host"] == target_ip]
+        if journal.state.done:
+            print(f"[*] Resuming: skipping ports already scanned ({len(previous)} open so far)")
+        done = journal.state.done
+        port_range_list = (p for p in port_range_list if f"{target_ip}:{p}" not in done)
+        open_ports.extend(previous)
+
+    if engine == "async":
+        concurrency = raise_fd_limit(concurrency)
+        print(f"[*] Using async engine with up to {concurrency} connects in flight")
+        open_ports = previous + asyncio.run(async_scan_ports(target_ip, port_range_list, timeout, concurrency, retries, scheduler, journal, on_open))
+        _print_scan_summary(target_ip, open_ports)
+        return open_ports
+
+    scheduler = scheduler or get_scheduler()
+    if scheduler is not None:
+        # The scheduler's workers replace thread-per-port and apply its limits
+        if journal or on_open:
+            futures = [scheduler.submit(target_ip, _check_and_record, target_ip, port, timeout, journal, on_open) for port in port_range_list]
+        else:
+            futures = [scheduler.submit(target_ip, check_port, target_ip, port, timeout) for port in port_range_list]
+        for future in futures:
+            future.result()
+        _print_scan_summary(target_ip, open_ports)
+        return sorted(open_ports)
 
     threads = []
     for port in port_range_list:
-        thread = threading.Thread(target=check_port, args=(target_ip, port, timeout))
+        if journal or on_open:
+            thread = threading.Thread(target=_check_and_record, args=(target_ip, port, timeout, journal, on_open))
+        else:
+            thread = threading.Thread(target=check_port, args=(target_ip, port, timeout))
         threads.append(thread)
         thread.start()
 
@@ -68,53 +470,194 @@ def scan_ports(target, port_range_list, timeout=1, max_threads=50):
     for thread in threads:
         thread.join()
 
-    if open_ports:
-        print(f"\n[*] Scan completed. Found {len(open_ports)} open ports on {target_ip}:")
-        print(sorted(open_ports))
+    _print_scan_summary(target_ip, open_ports)
+    return sorted(open_ports)
+
+def scan_targets(target_specs, port_spec, timeout=1, concurrency=2000, seed=None, retries=2, scheduler=None, journal=None, on_open=None):
+    """
+    Scans many hosts at once. target_specs may be hostnames, IPs, CIDRs, IP ranges
+    or target files; port_spec is a PortSpace or a spec string like "1-1024".
+    The (host, port) space is walked lazily in pseudo-random order on the async
+    engine. Returns a dict of host -> sorted open ports.
+    With a journal, progress is checkpointed as a position in the probe order
+    (plus the seed that defines that order), so a resumed run re-sends at most
+    the probes that were in flight when it stopped. on_open(ip, port) is
+    called as each open port is found.
+    """
+    if journal and "seed" in journal.state.params:
+        seed = journal.state.params["seed"]
+    elif seed is None:
+        seed = random.getrandbits(32) # Explicit so the order can be replayed on resume
+    hosts = parse_targets(target_specs).resolved()
+    ports = port_spec if hasattr(port_spec, "port_at") else parse_ports(port_spec)
+    probes = ProbeSpace(hosts, ports, seed)
+    if not len(probes):
+        print("[!] Nothing to scan (no resolvable targets or no ports).")
+        return {}
+
+    concurrency = raise_fd_limit(concurrency)
+    print(f"\n[*] Starting port scan of {len(hosts)} hosts x {len(ports)} ports ({len(probes)} probes)...")
+    print(f"[*] Using async engine with up to {concurrency} connects in flight")
+
+    results = {}
+    start = 0
+    tracker = None
+    if journal:
+        start = journal.state.position()
+        for finding in journal.state.findings_of("open_port"):
+            results.setdefault(finding["host"], []).append(finding["port"])
+        if start:
+            print(f"[*] Resuming at probe position {start} of {probes.domain}")
+        journal.header(seed=seed)
+        tracker = OffsetTracker(journal)
+
+    def found(ip, port):
+        emit("open_port", f"[+] {ip}:{port} is OPEN", host=ip, port=port, service=service_name(port))
+        results.setdefault(ip, []).append(port)
+        if journal:
+            journal.found("open_port", host=ip, port=port)
+        if on_open:
+            on_open(ip, port)
+
+    def probe_order():
+        for position, probe in probes.iter_positions(start):
+            if tracker:
+                tracker.issue(probe, position)
+            yield probe
+
+    on_complete = (lambda ip, port: tracker.complete((ip, port))) if tracker else None
+    scanner = AsyncConnectScanner(timeout, concurrency, on_open=found, retries=retries, scheduler=scheduler, on_complete=on_complete)
+    asyncio.run(scanner.run(probe_order()))
+    flush_results()
+    for ip in results:
+        results[ip].sort()
+        _print_scan_summary(ip, results[ip])
+    if not results:
+        print("\n[*] Scan completed. No open ports found on any target.")
+    return results
+
+def describe_ports(ports):
+    """
+    Short human description of a port collection without materializing it.
+    """
+    if isinstance(ports, range):
+        return f"{ports.start} - {ports.stop - 1}" if len(ports) else "N/A"
+    if isinstance(ports, (list, tuple, set, frozenset)):
+        return f"{min(ports)} - {max(ports)}" if ports else "N/A"
+    return str(ports)
+
+def _print_scan_summary(target_ip, ports):
+    flush_results() # Results still buffered in the sink come first
+    if ports:
+        print(f"\n[*] Scan completed. Found {len(ports)} open ports on {target_ip}:")
+        print(sorted(ports))
     else:
         print(f"\n[*] Scan completed. No open ports found on {target_ip} in the specified range.")
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    """
+    Command-line entry point (also used by the fortress daemon).
+    """
     print("--- Tech Fortress Enhanced Port Scanner Module ---")
     print("This tool performs a multithreaded port scan on a target IP/hostname.")
 
     parser = argparse.ArgumentParser(description="Multithreaded Port Scanner.")
-    parser.add_argument("-t", "--target", help="Target IP address or hostname (e.g., example.com)", required=True)
-    parser.add_argument("-p", "--ports", help="Port range (e.g., 1-1024) or specific ports (e.g., 22,80,443)", required=True)
-    parser.add_argument("--timeout", type=float, default=1.0, help="Socket timeout in seconds (default: 1.0)")
+    parser.add_argument("-t", "--target", help="Target IP/hostname, CIDR (10.0.0.0/24), IP range (10.0.0.1-50) or target file (e.g., target.txt)", required=True)
+    parser.add_argument("-p", "--ports", help="Port range (e.g., 1-1024), specific ports (e.g., 22,80,443) or the most common ones (e.g., top100)")
+    parser.add_argument("--top-ports", type=int, metavar="N", help="Scan the N ports most likely to be open, most likely first (added before any --ports)")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Socket timeout in seconds; the async engine adapts below this per host (default: 1.0)")
     parser.add_argument("--threads", type=int, default=50, help="Maximum number of concurrent threads (default: 50)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use the asyncio engine (one event loop, non-blocking connects) instead of threads")
+    parser.add_argument("--concurrency", type=int, default=2000, help="Maximum in-flight connects for the async engine (default: 2000)")
+    parser.add_argument("--retries", type=int, default=2, help="Retries for timed-out probes in the async engine (default: 2)")
+    parser.add_argument("--rate", type=int, help="Maximum probes per second overall (default: unlimited)")
+    parser.add_argument("--host-rate", type=int, help="Maximum probes per second to any one host (default: unlimited)")
+    parser.add_argument("--host-concurrency", type=int, help="Maximum probes in flight to any one host (default: unlimited)")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted scan with the same arguments from its journal")
+    parser.add_argument("--journal", help="Progress journal file (default: one per command line under ~/.fortress/journal)")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record progress")
+    parser.add_argument("--seed", type=int, help="Seed for the randomized probe order of multi-host scans")
+    parser.add_argument("--banners", action="store_true", help="Grab banners from open ports while the scan is still running")
+    parser.add_argument("--certs", action="store_true", help="Collect TLS certificates from open TLS ports (443, 8443, 993, ...) while the scan is still running")
+    parser.add_argument("-P", "--processes", type=int, default=1, help="Spread the scan over this many processes (0 = one per core; no journal, banners or certs)")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+    start_metrics(args)
 
-    # Parse ports argument
-    ports_to_scan = []
-    if '-' in args.ports:
-        try:
-            start_port, end_port = map(int, args.ports.split('-'))
-            ports_to_scan = list(range(start_port, end_port + 1))
-        except ValueError:
-            print("[!] Invalid port range format. Use 'START-END' (e.g., 1-1024).")
-            sys.exit(1)
-    else:
-        try:
-            ports_to_scan = [int(p) for p in args.ports.split(',')]
-        except ValueError:
-            print("[!] Invalid port list format. Use 'PORT1,PORT2' (e.g., 22,80,443).")
-            sys.exit(1)
+    if args.rate or args.host_rate or args.host_concurrency:
+        configure_scheduler(args.rate, args.host_rate, args.host_concurrency, workers=args.threads)
 
-    if not ports_to_scan:
+    if not args.ports and not args.top_ports:
+        parser.error("give --ports and/or --top-ports")
+    ports_to_scan = parse_ports(",".join(spec for spec in (f"top{args.top_ports}" if args.top_ports else None, args.ports) if spec))
+    if not len(ports_to_scan):
         print("[!] No valid ports to scan. Exiting.")
         sys.exit(1)
 
-    # Remove duplicate ports and sort them
-    ports_to_scan = sorted(list(set(ports_to_scan)))
+    journal = None
+    if not args.no_journal and args.processes == 1:
+        journal = Journal(args.journal or journal_path("scan", args.target, str(ports_to_scan)), resume=args.resume)
 
-    # Validate port numbers
-    ports_to_scan = [p for p in ports_to_scan if 0 < p <= 65535]
-    if not ports_to_scan:
-        print("[!] No valid ports remaining after validation (ports must be 1-65535). Exiting.")
-        sys.exit(1)
+    # Follow-up work on open ports runs in its own thread, fed as ports are found
+    followups = [] # (queue, thread, ports it wants or None for all)
+
+    def start_followup(run, ports=None):
+        work = queue.Queue()
+        thread = threading.Thread(target=run, args=(iter(work.get, None),), daemon=True)
+        thread.start()
+        followups.append((work, thread, ports))
+
+    if args.banners:
+        from fortress_bannergrab import grab_banners, report_banner
+
+        def print_banners(pairs):
+            for result in grab_banners(pairs):
+                report_banner(*result)
+
+        start_followup(print_banners)
+    if args.certs:
+        from fortress_tls import TLS_PORTS, harvest_certificates, report_certificate
+
+        def print_certificates(pairs):
+            for result in harvest_certificates(pairs):
+                report_certificate(*result)
+
+        start_followup(print_certificates, TLS_PORTS)
 
-    scan_ports(args.target, ports_to_scan, args.timeout, args.threads)
+    def queue_followups(ip, port):
+        for work, _, ports in followups:
+            if ports is None or port in ports:
+                work.put((ip, port))
+
+    on_open = queue_followups if followups else None
+
+    targets = parse_targets(args.target)
+    try:
+        if args.processes != 1:
+            from fortress_shard import scan_targets_sharded
+            scan_targets_sharded(args.target, ports_to_scan, args.processes or None, args.timeout, args.concurrency, args.seed,
+                                 args.retries, args.rate, args.host_rate)
+        elif len(targets) > 1:
+            # CIDRs, ranges and target files are swept as one randomized probe space
+            scan_targets(args.target, ports_to_scan, args.timeout, args.concurrency, args.seed, args.retries, journal=journal, on_open=on_open)
+        else:
+            engine = "async" if args.use_async else "threads"
+            scan_ports(args.target, ports_to_scan, args.timeout, args.threads, engine=engine, concurrency=args.concurrency, retries=args.retries, journal=journal, on_open=on_open)
+        if followups:
+            print("\n[*] Waiting for banner grabs / certificate collection to finish...")
+            for work, thread, _ in followups:
+                work.put(None)
+                thread.join()
+    except KeyboardInterrupt:
+        print("\n[!] Interrupted. Progress is saved; re-run with --resume to continue.")
+    finally:
+        if journal:
+            journal.close()
     print("\n" + "="*50 + "\n") # Separator for multiple scans
+
+if __name__ == "__main__":
+    main()
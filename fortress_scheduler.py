@@ -0,0 +1,338 @@
+import time
+import queue
+import asyncio
+import threading
+from collections import OrderedDict, deque, defaultdict
+from concurrent.futures import Future
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `burst`.
+    take() reserves a token even when the bucket is empty and returns how long
+    the caller must wait before using it, so both threads (time.sleep) and event
+    loops (asyncio.sleep / call_later) can share one bucket.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate / 10)) # ~100 ms of traffic
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_in(self):
+        """
+        Seconds until a token is available, without taking it.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        """
+        Takes a token and returns the delay before it may be used (0 if none).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class ProbeScheduler:
+    """
+    Central throttle shared by every module that sends probes.
+
+    - rate: global probes per second (token bucket), None for unlimited
+    - per_target_rate: probes per second for any single target
+    - per_target_concurrency: probes in flight to any single target
+    - workers: threads used to run submitted blocking probes
+
+    Blocking probes go through submit(); queued work is dispatched round-robin
+    across targets so one big target cannot starve the others. Event-loop
+    engines call throttle() / slot() or, from callbacks, ready_in() and take().
+    """
+
+    def __init__(self, rate=None, per_target_rate=None, per_target_concurrency=None, workers=32, burst=None):
+        self.global_bucket = TokenBucket(rate, burst) if rate else None
+        self.per_target_rate = per_target_rate
+        self.per_target_concurrency = per_target_concurrency
+        self.workers = workers
+        self._burst = burst
+        self._buckets = {}
+        self._queues = OrderedDict() # target -> deque of (future, fn, args, kwargs)
+        self._inflight = defaultdict(int)
+        self._cv = threading.Condition()
+        self._threads = []
+        self._shutdown = False
+        self._semaphores = {} # Event loop -> {target: asyncio.Semaphore} for slot()
+
+    def _bucket(self, target):
+        if not self.per_target_rate or target is None:
+            return None
+        bucket = self._buckets.get(target)
+        if bucket is None:
+            bucket = self._buckets.setdefault(target, TokenBucket(self.per_target_rate, self._burst))
+        return bucket
+
+    def ready_in(self, target=None):
+        """
+        Seconds until a probe to `target` would be allowed (global and per-target).
+        """
+        delay = self.global_bucket.ready_in() if self.global_bucket else 0.0
+        bucket = self._bucket(target)
+        if bucket:
+            delay = max(delay, bucket.ready_in())
+        return delay
+
+    def take(self, target=None):
+        """
+        Accounts for one probe to `target`. Returns the delay before sending it.
+        """
+        delay = self.global_bucket.take() if self.global_bucket else 0.0
+        bucket = self._bucket(target)
+        if bucket:
+            delay = max(delay, bucket.take())
+        return delay
+
+    async def throttle(self, target=None):
+        delay = self.take(target)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def slot(self, target):
+        """
+        Async context manager: waits for rate tokens and a per-target concurrency slot.
+
+            async with scheduler.slot(host):
+                await probe(host)
+        """
+        return _AsyncSlot(self, target)
+
+    def _semaphore(self, target):
+        if not self.per_target_concurrency:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._cv: # Loops in several threads (stream_map) may share this scheduler
+            semaphores = self._semaphores.get(loop)
+            if semaphores is None:
+                # A new loop: forget the ones that have closed (each stream_map run has its own)
+                for old in [old for old in self._semaphores if old.is_closed()]:
+                    del self._semaphores[old]
+                semaphores = self._semaphores[loop] = {}
+            semaphore = semaphores.get(target)
+            if semaphore is None:
+                semaphore = semaphores[target] = asyncio.Semaphore(self.per_target_concurrency)
+        return semaphore
+
+    # Thread-based dispatch for blocking probes (requests, blocking sockets)
+
+    def submit(self, target, fn, *args, **kwargs):
+        """
+        Queues fn(*args, **kwargs) as a probe against `target`. Returns a Future.
+        """
+        future = Future()
+        with self._cv:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down")
+            self._queues.setdefault(target, deque()).append((future, fn, args, kwargs))
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cv.notify()
+        return future
+
+    def _next_item(self):
+        # Round-robin: take from the first target that has work and a free slot,
+        # then move it to the back of the line
+        for target, pending in self._queues.items():
+            if self.per_target_concurrency and self._inflight[target] >= self.per_target_concurrency:
+                continue
+            item = pending.popleft()
+            if pending:
+                self._queues.move_to_end(target)
+            else:
+                del self._queues[target]
+            return target, item
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                while True:
+                    picked = self._next_item()
+                    if picked:
+                        break
+                    if self._shutdown:
+                        return
+                    self._cv.wait()
+                target, (future, fn, args, kwargs) = picked
+                self._inflight[target] += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    delay = self.take(target)
+                    if delay:
+                        time.sleep(delay)
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cv:
+                    self._inflight[target] -= 1
+                    self._cv.notify_all()
+
+    def shutdown(self):
+        """
+        Stops the worker threads once the queued probes have run.
+        """
+        with self._cv:
+            self._shutdown = True
+            self._cv.notify_all()
+
+class _AsyncSlot:
+    def __init__(self, scheduler, target):
+        self.scheduler = scheduler
+        self.target = target
+        self.semaphore = None
+
+    async def __aenter__(self):
+        self.semaphore = self.scheduler._semaphore(self.target)
+        if self.semaphore:
+            await self.semaphore.acquire()
+        await self.scheduler.throttle(self.target)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.semaphore:
+            self.semaphore.release()
+
+class _Failure:
+    # An exception from func (or the input iterable), re-raised by the consumer
+    def __init__(self, error):
+        self.error = error
+
+async def stream_map_async(items, concurrency, func):
+    """
+    Async generator running the coroutine function `func(item)` over `items`
+    with up to `concurrency` calls in flight, yielding results as they finish.
+
+    `items` may be any iterable, including a slow or blocking one such as a
+    generator fed by a running scan; it is consumed from a helper thread, and
+    at most `concurrency` items are read ahead.
+
+    If func (or reading `items`) raises, the exception is raised from this
+    generator and the remaining work is cancelled; funcs that should carry on
+    past a failed item must turn it into a result themselves.
+    """
+    loop = asyncio.get_running_loop()
+    items = iter(items)
+    work = asyncio.Queue(maxsize=concurrency) # Backpressure on the input stream
+    results = asyncio.Queue()
+    finished = object()
+
+    async def feed():
+        try:
+            while True:
+                item = await loop.run_in_executor(None, next, items, finished)
+                if item is finished:
+                    break
+                await work.put(item)
+        except Exception as e:
+            results.put_nowait(_Failure(e))
+        finally:
+            for _ in workers:
+                await work.put(finished)
+
+    async def worker():
+        try:
+            while True:
+                item = await work.get()
+                if item is finished:
+                    break
+                try:
+                    result = await func(item)
+                except Exception as e:
+                    result = _Failure(e)
+                results.put_nowait(result)
+        finally:
+            results.put_nowait(finished) # Always, or the consumer would wait forever
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    feeder = asyncio.create_task(feed())
+    remaining = len(workers)
+    try:
+        while remaining:
+            item = await results.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, _Failure):
+                raise item.error
+            else:
+                yield item
+    finally:
+        feeder.cancel()
+        for task in workers:
+            task.cancel()
+
+def stream_map(items, concurrency, func):
+    """
+    Blocking generator around stream_map_async: runs the event loop in a
+    background thread and yields results as they finish. An exception from
+    func is raised here, in the consuming thread.
+    """
+    results = queue.Queue()
+    done = object()
+    errors = []
+
+    async def collect():
+        async for result in stream_map_async(items, concurrency, func):
+            results.put(result)
+
+    def run():
+        try:
+            asyncio.run(collect())
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            results.put(done)
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        item = results.get()
+        if item is done:
+            if errors:
+                raise errors[0]
+            return
+        yield item
+
+# Optional process-wide scheduler (see configure) that modules fall back to
+_default = None
+
+def configure(rate=None, per_target_rate=None, per_target_concurrency=None, workers=32, burst=None):
+    """
+    Installs the process-wide scheduler used by every module that is not
+    handed one explicitly. Returns it.
+    """
+    global _default
+    _default = ProbeScheduler(rate, per_target_rate, per_target_concurrency, workers, burst)
+    return _default
+
+def get_scheduler():
+    """
+    The process-wide scheduler, or None if configure() was never called.
+    """
+    return _default
+
+def reset():
+    """
+    Shuts down and forgets the process-wide scheduler, so the next run in the
+    same process (e.g. the next daemon job) starts without its limits.
+    """
+    global _default
+    if _default is not None:
+        _default.shutdown()
+        _default = None
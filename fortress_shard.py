@@ -0,0 +1,368 @@
+import os
+import time
+import queue
+import random
+import signal
+import asyncio
+import threading
+import multiprocessing
+from collections import deque
+from urllib.parse import urljoin
+
+import fortress_sink
+from fortress_sink import emit, flush as flush_results
+from fortress_metrics import get_metrics, export_all
+
+# Work is cut into this many chunks per process. Workers pull the next chunk
+# as they run low, so a process that drew easy chunks simply takes more.
+CHUNKS_PER_PROCESS = 16
+
+def default_processes():
+    return os.cpu_count() or 1
+
+class ForwardingSink:
+    """
+    A sink that sends results somewhere else instead of writing them: the
+    records emitted by the fortress modules are batched and put on `out` as
+    ("emit", worker, batch) together with ("metrics", worker, export_all())
+    of this process. Worker processes use it to report to their parent (which
+    prints the results and writes them to its own sink); the daemon uses it
+    to report to its client. `out` only needs a put() method.
+    """
+
+    def __init__(self, out, worker, interval=0.2, metrics_interval=1.0):
+        self.out = out
+        self.worker = worker
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(interval, metrics_interval), daemon=True)
+        self._thread.start()
+
+    def emit(self, kind, message=None, fields=None):
+        self._pending.append((kind, message, fields or {}))
+
+    def _run(self, interval, metrics_interval):
+        next_metrics = time.monotonic() + metrics_interval
+        while not self._closed.wait(interval):
+            self.flush()
+            if time.monotonic() >= next_metrics:
+                self.send_metrics()
+                next_metrics = time.monotonic() + metrics_interval
+
+    def flush(self):
+        with self._lock:
+            batch = []
+            while self._pending:
+                batch.append(self._pending.popleft())
+            if batch:
+                self.out.put(("emit", self.worker, batch))
+
+    def send_metrics(self):
+        self.out.put(("metrics", self.worker, export_all()))
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+        self.send_metrics()
+
+def _pull(tasks):
+    # Chunks for this worker, taken from the shared queue only when needed
+    for task in iter(tasks.get, None):
+        yield task
+
+def _worker_main(job, tasks, out, worker):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The parent handles Ctrl-C and stops us
+    forwarder = ForwardingSink(out, worker)
+    fortress_sink.install(forwarder)
+    try:
+        job.run(_pull(tasks), lambda kind, value: out.put((kind, worker, value)))
+    except Exception as e:
+        out.put(("error", worker, f"{type(e).__name__}: {e}"))
+    finally:
+        forwarder.close()
+        out.put(("done", worker, None))
+
+def run_sharded(job, processes=None, on_item=None):
+    """
+    Runs `job` on a pool of `processes` worker processes (default: one per
+    core). The job's tasks() are queued up front and handed out on demand;
+    its run(tasks, send) executes in each worker. Results the workers emit
+    come back here and go through the normal result sink, their metrics are
+    merged into this process's, and every send(kind, value) from a worker
+    calls on_item(kind, value).
+    """
+    processes = max(1, processes or default_processes())
+    context = multiprocessing.get_context("spawn")
+    tasks = context.Queue()
+    out = context.Queue()
+    for task in job.tasks(processes * CHUNKS_PER_PROCESS):
+        tasks.put(task)
+    for _ in range(processes):
+        tasks.put(None)
+    workers = [context.Process(target=_worker_main, args=(job, tasks, out, index), daemon=True)
+               for index in range(processes)]
+    for process in workers:
+        process.start()
+
+    running = set(range(processes))
+    try:
+        while running:
+            try:
+                kind, worker, value = out.get(timeout=0.5)
+            except queue.Empty:
+                for index in list(running):
+                    if not workers[index].is_alive() and workers[index].exitcode:
+                        print(f"[!] Worker {index} died (exit code {workers[index].exitcode})")
+                        running.discard(index)
+                continue
+            if kind == "emit":
+                for record_kind, message, fields in value:
+                    emit(record_kind, message, **fields)
+            elif kind == "metrics":
+                for name, exported in value.items():
+                    get_metrics(name).absorb(f"worker-{worker}", exported)
+            elif kind == "error":
+                print(f"[!] Worker {worker} failed: {value}")
+            elif kind == "done":
+                running.discard(worker)
+            elif on_item:
+                on_item(kind, value)
+    finally:
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        flush_results()
+
+class ScanJob:
+    """
+    Port scan of hosts x ports. Chunks are ranges of ProbeSpace counter
+    positions, so every worker walks its own slice of the same shuffled order.
+    """
+
+    def __init__(self, hosts, ports, seed, timeout=1, concurrency=500, retries=2, rate=None, host_rate=None):
+        self.hosts = hosts
+        self.ports = ports
+        self.seed = seed
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.retries = retries
+        self.rate = rate
+        self.host_rate = host_rate
+
+    def tasks(self, count):
+        from fortress_targets import ProbeSpace
+        domain = ProbeSpace(self.hosts, self.ports, self.seed).domain
+        step = max(1, -(-domain // count))
+        for start in range(0, domain, step):
+            yield start, min(domain, start + step)
+
+    def run(self, tasks, send):
+        from fortress_targets import ProbeSpace
+        from fortress_scanner import AsyncConnectScanner, raise_fd_limit, service_name
+        from fortress_scheduler import ProbeScheduler
+        probes = ProbeSpace(self.hosts, self.ports, self.seed)
+
+        def probe_order():
+            for start, stop in tasks:
+                yield from probes.iter_range(start, stop)
+
+        def found(ip, port):
+            emit("open_port", f"[+] {ip}:{port} is OPEN", host=ip, port=port, service=service_name(port))
+            send("open_port", (ip, port))
+
+        scheduler = ProbeScheduler(self.rate, self.host_rate, workers=1) if self.rate or self.host_rate else None
+        scanner = AsyncConnectScanner(self.timeout, raise_fd_limit(self.concurrency), on_open=found,
+                                      retries=self.retries, scheduler=scheduler)
+        asyncio.run(scanner.run(probe_order()))
+
+class SubdomainJob:
+    """
+    Subdomain enumeration. Chunks are byte ranges of the wordlist file.
+    """
+
+    def __init__(self, domain, wordlist_path, resolvers=None, concurrency=500, rate=None, record_types=("A",)):
+        self.domain = domain
+        self.wordlist_path = wordlist_path
+        self.resolvers = resolvers
+        self.concurrency = concurrency
+        self.rate = rate
+        self.record_types = record_types
+
+    def tasks(self, count):
+        for index in range(count):
+            yield index, count
+
+    def run(self, tasks, send):
+        from fortress_wordlist import Wordlist
+        from fortress_subenum import _enumerate
+
+        def words():
+            for shard in tasks:
+                with Wordlist(self.wordlist_path, shard=shard) as wordlist:
+                    yield from wordlist
+
+        found = lambda name, addresses: send("subdomain", (name, addresses))
+        asyncio.run(_enumerate(self.domain, words(), self.resolvers, self.concurrency, self.rate,
+                               self.record_types, None, found))
+
+class DirbustJob:
+    """
+    One directory level of a dirbust run: every prefix (directory) times
+    every byte range of the wordlist. The soft-404 fingerprints are
+    calibrated once by the parent and shipped to the workers.
+    """
+
+    def __init__(self, base_url, wordlist_path, prefixes, workers=10, timeout=3, extensions=(), fingerprints=(), recurse=False, rate=None):
+        self.base_url = base_url
+        self.wordlist_path = wordlist_path
+        self.prefixes = prefixes
+        self.workers = workers
+        self.timeout = timeout
+        self.extensions = extensions
+        self.fingerprints = fingerprints
+        self.recurse = recurse
+        self.rate = rate
+
+    def tasks(self, count):
+        per_prefix = max(1, count // len(self.prefixes))
+        for index in range(per_prefix):
+            for prefix in self.prefixes:
+                yield prefix, index, per_prefix
+
+    def run(self, tasks, send):
+        from fortress_wordlist import Wordlist
+        from fortress_dirbuster import _candidates, iter_path_results, make_session, report_path, is_directory
+        from fortress_scheduler import configure as configure_scheduler
+        if self.rate:
+            configure_scheduler(rate=self.rate, workers=self.workers)
+        session = make_session(self.workers)
+
+        def candidates():
+            for prefix, index, total in tasks:
+                with Wordlist(self.wordlist_path, shard=(index, total)) as wordlist:
+                    yield from _candidates(self.base_url, prefix, wordlist, self.extensions)
+
+        for full_url, result in iter_path_results(self.base_url, candidates(), self.workers, self.timeout, session):
+            if not isinstance(result, Exception):
+                relative_path = full_url[len(self.base_url):]
+                if any(f.matches(result, relative_path) for f in self.fingerprints):
+                    send("filtered", 1)
+                    continue
+            if report_path(full_url, result):
+                send("path", (full_url, self.recurse and is_directory(full_url, result)))
+
+def _share(total, processes):
+    # Splits a concurrency or rate budget over the processes
+    if not total:
+        return total
+    return max(1, total // processes) if isinstance(total, int) else total / processes
+
+def scan_targets_sharded(target_specs, port_spec, processes=None, timeout=1, concurrency=2000, seed=None, retries=2, rate=None, host_rate=None):
+    """
+    scan_targets spread over `processes` worker processes. The in-flight
+    budget and rate limits are split between them. Returns a dict of
+    host -> sorted open ports.
+    """
+    from fortress_targets import ProbeSpace, parse_targets, parse_ports
+    from fortress_scanner import _print_scan_summary
+    processes = max(1, processes or default_processes())
+    hosts = parse_targets(target_specs).resolved()
+    ports = port_spec if hasattr(port_spec, "port_at") else parse_ports(port_spec)
+    seed = random.getrandbits(32) if seed is None else seed
+    total = len(ProbeSpace(hosts, ports, seed))
+    if not total:
+        print("[!] Nothing to scan (no resolvable targets or no ports).")
+        return {}
+    print(f"\n[*] Starting port scan of {len(hosts)} hosts x {len(ports)} ports ({total} probes) on {processes} processes...")
+    print(f"[*] Up to {_share(concurrency, processes)} connects in flight per process")
+
+    results = {}
+
+    def collect(kind, value):
+        ip, port = value
+        results.setdefault(ip, []).append(port)
+
+    job = ScanJob(hosts, ports, seed, timeout, _share(concurrency, processes), retries,
+                  _share(rate, processes), _share(host_rate, processes))
+    run_sharded(job, processes, collect)
+    for ip in results:
+        results[ip].sort()
+        _print_scan_summary(ip, results[ip])
+    if not results:
+        print("\n[*] Scan completed. No open ports found on any target.")
+    return results
+
+def enumerate_subdomains_sharded(domain, wordlist_path, processes=None, resolvers=None, concurrency=500, rate=None, record_types=("A",)):
+    """
+    enumerate_subdomains spread over `processes` worker processes, each
+    taking byte ranges of the wordlist file. Returns a dict of full domain
+    -> list of addresses.
+    """
+    processes = max(1, processes or default_processes())
+    print(f"\n[*] Starting subdomain enumeration for: {domain} on {processes} processes")
+    found = {}
+
+    def collect(kind, value):
+        name, addresses = value
+        found[name] = addresses
+
+    job = SubdomainJob(domain, wordlist_path, resolvers, _share(concurrency, processes), _share(rate, processes), record_types)
+    run_sharded(job, processes, collect)
+    if not found:
+        print(f"[*] No subdomains found for {domain} from the provided list.")
+    else:
+        print(f"[*] Subdomain enumeration for {domain} completed. Found {len(found)} subdomains.")
+    return found
+
+def check_paths_sharded(base_url, wordlist_path, processes=None, workers=10, timeout=3, extensions=(), max_depth=0, calibrate_404=True, rate=None):
+    """
+    check_paths spread over `processes` worker processes. Each directory
+    level is one sharded run; directories found become the next level.
+    Returns the list of found URLs.
+    """
+    from fortress_dirbuster import calibrate, make_session
+    processes = max(1, processes or default_processes())
+    print(f"\n[*] Starting directory/file existence check for: {base_url} on {processes} processes")
+    if not base_url.endswith('/'):
+        base_url += '/'
+    fingerprints = calibrate(base_url, make_session(1), timeout) if calibrate_404 else []
+    for fingerprint in fingerprints:
+        print(f"[*] Soft-404 detected (Status: {fingerprint.status}); matching responses will be filtered.")
+
+    found = []
+    filtered = [0]
+    level = [""]
+    for depth in range(max_depth + 1):
+        directories = []
+
+        def collect(kind, value):
+            if kind == "filtered":
+                filtered[0] += value
+                return
+            full_url, directory = value
+            if full_url not in found:
+                found.append(full_url)
+            if directory:
+                directories.append(full_url[len(base_url):].rstrip('/') + '/')
+
+        if depth:
+            print(f"[*] Recursing into {len(level)} directories: {', '.join(urljoin(base_url, prefix) for prefix in level[:5])}{' ...' if len(level) > 5 else ''}")
+        job = DirbustJob(base_url, wordlist_path, level, _share(workers, processes), timeout, tuple(extensions),
+                         fingerprints, depth < max_depth, _share(rate, processes))
+        run_sharded(job, processes, collect)
+        level = list(dict.fromkeys(directories))
+        if not level:
+            break
+
+    if filtered[0]:
+        print(f"[*] Filtered {filtered[0]} soft-404 responses.")
+    if not found:
+        print(f"[*] No common files or directories found for {base_url} from the provided list.")
+    else:
+        print(f"[*] Existence check for {base_url} completed. Found {len(found)} potential paths.")
+    return found
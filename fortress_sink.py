@@ -0,0 +1,392 @@
+import sys
+import json
+import time
+import struct
+import atexit
+import argparse
+import threading
+from collections import deque
+
+BINARY_MAGIC = b"FRSINK1\n"
+
+class JsonlWriter:
+    """
+    Writes records as one JSON object per line.
+    """
+
+    def __init__(self, path):
+        self._file = sys.stdout if path == "-" else open(path, "a", encoding="utf-8")
+
+    def write(self, records):
+        dumps = json.dumps
+        self._file.write("".join(dumps(record, separators=(",", ":"), default=str) + "\n" for record in records))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+class BinaryWriter:
+    """
+    Writes records in a compact binary form (read back with read_records).
+
+    After an 8-byte magic the file is a sequence of entries, each starting
+    with a varint tag:
+        0 <len> <utf-8>                      defines the next string id
+        1 <kind id> <float64 time> <value>   a record; value is a dict
+    Values are typed by one byte: i (zigzag varint), f (float64), s (string
+    id), S (inline string), B (bytes), n (None), T/F (bool), l (list), d (dict
+    of string id -> value). Field names, record kinds and short repeated values
+    (IPs, host names, service names) are written once and then referred to by
+    id, so an open-port record is typically about 25 bytes.
+    """
+
+    MAX_INTERNED = 100000 # Strings beyond this many are written inline
+    INTERN_LENGTH = 64 # Longer strings (banners, titles) are written inline
+
+    def __init__(self, path):
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(BINARY_MAGIC)
+        else:
+            self._file.write(_varint(2)) # Appending: a new string table starts here
+        self._ids = {}
+
+    def _string(self, out, text):
+        index = self._ids.get(text)
+        if index is None:
+            data = text.encode("utf-8")
+            out += _varint(0) + _varint(len(data)) + data
+            index = self._ids[text] = len(self._ids)
+        return index
+
+    def _value(self, out, body, value):
+        if value is None:
+            body += b"n"
+        elif value is True or value is False:
+            body += b"T" if value else b"F"
+        elif isinstance(value, int):
+            body += b"i" + _varint(value << 1 if value >= 0 else (-value << 1) - 1)
+        elif isinstance(value, float):
+            body += b"f" + struct.pack("<d", value)
+        elif isinstance(value, str):
+            if len(value) <= self.INTERN_LENGTH and (value in self._ids or len(self._ids) < self.MAX_INTERNED):
+                body += b"s" + _varint(self._string(out, value))
+            else:
+                data = value.encode("utf-8", errors="replace")
+                body += b"S" + _varint(len(data)) + data
+        elif isinstance(value, (bytes, bytearray)):
+            body += b"B" + _varint(len(value)) + value
+        elif isinstance(value, dict):
+            body += b"d" + _varint(len(value))
+            for key, item in value.items():
+                body += _varint(self._string(out, str(key)))
+                self._value(out, body, item)
+        elif isinstance(value, (list, tuple, set)):
+            body += b"l" + _varint(len(value))
+            for item in value:
+                self._value(out, body, item)
+        else:
+            self._value(out, body, str(value))
+
+    def write(self, records):
+        out = bytearray()
+        for record in records:
+            body = bytearray()
+            kind = self._string(out, record["type"])
+            self._value(out, body, {key: value for key, value in record.items() if key not in ("type", "time")})
+            out += _varint(1) + _varint(kind) + struct.pack("<d", record["time"]) + body
+        self._file.write(out)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def _varint(number):
+    out = bytearray()
+    while number > 0x7f:
+        out.append((number & 0x7f) | 0x80)
+        number >>= 7
+    out.append(number)
+    return bytes(out)
+
+def _read_varint(data, position):
+    number = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, position
+        shift += 7
+
+def _read_value(data, position, strings):
+    tag = data[position:position + 1]
+    position += 1
+    if tag == b"n":
+        return None, position
+    if tag in (b"T", b"F"):
+        return tag == b"T", position
+    if tag == b"i":
+        number, position = _read_varint(data, position)
+        return (number >> 1) ^ -(number & 1), position
+    if tag == b"f":
+        return struct.unpack_from("<d", data, position)[0], position + 8
+    if tag == b"s":
+        index, position = _read_varint(data, position)
+        return strings[index], position
+    if tag in (b"S", b"B"):
+        length, position = _read_varint(data, position)
+        raw = bytes(data[position:position + length])
+        return (raw.decode("utf-8", errors="replace") if tag == b"S" else raw), position + length
+    if tag == b"l":
+        count, position = _read_varint(data, position)
+        items = []
+        for _ in range(count):
+            item, position = _read_value(data, position, strings)
+            items.append(item)
+        return items, position
+    if tag == b"d":
+        count, position = _read_varint(data, position)
+        items = {}
+        for _ in range(count):
+            key, position = _read_varint(data, position)
+            items[strings[key]], position = _read_value(data, position, strings)
+        return items, position
+    raise ValueError(f"unknown value tag {tag!r} at byte {position - 1}")
+
+def read_records(path):
+    """
+    Yields the records of a sink file (binary or JSONL) as dicts with "type"
+    and "time" keys plus the record's fields. A torn last record is ignored.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(BINARY_MAGIC):
+        for line in data.decode("utf-8", errors="replace").splitlines():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+        return
+    strings = []
+    position = len(BINARY_MAGIC)
+    while position < len(data):
+        try:
+            tag, position = _read_varint(data, position)
+            if tag == 0:
+                length, position = _read_varint(data, position)
+                strings.append(bytes(data[position:position + length]).decode("utf-8"))
+                position += length
+            elif tag == 1:
+                kind, position = _read_varint(data, position)
+                timestamp = struct.unpack_from("<d", data, position)[0]
+                fields, position = _read_value(data, position + 8, strings)
+                yield dict(type=strings[kind], time=timestamp, **fields)
+            elif tag == 2:
+                strings = []
+            else:
+                raise ValueError(f"unknown entry tag {tag}")
+        except (IndexError, struct.error):
+            return # Torn final record (crash mid-write)
+
+class ConsoleView:
+    """
+    The human-readable side of a sink: prints each record's message, at most
+    `rate` lines per second (None = no limit). Lines over the limit are
+    counted and summarised instead, so a fast scan cannot be slowed down by
+    the terminal; the output file still gets every record.
+    """
+
+    def __init__(self, rate=None, stream=None):
+        self.rate = rate
+        self.stream = stream or sys.stdout
+        self.suppressed = 0
+        self._allowance = rate or 0
+        self._last = time.monotonic()
+        self._last_notice = 0
+
+    def show(self, messages):
+        if self.rate:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            shown = int(self._allowance)
+            self._allowance -= min(shown, len(messages))
+            self.suppressed += max(0, len(messages) - shown)
+            messages = messages[:shown]
+            if self.suppressed and now - self._last_notice >= 1:
+                messages.append(f"[*] ... {self.suppressed} more results not shown (console limited to {self.rate} lines/s)")
+                self.suppressed = 0
+                self._last_notice = now
+        if messages:
+            self.stream.write("\n".join(messages) + "\n")
+            self.stream.flush()
+
+class ResultSink:
+    """
+    Collects typed result records (open ports, banners, subdomains, paths,
+    geolocation, ...) from any thread and writes them in batches from one
+    background thread.
+
+    emit() only appends to a deque, so it is cheap to call from scan hot
+    paths. Every `interval` seconds, or as soon as `batch` records are
+    waiting, the writer thread hands the whole batch to each writer in one
+    write call and shows the messages on the console view (if any).
+    """
+
+    def __init__(self, writers=(), console=None, batch=2000, interval=0.2):
+        self.writers = list(writers)
+        self.console = console
+        self.batch = batch
+        self.interval = interval
+        self.count = 0
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, kind, message=None, fields=None):
+        self._pending.append((kind, time.time(), message, fields or {}))
+        if len(self._pending) >= self.batch:
+            self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Writes out everything emitted so far.
+        """
+        with self._write_lock:
+            pending = self._pending
+            records = []
+            messages = []
+            while pending:
+                kind, timestamp, message, fields = pending.popleft()
+                if message is not None:
+                    messages.append(message)
+                records.append({"type": kind, "time": timestamp, **fields})
+            if not records:
+                return
+            self.count += len(records)
+            for writer in self.writers:
+                try:
+                    writer.write(records)
+                except OSError as e:
+                    print(f"[!] Could not write results: {e}")
+            if self.console:
+                self.console.show(messages)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        for writer in self.writers:
+            writer.close()
+
+# Process-wide sink (see configure); without one, emit() just prints
+_sink = None
+
+def configure(output=None, fmt=None, console=True, console_rate=None):
+    """
+    Installs the process-wide result sink. `output` is a file path ("-" for
+    stdout) written as JSONL, or in the binary format if fmt="bin" or the
+    path ends in .bin. console=False hides the human-readable lines;
+    console_rate caps them per second. Returns the sink.
+    """
+    global _sink
+    writers = []
+    if output:
+        binary = fmt == "bin" or (fmt is None and output.endswith(".bin"))
+        writers.append(BinaryWriter(output) if binary else JsonlWriter(output))
+        if output == "-":
+            console = False # stdout carries the records
+    view = ConsoleView(console_rate) if console else None
+    close()
+    _sink = ResultSink(writers, view)
+    atexit.register(close)
+    return _sink
+
+def get_sink():
+    return _sink
+
+def install(sink):
+    """
+    Installs any object with emit(kind, message, fields), flush() and close()
+    as the process-wide sink (e.g. one that forwards to another process).
+    """
+    global _sink
+    close()
+    _sink = sink
+    atexit.register(close)
+
+def emit(kind, message=None, **fields):
+    """
+    Reports one result. `message` is the line shown to humans (None for
+    records that are only meant for the output file); fields are the
+    machine-readable data. Without a configured sink this is just print().
+    """
+    sink = _sink
+    if sink is None:
+        if message is not None:
+            print(message)
+        return
+    sink.emit(kind, message, fields)
+
+def flush():
+    """
+    Writes out pending results, e.g. before printing a summary.
+    """
+    if _sink is not None:
+        _sink.flush()
+
+def close():
+    global _sink
+    if _sink is not None:
+        _sink.close()
+        _sink = None
+
+def add_output_arguments(parser):
+    """
+    Adds the shared --output / --format / --quiet / --console-rate options.
+    """
+    parser.add_argument("-o", "--output", help="Also write results to this file as JSON lines (or binary if it ends in .bin; '-' for stdout)")
+    parser.add_argument("--format", choices=("jsonl", "bin"), help="Output file format (default: from the file name)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not print individual results (use with --output)")
+    parser.add_argument("--console-rate", type=int, help="Print at most this many results per second")
+
+def configure_from_args(args):
+    """
+    Installs a sink if any of the add_output_arguments options were given.
+    """
+    if args.output or args.quiet or args.console_rate:
+        return configure(args.output, args.format, not args.quiet, args.console_rate)
+    return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tech Fortress result file reader: prints sink files (binary or JSONL) as JSON lines.")
+    parser.add_argument("files", nargs="+", help="Result files written with --output")
+    parser.add_argument("-t", "--type", action="append", help="Only records of this type (repeatable, e.g. open_port)")
+    parser.add_argument("--count", action="store_true", help="Only count records per type")
+    args = parser.parse_args()
+
+    counts = {}
+    for path in args.files:
+        for record in read_records(path):
+            if args.type and record.get("type") not in args.type:
+                continue
+            if args.count:
+                counts[record["type"]] = counts.get(record["type"], 0) + 1
+            else:
+                print(json.dumps(record, default=lambda value: value.hex() if isinstance(value, bytes) else str(value)))
+    for kind, number in sorted(counts.items()):
+        print(f"{kind}: {number}")
@@ -0,0 +1,483 @@
+import os
+import sys
+import math
+import time
+import sqlite3
+import asyncio
+import argparse
+
+from fortress_cache import STATE_DIR
+from fortress_sink import emit, flush as flush_results, configure, get_sink, add_output_arguments
+from fortress_metrics import add_metrics_arguments, start_from_args as start_metrics
+
+DEFAULT_STORE = os.path.join(STATE_DIR, "results.db")
+DAY = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS findings (
+    kind TEXT NOT NULL,       -- port, banner, subdomain, path
+    target TEXT NOT NULL,     -- IP, domain or base URL
+    item TEXT NOT NULL,       -- port number, host name or relative path
+    value TEXT,               -- service / banner summary, addresses, ...
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    present INTEGER NOT NULL, -- 0 once a re-check no longer finds it
+    PRIMARY KEY (kind, target, item)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sweeps (
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    space TEXT NOT NULL,      -- what was swept: a port list or a wordlist path
+    size INTEGER NOT NULL,
+    cursor INTEGER NOT NULL,  -- where the next partial sweep starts
+    full_at REAL NOT NULL,    -- when the whole space was last covered
+    PRIMARY KEY (kind, target, space)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (
+    time REAL NOT NULL,
+    change TEXT NOT NULL,     -- new, gone, changed
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    item TEXT NOT NULL,
+    old TEXT,
+    new TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_by_time ON changes (time);
+"""
+
+class Window:
+    """
+    The positions of a probe space (the ports of a port list, the words of a
+    wordlist) that one incremental run covers: the first `always` positions
+    (the most common ports / words), then `count` positions of the rest
+    starting at `start` and wrapping around. A full window covers everything.
+    """
+
+    def __init__(self, size, always=0, start=0, count=0, full=False, first=False):
+        self.size = size
+        self.always = size if full else min(always, size)
+        self.start = start
+        self.count = 0 if full else count
+        self.full = full
+        self.first = first # No earlier run: everything found is the baseline
+
+    def __len__(self):
+        return self.always + self.count
+
+    def __contains__(self, position):
+        if position < self.always:
+            return True
+        rest = self.size - self.always
+        return rest > 0 and (position - self.always - self.start) % rest < self.count
+
+    def positions(self):
+        yield from range(self.always)
+        rest = self.size - self.always
+        for offset in range(self.count):
+            yield self.always + (self.start + offset) % rest
+
+class ResultStore:
+    """
+    A small sqlite database of what earlier runs found, by kind and target:
+    open ports (with their banners), subdomains and paths. Each run tells it
+    what it saw with update(), which returns the differences to the stored
+    state and records them in a change log.
+
+    It also remembers, per target and probe space, how far the rotating
+    partial sweeps have got (see window()), so daily re-runs only probe a
+    slice of the space while still covering all of it over time.
+    """
+
+    def __init__(self, path=DEFAULT_STORE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL") # Readers (show/changes) never block a running scan
+        self.db.executescript(SCHEMA)
+
+    def known(self, kind, target):
+        """
+        The findings of `kind` currently present for target, as {item: value}.
+        """
+        rows = self.db.execute("SELECT item, value FROM findings WHERE kind = ? AND target = ? AND present = 1", (kind, target))
+        return dict(rows.fetchall())
+
+    def window(self, kind, target, space, size, sample=0.1, full_every=30, always=100, full=False):
+        """
+        The Window to probe this run: everything on the first run, when the
+        space changed, when `full` is set, or when the last complete pass is
+        more than `full_every` days old (0 = never forced); otherwise the
+        first `always` positions plus the next `sample` fraction of the rest.
+        """
+        row = self.db.execute("SELECT size, cursor, full_at FROM sweeps WHERE kind = ? AND target = ? AND space = ?",
+                              (kind, target, space)).fetchone()
+        first = row is None and not self.known(kind, target)
+        if full or row is None or row[0] != size or sample >= 1 or (full_every and time.time() - row[2] >= full_every * DAY):
+            return Window(size, full=True, first=first)
+        rest = size - min(always, size)
+        count = min(rest, max(1, math.ceil(rest * sample)))
+        return Window(size, always, row[1] % rest if rest else 0, count)
+
+    def finish_window(self, kind, target, space, window):
+        """
+        Moves the target's sweep cursor past a window that was probed.
+        """
+        now = time.time()
+        row = self.db.execute("SELECT full_at FROM sweeps WHERE kind = ? AND target = ? AND space = ?", (kind, target, space)).fetchone()
+        full_at = now if window.full or row is None else row[0]
+        cursor = 0
+        if not window.full:
+            rest = window.size - window.always
+            cursor = window.start + window.count
+            if rest and cursor >= rest:
+                cursor -= rest
+                full_at = now # The rotation has covered the whole space
+        self.db.execute("INSERT OR REPLACE INTO sweeps VALUES (?, ?, ?, ?, ?, ?)", (kind, target, space, window.size, cursor, full_at))
+        self.db.commit()
+
+    def update(self, kind, target, seen, baseline=False):
+        """
+        Records what a run found for target ({item: value}); every present
+        finding of this kind that is not in `seen` is marked gone, so only
+        call this for findings the run re-checked. Returns the changes as
+        dicts (change, kind, target, item, old, new). With baseline=True
+        the findings are stored without being reported as new.
+        """
+        now = time.time()
+        seen = {str(item): value for item, value in seen.items()} # Ports are stored as text
+        rows = self.db.execute("SELECT item, value, present FROM findings WHERE kind = ? AND target = ?", (kind, target))
+        stored = {item: (value, present) for item, value, present in rows}
+        changes = []
+        for item, value in seen.items():
+            old = stored.get(item)
+            if old is None or not old[1]:
+                changes.append({"change": "new", "kind": kind, "target": target, "item": item, "old": None, "new": value})
+            elif old[0] != value:
+                changes.append({"change": "changed", "kind": kind, "target": target, "item": item, "old": old[0], "new": value})
+        for item, (value, present) in stored.items():
+            if present and item not in seen:
+                changes.append({"change": "gone", "kind": kind, "target": target, "item": item, "old": value, "new": None})
+
+        self.db.executemany("""INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?, 1)
+                               ON CONFLICT (kind, target, item) DO UPDATE SET value = excluded.value, last_seen = excluded.last_seen, present = 1""",
+                            [(kind, target, item, value, now, now) for item, value in seen.items()])
+        self.db.executemany("UPDATE findings SET present = 0 WHERE kind = ? AND target = ? AND item = ?",
+                            [(kind, target, change["item"]) for change in changes if change["change"] == "gone"])
+        if baseline:
+            changes = [change for change in changes if change["change"] != "new"]
+        self.db.executemany("INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            [(now, c["change"], c["kind"], c["target"], c["item"], c["old"], c["new"]) for c in changes])
+        self.db.commit()
+        return changes
+
+    def findings(self, target=None, kind=None, include_gone=False):
+        """
+        Stored findings as (kind, target, item, value, first_seen, last_seen, present) rows.
+        """
+        query = "SELECT kind, target, item, value, first_seen, last_seen, present FROM findings WHERE 1 = 1"
+        params = []
+        if target:
+            query += " AND target = ?"
+            params.append(target)
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        if not include_gone:
+            query += " AND present = 1"
+        return self.db.execute(query + " ORDER BY kind, target, item", params).fetchall()
+
+    def changes(self, since=0, target=None):
+        """
+        Logged changes since a time.time() value, oldest first, as dicts.
+        """
+        query = "SELECT time, change, kind, target, item, old, new FROM changes WHERE time >= ?"
+        params = [since]
+        if target:
+            query += " AND target = ?"
+            params.append(target)
+        keys = ("time", "change", "kind", "target", "item", "old", "new")
+        return [dict(zip(keys, row)) for row in self.db.execute(query + " ORDER BY time", params)]
+
+    def close(self):
+        self.db.close()
+
+def _describe_change(change):
+    # One line per change, in the toolkit's [+] / [-] / [~] style
+    kind, target, item, old, new = change["kind"], change["target"], change["item"], change["old"], change["new"]
+    if kind == "port":
+        return f"[+] New open port: {target}:{item}" if change["change"] == "new" else f"[-] Port closed: {target}:{item}"
+    if kind == "banner":
+        return f"[~] Banner changed on {target}:{item}: {old!r} -> {new!r}"
+    if kind == "subdomain":
+        if change["change"] == "new":
+            return f"[+] New subdomain: {item} -> {new}"
+        if change["change"] == "gone":
+            return f"[-] Subdomain gone: {item} (was {old})"
+        return f"[~] {item} now resolves to {new} (was {old})"
+    if kind == "path":
+        url = target + item
+        return f"[+] New path: {url}" if change["change"] == "new" else f"[-] Path gone: {url}"
+    return f"[~] {change['change']} {kind} {target} {item}: {old!r} -> {new!r}"
+
+def _worth_reporting(change):
+    # Banners that appear or disappear along with their port are not listed
+    # separately; only banners that changed on a port that stayed open are
+    return change["kind"] != "banner" or change["change"] == "changed"
+
+def report_changes(changes):
+    """
+    Prints the diff of a run and emits one "change" record per difference.
+    """
+    changes = [change for change in changes if _worth_reporting(change)]
+    print("\n--- Changes since the last run ---")
+    for change in changes:
+        print(_describe_change(change))
+        # For the output file (the line above is for humans)
+        emit("change", None, change=change["change"], finding=change["kind"], target=change["target"],
+             item=change["item"], old=change["old"], new=change["new"])
+    if not changes:
+        print("[*] No changes.")
+    flush_results()
+    return changes
+
+def _banner_value(banner, match):
+    # What is compared between runs: the identified service if the probe
+    # database knows it (a banner's dates and counters change every time),
+    # else the banner's first line
+    if match:
+        from fortress_probes import describe
+        return describe(match)
+    text = banner.decode("utf-8", errors="ignore").strip()
+    return text.splitlines()[0][:200] if text else ""
+
+def incremental_scan(store, target_specs, ports, sample=0.1, full_every=30, always=100, full=False,
+                     timeout=1, concurrency=2000, retries=2, banners=True, banner_timeout=5):
+    """
+    Re-scans targets against the stored results. For every host the ports
+    found open last time are probed first, then the always-probed head of the
+    port list (the most common ports for top_ports lists) and this run's slice
+    of the rest (see ResultStore.window). Banners of the open ports are
+    grabbed and compared. Returns the list of changes.
+    """
+    from fortress_scanner import AsyncConnectScanner, raise_fd_limit
+    from fortress_targets import parse_targets, parse_ports
+
+    hosts = [str(ip) for ip in parse_targets(target_specs).resolved()]
+    ports = ports if hasattr(ports, "port_at") else parse_ports(ports)
+    space = str(ports)
+    plans = {}
+    for ip in hosts:
+        known = sorted(int(port) for port in store.known("port", ip))
+        plans[ip] = (known, store.window("port", ip, space, len(ports), sample, full_every, always, full))
+
+    def probes():
+        # Known open ports first, so a closed one shows up in the first seconds
+        for ip, (known, window) in plans.items():
+            for port in known:
+                yield ip, port
+        for ip, (known, window) in plans.items():
+            skip = set(known)
+            for position in window.positions():
+                port = ports.port_at(position)
+                if port not in skip:
+                    yield ip, port
+
+    planned = 0
+    for known, window in plans.values():
+        skip = set(known)
+        planned += len(known) + sum(1 for position in window.positions() if ports.port_at(position) not in skip)
+    everything = len(hosts) * len(ports)
+    fresh = sum(1 for known, window in plans.values() if window.full)
+    print(f"[*] Probing {planned} of {everything} host/port pairs ({planned * 100 / max(1, everything):.0f}%): "
+          f"{sum(len(known) for known, window in plans.values())} known open ports first, "
+          f"{fresh} of {len(hosts)} hosts swept in full.")
+
+    scanner = AsyncConnectScanner(timeout, raise_fd_limit(concurrency), retries=retries)
+    opened = asyncio.run(scanner.run(probes()))
+    seen = {ip: {} for ip in hosts}
+    grabbed = {ip: {} for ip in hosts}
+    for ip, port in opened:
+        seen[ip][port] = None
+
+    # Banners are compared for ports that ever had one (a banner lost to one
+    # failed grab is asked for again) and for new ports; ports known to stay
+    # silent are only asked again on full sweeps
+    talkers = {ip: {int(item) for _, _, item, _, _, _, _ in store.findings(ip, "banner", include_gone=True)} for ip in hosts}
+    pairs = sorted((ip, port) for ip, port in opened
+                   if port in talkers[ip] or port not in plans[ip][0] or plans[ip][1].full)
+    if banners and pairs:
+        from fortress_bannergrab import grab_banners
+        print(f"[*] Grabbing banners from {len(pairs)} of {len(opened)} open ports...")
+        for host, port, banner, error, match in grab_banners(pairs, timeout=banner_timeout):
+            value = None if error or banner is None else _banner_value(banner, match)
+            if value:
+                grabbed[host][port] = value
+
+    changes = []
+    for ip in hosts:
+        known, window = plans[ip]
+        changes += store.update("port", ip, seen[ip], baseline=window.first)
+        if banners:
+            changes += store.update("banner", ip, grabbed[ip], baseline=window.first)
+        store.finish_window("port", ip, space, window)
+        if window.first:
+            print(f"[*] {ip}: baseline recorded ({len(seen[ip])} open ports).")
+    return changes
+
+def _sweep_words(store, kind, target, wordlist_path, to_word, sample, full_every, always, full):
+    # The words to try this run: the known findings, then this run's window
+    # of the wordlist. Returns (words, window, known).
+    from fortress_wordlist import Wordlist
+    known = store.known(kind, target)
+    known_words = [to_word(item) for item in known]
+    skip = set(known_words)
+    try:
+        wordlist = Wordlist(wordlist_path)
+    except OSError as e:
+        print(f"[!] Could not read wordlist '{wordlist_path}': {e}")
+        sys.exit(1)
+    with wordlist:
+        # Sized over the entries as iterated (no blank lines or duplicates), so
+        # window positions are the ones enumerate() hands out below
+        size = sum(1 for _ in wordlist)
+        window = store.window(kind, target, os.path.abspath(wordlist_path), size, sample, full_every, always, full)
+        words = known_words + [word for position, word in enumerate(wordlist) if position in window and word not in skip]
+    print(f"[*] Trying {len(words)} of {size} words ({len(words) * 100 / max(1, size):.0f}%): "
+          f"{len(known)} known findings first{', full sweep' if window.full else ''}.")
+    return words, window, known
+
+def incremental_enum(store, domain, wordlist_path, sample=0.1, full_every=30, always=100, full=False,
+                     resolvers=None, concurrency=500, rate=None):
+    """
+    Re-enumerates a domain: the subdomains found last time are resolved
+    again first, then this run's slice of the wordlist. Returns the changes.
+    """
+    from fortress_subenum import enumerate_subdomains
+    suffix = "." + domain
+    words, window, known = _sweep_words(store, "subdomain", domain, wordlist_path, lambda name: name[:-len(suffix)],
+                                        sample, full_every, always, full)
+    found = enumerate_subdomains(domain, words, resolvers, concurrency, rate)
+    missing = [name[:-len(suffix)] for name in known if name not in found]
+    if missing:
+        # DNS runs over UDP: give known names a second chance before calling them gone
+        print(f"[*] Re-checking {len(missing)} known subdomains that did not answer...")
+        found.update(enumerate_subdomains(domain, missing, resolvers, concurrency, rate))
+    seen = {name: ", ".join(sorted(addresses)) for name, addresses in found.items()}
+    changes = store.update("subdomain", domain, seen, baseline=window.first)
+    if window.first:
+        print(f"[*] {domain}: baseline recorded ({len(seen)} subdomains).")
+    store.finish_window("subdomain", domain, os.path.abspath(wordlist_path), window)
+    return changes
+
+def incremental_dirbust(store, base_url, wordlist_path, sample=0.1, full_every=30, always=100, full=False,
+                        workers=10, timeout=3):
+    """
+    Re-checks a web server: the paths found last time are requested again
+    first, then this run's slice of the wordlist. Returns the changes.
+    """
+    from fortress_dirbuster import check_paths
+    if not base_url.endswith("/"):
+        base_url += "/"
+    words, window, known = _sweep_words(store, "path", base_url, wordlist_path, lambda path: path,
+                                        sample, full_every, always, full)
+    found = check_paths(base_url, words, workers, timeout)
+    answered = set(found)
+    missing = [path for path in known if base_url + path not in answered]
+    if missing:
+        # A timeout or a reset is not a removed page: ask once more before calling them gone
+        print(f"[*] Re-checking {len(missing)} known paths that did not answer...")
+        found += check_paths(base_url, missing, workers, timeout)
+    seen = {url[len(base_url):]: None for url in found}
+    changes = store.update("path", base_url, seen, baseline=window.first)
+    if window.first:
+        print(f"[*] {base_url}: baseline recorded ({len(seen)} paths).")
+    store.finish_window("path", base_url, os.path.abspath(wordlist_path), window)
+    return changes
+
+def _age(seconds):
+    return f"{seconds / DAY:.1f}d" if seconds >= DAY else f"{seconds / 3600:.1f}h"
+
+def main(argv=None):
+    """
+    Command-line entry point (also used by the fortress daemon).
+    """
+    schedule = argparse.ArgumentParser(add_help=False)
+    schedule.add_argument("--db", default=DEFAULT_STORE, help=f"Results store (default: {DEFAULT_STORE})")
+    schedule.add_argument("--sample", type=float, default=0.1, help="Fraction of the not-yet-known part of the port list / wordlist to probe per run (default: 0.1)")
+    schedule.add_argument("--always", type=int, default=100, help="Always probe this many entries from the head of the list, i.e. the most common ports or words (default: 100)")
+    schedule.add_argument("--full-every", type=float, default=30, help="Sweep everything again once the last complete pass is this many days old; 0 = never force (default: 30)")
+    schedule.add_argument("--full", action="store_true", help="Sweep everything this run")
+    schedule.add_argument("-v", "--verbose", action="store_true", help="Also print every finding, not just the changes")
+    add_output_arguments(schedule)
+    add_metrics_arguments(schedule)
+
+    parser = argparse.ArgumentParser(description="Tech Fortress results store: incremental re-scans against stored results, reported as a diff (new / closed ports, changed banners, new subdomains and paths).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan_parser = commands.add_parser("scan", parents=[schedule], help="Re-scan hosts for open ports and banners")
+    scan_parser.add_argument("targets", nargs="*", default=["target.txt"], help="Targets or target files (default: target.txt)")
+    scan_parser.add_argument("-p", "--ports", default="top1000", help="Port list, e.g. top1000 or 1-65535 (default: top1000)")
+    scan_parser.add_argument("--timeout", type=float, default=1, help="Connect timeout in seconds (default: 1)")
+    scan_parser.add_argument("--concurrency", type=int, default=2000, help="Connects in flight (default: 2000)")
+    scan_parser.add_argument("--retries", type=int, default=2, help="Retries for unanswered probes (default: 2)")
+    scan_parser.add_argument("--no-banners", action="store_true", help="Do not grab and compare banners")
+    enum_parser = commands.add_parser("enum", parents=[schedule], help="Re-enumerate the subdomains of a domain")
+    enum_parser.add_argument("-d", "--domain", required=True, help="Target domain")
+    enum_parser.add_argument("-w", "--wordlist", required=True, help="Subdomain wordlist")
+    enum_parser.add_argument("-r", "--resolver", action="append", help="DNS resolver to query (repeatable)")
+    enum_parser.add_argument("-c", "--concurrency", type=int, default=500, help="DNS queries in flight (default: 500)")
+    enum_parser.add_argument("--rate", type=int, help="Maximum queries per second per resolver")
+    dirbust_parser = commands.add_parser("dirbust", parents=[schedule], help="Re-check a web server for files and directories")
+    dirbust_parser.add_argument("-u", "--url", required=True, help="Target base URL")
+    dirbust_parser.add_argument("-w", "--wordlist", required=True, help="Path wordlist")
+    dirbust_parser.add_argument("-c", "--workers", type=int, default=10, help="Concurrent requests (default: 10)")
+    dirbust_parser.add_argument("--timeout", type=float, default=3, help="Per-request timeout in seconds (default: 3)")
+    show_parser = commands.add_parser("show", help="List the stored findings")
+    show_parser.add_argument("target", nargs="?", help="Only this target (IP, domain or base URL)")
+    show_parser.add_argument("--all", action="store_true", help="Include findings that are gone")
+    show_parser.add_argument("--db", default=DEFAULT_STORE, help=f"Results store (default: {DEFAULT_STORE})")
+    changes_parser = commands.add_parser("changes", help="List the logged changes")
+    changes_parser.add_argument("target", nargs="?", help="Only this target")
+    changes_parser.add_argument("--days", type=float, default=7, help="How far back (default: 7)")
+    changes_parser.add_argument("--db", default=DEFAULT_STORE, help=f"Results store (default: {DEFAULT_STORE})")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.db)
+    now = time.time()
+    if args.command == "show":
+        for kind, target, item, value, first_seen, last_seen, present in store.findings(args.target, include_gone=args.all):
+            state = "" if present else " [gone]"
+            print(f"{kind:9} {target} {item}{' ' + value if value else ''}  (first seen {_age(now - first_seen)} ago, last {_age(now - last_seen)} ago){state}")
+        store.close()
+        return
+    if args.command == "changes":
+        for change in filter(_worth_reporting, store.changes(now - args.days * DAY, args.target)):
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(change['time']))}  {_describe_change(change)}")
+        store.close()
+        return
+
+    # Individual findings only go to the output file unless --verbose; the diff is always
+    # printed. (Under the daemon the client's sink decides, so its -q hides them.)
+    if get_sink() is None and (args.output or args.quiet or args.console_rate or not args.verbose):
+        configure(args.output, args.format, args.verbose and not args.quiet, args.console_rate)
+    start_metrics(args)
+    schedule_args = dict(sample=args.sample, full_every=args.full_every, always=args.always, full=args.full)
+    started = time.monotonic()
+    try:
+        if args.command == "scan":
+            changes = incremental_scan(store, args.targets, args.ports, timeout=args.timeout, concurrency=args.concurrency,
+                                       retries=args.retries, banners=not args.no_banners, **schedule_args)
+        elif args.command == "enum":
+            changes = incremental_enum(store, args.domain, args.wordlist, resolvers=args.resolver,
+                                       concurrency=args.concurrency, rate=args.rate, **schedule_args)
+        else:
+            changes = incremental_dirbust(store, args.url, args.wordlist, workers=args.workers, timeout=args.timeout, **schedule_args)
+    except KeyboardInterrupt:
+        print("\n[!] Interrupted. The store was not updated for the unfinished targets.")
+        store.close()
+        sys.exit(1)
+    report_changes(changes)
+    print(f"[*] Done in {time.monotonic() - started:.1f}s.")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,105 @@
-import socket # For DNS lookups
 import sys
+import os
+import asyncio
 import argparse # New import for command-line arguments
 
-def load_wordlist(filepath):
-    """
-    Loads items from a wordlist file into a list.
-    """
-    try:
-        with open(filepath, 'r') as f:
-            # Read lines, strip whitespace (like newlines), and filter out empty lines
-            wordlist = [line.strip() for line in f if line.strip()]
-        print(f"[*] Loaded {len(wordlist)} items from wordlist: {filepath}")
-        return wordlist
-    except FileNotFoundError:
-        print(f"[!] Error: Wordlist file not found at '{filepath}'.")
-        sys.exit(1)
-    except Exception as e:
-        print(f"[!] An error occurred while loading wordlist: {e}")
-        sys.exit(1)
+from fortress_dns import AsyncResolver
+from fortress_cache import cache, NEGATIVE
+from fortress_wordlist import load_wordlist # Shared, memory-mapped and lazy
+from fortress_journal import Journal, OffsetTracker, iter_from, journal_path
+from fortress_sink import emit, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import add_metrics_arguments, start_from_args as start_metrics
 
-def enumerate_subdomains(domain, subdomains_list):
+def enumerate_subdomains(domain, subdomains_list, resolvers=None, concurrency=500, rate=None, record_types=("A",), journal=None, on_found=None):
     """
     Attempts to resolve common subdomains for a given domain using a provided list.
+    Queries go out concurrently through the built-in async DNS client; pass
+    resolvers=[...] to spread them over specific servers (default: /etc/resolv.conf),
+    and rate to cap queries per second per resolver.
+    With a journal, progress through the wordlist is checkpointed and a resumed
+    run continues after the last word whose answer (and every earlier one) is in.
+    on_found(full_domain, addresses) is called as each subdomain is found.
+    Returns a dict of full domain -> list of addresses.
     """
     print(f"\n[*] Starting subdomain enumeration for: {domain}")
-    found_count = 0
-    for subdomain in subdomains_list:
-        full_domain = f"{subdomain}.{domain}"
-        try:
-            # Attempt to get IP address for the full domain
-            ip_address = socket.gethostbyname(full_domain)
-            print(f"[+] Found: {full_domain} -> {ip_address}")
-            found_count += 1
-        except socket.gaierror:
-            # This means the subdomain does not resolve (i.e., doesn't exist)
-            pass # Suppress 'not found' messages for cleaner output
-        except Exception as e:
-            print(f"[!] An unexpected error occurred with {full_domain}: {e}")
-    
-    if found_count == 0:
+    found = asyncio.run(_enumerate(domain, subdomains_list, resolvers, concurrency, rate, record_types, journal, on_found))
+    flush_results()
+
+    if not found:
         print(f"[*] No subdomains found for {domain} from the provided list.")
     else:
-        print(f"[*] Subdomain enumeration for {domain} completed. Found {found_count} subdomains.")
+        print(f"[*] Subdomain enumeration for {domain} completed. Found {len(found)} subdomains.")
+    return found
 
+async def _enumerate(domain, subdomains_list, resolvers, concurrency, rate, record_types, journal, on_found=None):
+    found = {}
+    start = 0
+    tracker = None
+    if journal:
+        start = journal.state.position()
+        for finding in journal.state.findings_of("subdomain"):
+            found[finding["name"]] = finding["addresses"]
+        if start:
+            print(f"[*] Resuming after wordlist position {start} ({len(found)} subdomains found so far)")
+        tracker = OffsetTracker(journal)
 
-if __name__ == "__main__":
+    def report(full_domain, addresses, via=""):
+        emit("subdomain", f"[+] Found: {full_domain} -> {', '.join(addresses)}{via}", name=full_domain, addresses=list(addresses))
+        found[full_domain] = list(addresses)
+        if journal:
+            journal.found("subdomain", name=full_domain, addresses=list(addresses))
+        if on_found:
+            on_found(full_domain, list(addresses))
+
+    def uncached_names():
+        # Names answered by the shared cache (e.g. a warm snapshot) cost no query
+        for position, subdomain in iter_from(subdomains_list, start):
+            full_domain = f"{subdomain}.{domain}"
+            if tracker:
+                tracker.issue(full_domain, position)
+            addresses = cache.get(full_domain)
+            if addresses is None:
+                yield full_domain
+                continue
+            if addresses:
+                report(full_domain, addresses)
+            if tracker:
+                tracker.complete(full_domain)
+
+    async with AsyncResolver(resolvers, rate=rate) as resolver:
+        async for full_domain, result in resolver.resolve_many(uncached_names(), concurrency, record_types):
+            if result is None or not result[0]:
+                cache.put(full_domain, NEGATIVE) # Doesn't exist (or dangling CNAME)
+            else:
+                addresses, cnames, ttl = result
+                cache.put(full_domain, addresses, ttl)
+                report(full_domain, addresses, f" (via {cnames[-1]})" if cnames else "")
+            if tracker:
+                tracker.complete(full_domain)
+    return found
+
+
+def main(argv=None):
+    """
+    Command-line entry point (also used by the fortress daemon).
+    """
     parser = argparse.ArgumentParser(description="Tech Fortress Simple Subdomain Enumerator Module. This tool attempts to find common subdomains for a target domain using a wordlist.")
     parser.add_argument("-d", "--domain", help="Target domain (e.g., example.com)", required=True)
     parser.add_argument("-w", "--wordlist", help="Path to the subdomain wordlist file (e.g., /usr/share/wordlists/seclists/Discovery/DNS/subdomains-top1million-5000.txt)", required=True)
+    parser.add_argument("-r", "--resolver", action="append", help="DNS resolver to query, e.g. 1.1.1.1 or 127.0.0.1:5353 (repeatable; default: system resolvers)")
+    parser.add_argument("-c", "--concurrency", type=int, default=500, help="Maximum DNS queries in flight (default: 500)")
+    parser.add_argument("--rate", type=int, help="Maximum queries per second per resolver (default: unlimited)")
+    parser.add_argument("--aaaa", action="store_true", help="Also query AAAA records")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run with the same arguments from its journal")
+    parser.add_argument("--journal", help="Progress journal file (default: one per command line under ~/.fortress/journal)")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record progress")
+    parser.add_argument("-P", "--processes", type=int, default=1, help="Spread the wordlist over this many processes (0 = one per core; no journal)")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+    start_metrics(args)
 
     print("--- Tech Fortress Simple Subdomain Enumerator Module ---")
     
@@ -63,5 +113,26 @@ if __name__ == "__main__":
         print("[!] The provided wordlist is empty or could not be loaded. Exiting.")
         sys.exit(1)
 
-    enumerate_subdomains(target_domain, subdomains_to_check)
+    record_types = ("A", "AAAA") if args.aaaa else ("A",)
+    if args.processes != 1:
+        from fortress_shard import enumerate_subdomains_sharded
+        try:
+            enumerate_subdomains_sharded(target_domain, wordlist_path, args.processes or None, args.resolver, args.concurrency, args.rate, record_types)
+        except KeyboardInterrupt:
+            print("\n[!] Interrupted.")
+        print("\n" + "="*50 + "\n")
+        sys.exit(0)
+    journal = None
+    if not args.no_journal:
+        journal = Journal(args.journal or journal_path("subenum", target_domain, os.path.abspath(wordlist_path), record_types), resume=args.resume)
+    try:
+        enumerate_subdomains(target_domain, subdomains_to_check, args.resolver, args.concurrency, args.rate, record_types, journal)
+    except KeyboardInterrupt:
+        print("\n[!] Interrupted. Progress is saved; re-run with --resume to continue.")
+    finally:
+        if journal:
+            journal.close()
     print("\n" + "="*50 + "\n") # Separator for scan
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import os
+import sys
+import random
+import socket
+import struct
+import bisect
+import ipaddress # For CIDR and address arithmetic
+
+from fortress_cache import resolve
+
+class PortSpace:
+    """
+    A set of ports stored as merged (start, end) ranges.
+    Supports len(), iteration and index -> port lookup without a port list.
+    """
+
+    def __init__(self, ranges):
+        merged = []
+        for start, end in sorted(ranges):
+            if not (0 < start <= end <= 65535):
+                raise ValueError(f"Invalid port range {start}-{end} (ports must be 1-65535)")
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.ranges = [tuple(r) for r in merged]
+        # Cumulative offsets let port_at() find the right range with one bisect
+        self._offsets = []
+        total = 0
+        for start, end in self.ranges:
+            self._offsets.append(total)
+            total += end - start + 1
+        self._count = total
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        Parses a port spec such as "1-1024", "22,80,443" or "22,8000-8100".
+        """
+        ranges = []
+        for part in str(spec).split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                start, end = part.split('-', 1)
+                ranges.append((int(start), int(end)))
+            else:
+                ranges.append((int(part), int(part)))
+        return cls(ranges)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for start, end in self.ranges:
+            yield from range(start, end + 1)
+
+    def port_at(self, index):
+        i = bisect.bisect_right(self._offsets, index) - 1
+        return self.ranges[i][0] + (index - self._offsets[i])
+
+    def __str__(self):
+        return ",".join(f"{s}-{e}" if s != e else str(s) for s, e in self.ranges)
+
+# TCP ports in order of how often they are found open: nmap's top 100 (from
+# its nmap-services frequencies), then other common service ports (databases,
+# message brokers, container and cluster APIs, admin panels) in rough order
+# of prevalence. top_ports() continues past the table with the remaining
+# ports in numeric order (so the rest of 1-1024 comes next).
+TOP_PORTS = (
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080, 1723, 111, 995, 993, 5900,
+    1025, 587, 8888, 199, 1720, 465, 548, 113, 81, 6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000, 32768, 554,
+    26, 1433, 49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153, 8081, 2049, 88, 79, 5800, 106,
+    2121, 1110, 49155, 6000, 513, 990, 5357, 427, 49156, 543, 544, 5101, 144, 7, 389, 8009, 3128, 444, 9999, 5009,
+    7070, 5190, 3000, 5432, 1900, 3986, 13, 1029, 9, 5051, 6646, 49157, 1028, 873, 1755, 2717, 4899, 9100, 119, 37,
+    # Beyond nmap's top 100
+    8082, 8090, 9000, 9090, 8001, 8088, 8181, 8880, 9443, 4443, 7001, 7443, 6379, 27017, 9200, 5601, 11211, 5672,
+    15672, 9092, 2375, 2376, 6443, 10250, 2379, 5985, 5986, 1521, 1434, 3268, 3269, 636, 989, 992, 994, 853, 5984,
+    1883, 8883, 502, 102, 20000, 1080, 3690, 9418, 5222, 5269, 6667, 4444, 8161, 4848, 50000, 8500, 8200, 9300, 5044,
+    9600, 8086, 3100, 9093, 9091, 10255, 2380, 8472, 4789, 30000, 8123, 1194, 1701, 1812, 500, 4500, 5061, 3478,
+    5938, 5500, 2082, 2083, 2086, 2087, 2095, 2096, 10443, 8834, 9390, 3780, 5353, 7547, 37777, 34567, 8291, 2222,
+    2200, 222, 6666, 7777, 9001, 9002, 18080, 28017, 7474, 7687, 8529, 9042, 9160, 7000, 26257, 5433, 6432, 3307,
+)
+
+class PortList:
+    """
+    Ports in a fixed order (e.g. most likely open first), with the same
+    len() / iteration / port_at() interface as PortSpace. ProbeSpace walks
+    an ordered port collection port by port instead of shuffling it in.
+    """
+
+    ordered = True
+
+    def __init__(self, ports, label=None):
+        self.ports = list(dict.fromkeys(ports))
+        for port in self.ports:
+            if not 0 < port <= 65535:
+                raise ValueError(f"Invalid port {port} (ports must be 1-65535)")
+        self.label = label
+
+    def __len__(self):
+        return len(self.ports)
+
+    def __iter__(self):
+        return iter(self.ports)
+
+    def port_at(self, index):
+        return self.ports[index]
+
+    def __str__(self):
+        return self.label or ",".join(map(str, self.ports))
+
+def top_ports(count):
+    """
+    The `count` ports most likely to be open, most likely first (see TOP_PORTS).
+    """
+    count = max(0, min(count, 65535))
+    ports = list(dict.fromkeys(TOP_PORTS))[:count]
+    if len(ports) < count:
+        listed = set(ports)
+        for port in range(1, 65536):
+            if port not in listed:
+                ports.append(port)
+                if len(ports) == count:
+                    break
+    return PortList(ports, f"top {count} ports")
+
+class HostSpace:
+    """
+    A set of targets stored as address blocks plus a (short) list of hostnames.
+    CIDRs and IP ranges are kept as (first address, count) so a /16 costs two ints.
+    """
+
+    def __init__(self):
+        self.blocks = [] # (version, first address as int, count)
+        self.names = [] # Hostnames that still need resolving
+        self._offsets = []
+        self._names_offset = 0
+        self._count = 0
+
+    @classmethod
+    def parse(cls, specs):
+        """
+        Builds a host space from target specs. Each spec may be a hostname, an IP,
+        a CIDR (10.0.0.0/24), a range (10.0.0.1-10.0.0.50 or 10.0.0.1-50), or a file
+        (e.g. target.txt) containing one spec per line.
+        """
+        space = cls()
+        if isinstance(specs, str):
+            specs = [specs]
+        for spec in specs:
+            space._add_spec(spec.strip())
+        space._reindex() # Once at the end; big target files would be quadratic otherwise
+        return space
+
+    def _add_spec(self, spec):
+        # Only collects blocks and names; parse() rebuilds the index afterwards
+        if not spec or spec.startswith('#'):
+            return
+        if '/' in spec and not os.path.isfile(spec):
+            network = ipaddress.ip_network(spec, strict=False)
+            hosts = network.num_addresses
+            first = int(network.network_address)
+            # Skip network and broadcast addresses for ordinary IPv4 subnets
+            if network.version == 4 and hosts > 2:
+                first, hosts = first + 1, hosts - 2
+            self.blocks.append((network.version, first, hosts))
+            return
+        if '-' in spec:
+            start, end = spec.split('-', 1)
+            try:
+                first = ipaddress.ip_address(start)
+            except ValueError:
+                first = None # A hostname that happens to contain a dash
+            if first is not None:
+                if '.' not in end and ':' not in end:
+                    # Short form: 10.0.0.1-50 only changes the last octet
+                    last = ipaddress.ip_address(start.rsplit('.', 1)[0] + '.' + end)
+                else:
+                    last = ipaddress.ip_address(end)
+                if last < first:
+                    raise ValueError(f"Invalid IP range '{spec}'")
+                self.blocks.append((first.version, int(first), int(last) - int(first) + 1))
+                return
+        try:
+            address = ipaddress.ip_address(spec)
+            self.blocks.append((address.version, int(address), 1))
+            return
+        except ValueError:
+            pass
+        # Addresses win over files so an IP that is also a file name (e.g. a saved
+        # nmap report) is still treated as a target
+        if os.path.isfile(spec):
+            with open(spec, 'r') as f:
+                for line in f:
+                    self._add_spec(line.strip())
+            return
+        self.names.append(spec)
+
+    def add_block(self, version, first, count):
+        self.blocks.append((version, first, count))
+        self._reindex()
+
+    def _reindex(self):
+        self._offsets = []
+        total = 0
+        for _, _, count in self.blocks:
+            self._offsets.append(total)
+            total += count
+        self._names_offset = total
+        self._count = total + len(self.names)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self.host_at(i)
+
+    def host_at(self, index):
+        if index >= self._names_offset:
+            return self.names[index - self._names_offset]
+        i = bisect.bisect_right(self._offsets, index) - 1
+        version, first, _ = self.blocks[i]
+        address = first + (index - self._offsets[i])
+        if version == 4:
+            return socket.inet_ntoa(struct.pack('!I', address))
+        return str(ipaddress.IPv6Address(address))
+
+    def resolved(self):
+        """
+        Returns a copy where hostnames are replaced by their IP addresses.
+        Names that do not resolve are reported and dropped.
+        """
+        space = HostSpace()
+        space.blocks = list(self.blocks)
+        for name in self.names:
+            try:
+                address = ipaddress.ip_address(resolve(name))
+                space.blocks.append((address.version, int(address), 1))
+            except socket.gaierror:
+                print(f"[!] Error: Could not resolve hostname '{name}'.")
+        space._reindex()
+        return space
+
+class ProbeSpace:
+    """
+    The cross product of a HostSpace and a PortSpace, walked in a pseudo-random
+    order without materializing it.
+
+    A keyed Feistel network is a bijection on [0, 2**bits); walking a counter
+    through it and skipping outputs >= len(self) ("cycle walking") yields every
+    (host, port) pair exactly once in shuffled order using O(1) memory. Adjacent
+    outputs land on different hosts, so load is spread across the targets.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, hosts, ports, seed=None):
+        self.hosts = hosts
+        self.ports = ports
+        self._host_count = len(hosts)
+        self._count = self._host_count * len(ports)
+        # Ordered ports (e.g. top_ports) are walked one port at a time, most
+        # likely first; only the hosts are shuffled, within each port
+        self.ordered = getattr(ports, "ordered", False)
+        bits = max(2, (self._host_count if self.ordered else self._count).bit_length())
+        bits += bits % 2 # The Feistel halves must be the same width
+        self._half_bits = bits // 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self._block = 1 << bits
+        self.domain = self._block * (len(ports) if self.ordered else 1) # Counter positions run over [0, domain)
+        rng = random.Random(seed)
+        self._keys = [rng.getrandbits(32) for _ in range(self.ROUNDS)]
+
+    def __len__(self):
+        return self._count
+
+    def _index(self, position):
+        # Probe index for a counter position (>= len(self) means skip it)
+        if not self.ordered:
+            return self._permute(position)
+        port_index, slot = divmod(position, self._block)
+        host_index = self._permute(slot)
+        if host_index >= self._host_count:
+            return self._count
+        return port_index * self._host_count + host_index
+
+    def _permute(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for key in self._keys:
+            mixed = ((right ^ key) * 0x45D9F3B) & 0xFFFFFFFF
+            mixed ^= mixed >> 16
+            left, right = right, left ^ (mixed & self._half_mask)
+        return (left << self._half_bits) | right
+
+    def probe_at(self, index):
+        """
+        Maps a probe index in [0, len(self)) to its (host, port) pair.
+        """
+        port_index, host_index = divmod(index, self._host_count)
+        return self.hosts.host_at(host_index), self.ports.port_at(port_index)
+
+    def iter_range(self, start=0, stop=None):
+        """
+        Yields the probes for counter positions [start, stop). Disjoint counter
+        ranges yield disjoint probes, which makes resuming and sharding trivial.
+        """
+        stop = self.domain if stop is None else min(stop, self.domain)
+        count = self._count
+        for position in range(start, stop):
+            index = self._index(position)
+            if index < count:
+                yield self.probe_at(index)
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def iter_positions(self, start=0, stop=None):
+        """
+        Like iter_range, but yields (position, probe) where position is the
+        counter position to restart from once this probe is finished.
+        """
+        stop = self.domain if stop is None else min(stop, self.domain)
+        count = self._count
+        for position in range(start, stop):
+            index = self._index(position)
+            if index < count:
+                yield position + 1, self.probe_at(index)
+
+def parse_targets(specs):
+    """
+    Parses target specs into a HostSpace, printing a friendly error on bad input.
+    """
+    try:
+        return HostSpace.parse(specs)
+    except ValueError as e:
+        print(f"[!] Invalid target specification: {e}")
+        sys.exit(1)
+
+def parse_ports(spec):
+    """
+    Parses a port spec into a PortSpace, printing a friendly error on bad input.
+    A "topN" part (e.g. "top100" or "top1000,8000-8100") selects the N most
+    likely open ports and makes the result a PortList in that order.
+    """
+    try:
+        parts = [part.strip() for part in str(spec).split(',') if part.strip()]
+        if not any(part.lower().startswith("top") for part in parts):
+            return PortSpace.parse(spec)
+        ports = []
+        for part in parts:
+            if part.lower().startswith("top"):
+                ports.extend(top_ports(int(part[3:])))
+            else:
+                ports.extend(PortSpace.parse(part))
+        return PortList(ports, spec if len(parts) > 1 else f"top {int(parts[0][3:])} ports")
+    except ValueError as e:
+        print(f"[!] Invalid port specification '{spec}': {e}")
+        print("    Use a range (e.g., 1-1024), a list (e.g., 22,80,443), the most common ports (e.g., top100) or a mix (e.g., top100,8000-8100).")
+        sys.exit(1)
@@ -0,0 +1,366 @@
+import ssl
+import sys
+import time
+import socket
+import asyncio
+import hashlib
+import argparse
+import warnings
+import threading
+from datetime import datetime, timezone
+from collections import OrderedDict
+
+from fortress_cache import resolve
+from fortress_scheduler import get_scheduler, stream_map, stream_map_async
+from fortress_targets import parse_targets, parse_ports
+from fortress_sink import emit, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import get_metrics, add_metrics_arguments, start_from_args as start_metrics
+
+# Attribute OIDs (DER-encoded, without tag/length) we name in subjects/issuers
+NAME_OIDS = {
+    b"\x55\x04\x03": "CN",
+    b"\x55\x04\x06": "C",
+    b"\x55\x04\x07": "L",
+    b"\x55\x04\x08": "ST",
+    b"\x55\x04\x0a": "O",
+    b"\x55\x04\x0b": "OU",
+}
+SAN_OID = b"\x55\x1d\x11" # 2.5.29.17 subjectAltName
+
+# Ports that speak TLS straight away (no STARTTLS), for picking ports out of scan results
+TLS_PORTS = {443, 465, 636, 853, 989, 990, 992, 993, 994, 995, 2376, 3269, 4443, 5061, 5986, 6443, 8443, 9443, 10250}
+
+metrics = get_metrics("tls") # Handshake counters and latency (see fortress_metrics)
+
+class CertificateError(ValueError):
+    """Raised for a certificate the DER reader cannot make sense of."""
+
+def _tlv(der, position):
+    # Reads one DER element; returns (tag, start of contents, end of contents)
+    if position + 2 > len(der):
+        raise CertificateError("truncated element")
+    tag = der[position]
+    length = der[position + 1]
+    position += 2
+    if length & 0x80: # Long form: the low bits say how many length bytes follow
+        count = length & 0x7f
+        length = int.from_bytes(der[position:position + count], "big")
+        position += count
+    if position + length > len(der):
+        raise CertificateError("element runs past the end")
+    return tag, position, position + length
+
+def _children(der, start, end):
+    # Yields (tag, start, end) for each element inside a constructed element
+    while start < end:
+        tag, inner, start = _tlv(der, start)
+        yield tag, inner, start
+
+def _text(der, tag, start, end):
+    # String types: BMPString is UTF-16, everything else is close enough to UTF-8
+    if tag == 0x1e:
+        return der[start:end].decode("utf-16-be", errors="replace")
+    return der[start:end].decode("utf-8", errors="replace")
+
+def _name(der, start, end):
+    # Name ::= SEQUENCE OF SET OF SEQUENCE { type OID, value string }
+    parts = []
+    for _, set_start, set_end in _children(der, start, end):
+        for _, attr_start, attr_end in _children(der, set_start, set_end):
+            attribute = list(_children(der, attr_start, attr_end))
+            if len(attribute) < 2:
+                continue
+            oid = der[attribute[0][1]:attribute[0][2]]
+            label = NAME_OIDS.get(oid)
+            if label:
+                parts.append((label, _text(der, *attribute[1])))
+    return parts
+
+def _time(der, tag, start, end):
+    text = der[start:end].decode("ascii", errors="replace").rstrip("Z")
+    if tag == 0x17: # UTCTime: two-digit year, 50-99 means 19xx
+        year = int(text[:2])
+        text = str(1900 + year if year >= 50 else 2000 + year) + text[2:]
+    return datetime.strptime(text[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+
+def _alt_names(der, start, end):
+    # GeneralNames: [2] dNSName and [7] iPAddress are the ones worth keeping
+    names = []
+    for tag, inner, stop in _children(der, start, end):
+        if tag == 0x82:
+            names.append(der[inner:stop].decode("ascii", errors="replace"))
+        elif tag == 0x87 and stop - inner in (4, 16):
+            names.append(socket.inet_ntop(socket.AF_INET if stop - inner == 4 else socket.AF_INET6, der[inner:stop]))
+    return names
+
+def parse_certificate(der):
+    """
+    Pulls the fields we care about out of a DER-encoded X.509 certificate:
+    subject, issuer, validity, serial and subjectAltNames. Only walks the
+    structure; nothing is verified.
+    """
+    try:
+        _, cert_start, cert_end = _tlv(der, 0)
+        _, tbs_start, tbs_end = _tlv(der, cert_start)
+        fields = list(_children(der, tbs_start, tbs_end))
+        if fields and fields[0][0] == 0xa0: # Explicit [0] version is optional (v1 certificates)
+            fields = fields[1:]
+        serial, _, issuer, validity, subject = fields[:5]
+        not_before, not_after = list(_children(der, validity[1], validity[2]))[:2]
+        sans = []
+        for tag, start, end in fields[5:]:
+            if tag != 0xa3: # [3] extensions
+                continue
+            _, ext_start, ext_end = _tlv(der, start)
+            for _, inner, stop in _children(der, ext_start, ext_end):
+                extension = list(_children(der, inner, stop))
+                if der[extension[0][1]:extension[0][2]] == SAN_OID:
+                    value = extension[-1] # OCTET STRING wrapping GeneralNames
+                    _, names_start, names_end = _tlv(der, value[1])
+                    sans = _alt_names(der, names_start, names_end)
+        subject_parts = _name(der, subject[1], subject[2])
+        issuer_parts = _name(der, issuer[1], issuer[2])
+        valid_from = _time(der, *not_before).isoformat()
+        valid_until = _time(der, *not_after).isoformat()
+    except CertificateError:
+        raise
+    except (ValueError, IndexError, OverflowError, UnicodeError) as e:
+        # Bad lengths, strings or dates anywhere in the certificate
+        raise CertificateError(f"unreadable certificate: {e}")
+
+    return {
+        "fingerprint": hashlib.sha256(der).hexdigest(),
+        "subject": ", ".join(f"{label}={value}" for label, value in subject_parts),
+        "common_name": next((value for label, value in subject_parts if label == "CN"), ""),
+        "issuer": ", ".join(f"{label}={value}" for label, value in issuer_parts),
+        "serial": der[serial[1]:serial[2]].hex(),
+        "not_before": valid_from,
+        "not_after": valid_until,
+        "sans": sans,
+        "self_signed": subject_parts == issuer_parts,
+    }
+
+class CertificateCache:
+    """
+    Parsed certificates keyed by SHA-256 fingerprint, least recently used
+    dropped first. Big scans see the same certificate on many hosts (CDNs,
+    wildcard certs, load balancers), so each one is only parsed once.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def parse(self, der):
+        fingerprint = hashlib.sha256(der).hexdigest()
+        with self._lock:
+            cert = self._entries.get(fingerprint)
+            if cert is not None:
+                self._entries.move_to_end(fingerprint)
+                self.hits += 1
+                return cert
+        cert = parse_certificate(der)
+        with self._lock:
+            self._entries[fingerprint] = cert
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cert
+
+    def __len__(self):
+        return len(self._entries)
+
+cert_cache = CertificateCache()
+
+def _client_context():
+    # We want whatever certificate is served, trusted or not, from old servers too
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning) # We only read certificates, old protocols are fine
+            context.minimum_version = ssl.TLSVersion.TLSv1
+        context.set_ciphers("ALL:@SECLEVEL=0")
+    except (ValueError, ssl.SSLError):
+        pass # Not supported by this OpenSSL build; keep its defaults
+    return context
+
+def _is_address(host):
+    try:
+        socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+        return True
+    except OSError:
+        return False
+
+def _describe_session(ssl_object, der, cache):
+    cert = dict(cache.parse(der)) # Copy: the cached dict is shared between hosts
+    cipher = ssl_object.cipher() or (None, None, None)
+    cert["protocol"] = ssl_object.version()
+    cert["cipher"] = cipher[0]
+    cert["bits"] = cipher[2]
+    return cert
+
+def get_certificate(host, port=443, timeout=5, cache=cert_cache):
+    """
+    Handshakes with host:port and returns the leaf certificate details (see
+    parse_certificate) plus the negotiated protocol and cipher. No HTTP
+    request is sent. Raises OSError/ssl.SSLError/CertificateError on failure.
+    """
+    ip = resolve(host)
+    with socket.create_connection((ip, port), timeout=timeout) as sock:
+        server_name = None if _is_address(host) else host
+        with _client_context().wrap_socket(sock, server_hostname=server_name) as tls:
+            der = tls.getpeercert(binary_form=True)
+            if not der:
+                raise CertificateError("server sent no certificate")
+            return _describe_session(tls, der, cache)
+
+async def _harvest_async(host, port, timeout, context, scheduler, cache):
+    loop = asyncio.get_running_loop()
+    try:
+        ip = await loop.run_in_executor(None, resolve, host) if not _is_address(host) else host
+    except (socket.gaierror, UnicodeError):
+        return host, port, None, "could not resolve"
+    if scheduler:
+        await scheduler.throttle(ip)
+    metrics.begin()
+    started = loop.time()
+    try:
+        # The handshake is all we need; close straight after, nothing is sent
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, port, ssl=context, server_hostname=None if _is_address(host) else host),
+            timeout)
+    except asyncio.TimeoutError:
+        metrics.end("timeout")
+        return host, port, None, "timed out"
+    except ssl.SSLError as e:
+        metrics.end("tls_error")
+        return host, port, None, f"TLS handshake failed: {e.reason or e}"
+    except ConnectionRefusedError:
+        metrics.end("refused")
+        return host, port, None, "connection refused"
+    except OSError as e:
+        metrics.end("error")
+        return host, port, None, e.strerror or str(e)
+    except (ValueError, OverflowError, UnicodeError) as e:
+        # Bad address, port or server name
+        metrics.end("error")
+        return host, port, None, str(e) or type(e).__name__
+    metrics.end("handshake", loop.time() - started)
+    try:
+        ssl_object = writer.get_extra_info("ssl_object")
+        der = ssl_object.getpeercert(binary_form=True)
+        if not der:
+            return host, port, None, "server sent no certificate"
+        return host, port, _describe_session(ssl_object, der, cache), None
+    except CertificateError as e:
+        return host, port, None, str(e)
+    finally:
+        writer.close()
+
+def _harvester(timeout, scheduler, cache):
+    # The per-pair coroutine function shared by the async and blocking harvests
+    scheduler = scheduler or get_scheduler()
+    context = _client_context()
+
+    async def harvest(pair):
+        host, port = pair
+        return await _harvest_async(host, int(port), timeout, context, scheduler, cache)
+
+    return harvest
+
+async def harvest_certificates_async(pairs, concurrency=200, timeout=5, scheduler=None, cache=cert_cache):
+    """
+    Async generator handshaking with many (host, port) pairs, up to
+    `concurrency` at a time. Yields (host, port, certificate dict or None,
+    error message or None) as each handshake finishes.
+    """
+    async for result in stream_map_async(pairs, concurrency, _harvester(timeout, scheduler, cache)):
+        yield result
+
+def harvest_certificates(pairs, concurrency=200, timeout=5, scheduler=None, cache=cert_cache):
+    """
+    Blocking generator around harvest_certificates_async.
+    """
+    return stream_map(pairs, concurrency, _harvester(timeout, scheduler, cache))
+
+def report_certificate(host, port, cert, error):
+    """
+    Reports one harvest result. Returns True if a certificate was read.
+    """
+    if error:
+        emit("certificate", f"[-] {host}:{port}: {error}", host=host, port=port, error=error)
+        return False
+    lines = [
+        f"[+] {host}:{port}: {cert['subject'] or '(empty subject)'} ({cert['protocol']}, {cert['cipher']})",
+        f"    Issuer:  {cert['issuer']}{' [self-signed]' if cert['self_signed'] else ''}",
+        f"    Expires: {cert['not_after']}",
+    ]
+    if cert["sans"]:
+        lines.append(f"    SANs:    {', '.join(cert['sans'])}")
+    emit("certificate", "\n".join(lines), host=host, port=port, **cert)
+    return True
+
+def new_names(cert, domain=None):
+    """
+    DNS names from a certificate (CN and SANs) worth feeding back into
+    subdomain enumeration, optionally limited to `domain`. Wildcards are
+    reduced to their parent name.
+    """
+    names = set()
+    for name in [cert.get("common_name", "")] + cert.get("sans", []):
+        name = name.lower().rstrip(".")
+        if name.startswith("*."):
+            name = name[2:]
+        if not name or " " in name or _is_address(name):
+            continue
+        if domain and name != domain and not name.endswith("." + domain):
+            continue
+        names.add(name)
+    return names
+
+if __name__ == "__main__":
+    print("--- Tech Fortress TLS Certificate Harvester ---")
+    print("This tool collects TLS certificates (subject, SANs, issuer, expiry) from HTTPS and other TLS ports.")
+
+    parser = argparse.ArgumentParser(description="TLS Certificate Harvester.")
+    parser.add_argument("-t", "--target", help="Target IP/hostname, CIDR, IP range or target file")
+    parser.add_argument("-p", "--port", default="443", help="Port(s) to handshake with (default: 443)")
+    parser.add_argument("-i", "--input", help="Read host:port pairs from a file, or '-' for stdin (e.g., piped scanner output)")
+    parser.add_argument("--timeout", type=float, default=5, help="Connect and handshake timeout in seconds (default: 5)")
+    parser.add_argument("-c", "--concurrency", type=int, default=200, help="Handshakes in flight (default: 200)")
+    parser.add_argument("-d", "--domain", help="Print the names found under this domain at the end (for subdomain enumeration)")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    start_metrics(args)
+
+    if args.input:
+        from fortress_bannergrab import read_pairs
+        stream = sys.stdin if args.input == "-" else open(args.input, "r")
+        pairs = read_pairs(stream)
+    elif args.target:
+        hosts = parse_targets(args.target)
+        ports = parse_ports(args.port)
+        pairs = ((host, port) for host in hosts for port in ports)
+    else:
+        parser.error("give -t, or -i")
+
+    started = time.monotonic()
+    harvested = total = 0
+    names = set()
+    for host, port, cert, error in harvest_certificates(pairs, args.concurrency, args.timeout):
+        total += 1
+        if report_certificate(host, port, cert, error):
+            harvested += 1
+            names |= new_names(cert, args.domain)
+    flush_results()
+    print(f"\n[*] Read {harvested} certificates ({len(cert_cache)} distinct) from {total} endpoints in {time.monotonic() - started:.1f}s.")
+    if args.domain and names:
+        print(f"[+] Names under {args.domain}:")
+        for name in sorted(names):
+            print(f"    {name}")
+    print("\n" + "="*50 + "\n")
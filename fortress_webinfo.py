@@ -1,7 +1,142 @@
 import requests # New library for making HTTP requests
+import re
 import sys
+import html
+import time
+import codecs
+import argparse
+from concurrent.futures import wait, FIRST_COMPLETED
 from urllib.parse import urlparse # To help with URL validation
 
+from fortress_cache import install_requests_hook
+from fortress_dirbuster import make_session
+from fortress_scheduler import ProbeScheduler, get_scheduler
+from fortress_sink import emit, flush as flush_results, add_output_arguments, configure_from_args
+from fortress_metrics import get_metrics, add_metrics_arguments, start_from_args as start_metrics
+
+install_requests_hook() # Resolve request hosts through the shared cache
+
+MAX_BYTES = 65536 # Stop reading a page after this much if no </title> turned up
+DRAIN_LIMIT = 16384 # Finish reading up to this much more so the connection can be reused
+
+metrics = get_metrics("web") # Request counters and latency (see fortress_metrics)
+
+class TitleParser:
+    """
+    Finds the <title> of an HTML page fed to it chunk by chunk, matching tags
+    in any case and across chunk boundaries. Only a few bytes before the
+    title and the title itself are kept, however large the page is.
+    feed() returns True once the title is complete.
+    """
+
+    def __init__(self, max_title=1024):
+        self.max_title = max_title
+        self.done = False
+        self._pending = b"" # Unmatched bytes that may be the start of a tag
+        self._title = None # Title bytes once <title> has been seen
+
+    def feed(self, chunk):
+        if self.done:
+            return True
+        if self._title is None:
+            data = self._pending + chunk
+            lower = data.lower()
+            position = 0
+            while True:
+                start = lower.find(b"<title", position)
+                if start < 0:
+                    self._pending = data[-6:] # Long enough for a split "<title"
+                    return False
+                close = lower.find(b">", start)
+                if close < 0:
+                    # The tag continues in the next chunk (attributes are short; give up past 256 bytes)
+                    self._pending = data[start:] if len(data) - start < 256 else b""
+                    return False
+                if lower[start + 6:start + 7] in (b">", b" ", b"\t", b"\r", b"\n", b"/"):
+                    break
+                position = start + 1 # Something like <titlebar>; keep looking
+            self._title = bytearray()
+            self._pending = b""
+            chunk = data[close + 1:]
+        seen = len(self._title)
+        self._title += chunk
+        end = self._title.lower().find(b"</title", max(0, seen - 7))
+        if end >= 0:
+            del self._title[end:]
+            self.done = True
+        elif len(self._title) >= self.max_title:
+            del self._title[self.max_title:]
+            self.done = True
+        return self.done
+
+    def title(self, encoding="utf-8"):
+        """
+        The title text (entities decoded, whitespace collapsed), or None.
+        """
+        if self._title is None:
+            return None
+        text = bytes(self._title).decode(encoding, errors="replace")
+        return " ".join(html.unescape(text).split())
+
+def _charset(response):
+    found = re.search(r"charset=[\"']?([\w.:-]+)", response.headers.get("Content-Type", ""), re.IGNORECASE)
+    if found:
+        try:
+            return codecs.lookup(found.group(1)).name
+        except LookupError:
+            pass # Unknown charset; utf-8 with replacement characters is the best guess
+    return "utf-8"
+
+_session = None
+
+def fetch_web_info(url, session=None, timeout=5, max_bytes=MAX_BYTES):
+    """
+    Fetches a URL and returns a dict with its status, headers and title.
+    The body is streamed and reading stops as soon as </title> is seen or
+    `max_bytes` have arrived, so a huge page costs no more than its head.
+    Raises requests exceptions on failure.
+    """
+    global _session
+    if session is None:
+        _session = _session or make_session(10, hosts=10)
+        session = _session
+    metrics.begin()
+    started = time.monotonic()
+    try:
+        response = session.get(url, timeout=timeout, stream=True)
+    except requests.exceptions.RequestException as e:
+        metrics.end("timeout" if isinstance(e, requests.exceptions.Timeout) else "error")
+        raise
+    metrics.end(f"http_{response.status_code // 100}xx", time.monotonic() - started) # Time to the response headers
+    parser = TitleParser()
+    received = 0
+    complete = False
+    try:
+        for chunk in response.iter_content(8192):
+            received += len(chunk)
+            if parser.feed(chunk) or received >= max_bytes:
+                break
+        else:
+            complete = True
+        if not complete:
+            # A small leftover is cheaper to read than a new connection later
+            length = response.headers.get("Content-Length", "")
+            if length.isdigit() and int(length) - response.raw.tell() <= DRAIN_LIMIT:
+                for _ in response.iter_content(DRAIN_LIMIT):
+                    pass
+    finally:
+        response.close() # Back to the pool if fully read, otherwise the socket is dropped
+    return {
+        "url": url,
+        "final_url": response.url,
+        "status": response.status_code,
+        "reason": response.reason,
+        "headers": dict(response.headers),
+        "title": parser.title(_charset(response)),
+        "bytes": received,
+        "complete": complete,
+    }
+
 def get_web_info(url):
     """
     Connects to a URL, fetches HTTP headers, and the page title.
@@ -9,37 +144,128 @@ def get_web_info(url):
     print(f"\n[*] Gathering web information for: {url}")
     try:
         # Add a timeout to prevent hanging
-        response = requests.get(url, timeout=5)
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+        info = fetch_web_info(url, timeout=5)
+        if info["status"] >= 400: # Bad responses (4xx or 5xx)
+            print(f"[!] HTTP Error for {url}: {info['status']} {info['reason']} (Status Code: {info['status']})")
+            return None
 
         print("\n--- HTTP Headers ---")
-        for header, value in response.headers.items():
+        for header, value in info["headers"].items():
             print(f"    {header}: {value}")
 
         # Get the page title
-        title = "Not Found"
-        if "<title>" in response.text and "</title>" in response.text:
-            start = response.text.find("<title>") + len("<title>")
-            end = response.text.find("</title>")
-            title = response.text[start:end].strip()
         print(f"\n--- Page Title ---")
-        print(f"    Title: {title}")
+        print(f"    Title: {info['title'] or 'Not Found'}")
+        return info
 
     except requests.exceptions.Timeout:
         print(f"[!] Request timed out for {url}. The server took too long to respond.")
     except requests.exceptions.ConnectionError:
         print(f"[!] Failed to connect to {url}. Check if the URL is correct or if the host is reachable.")
-    except requests.exceptions.HTTPError as err:
-        print(f"[!] HTTP Error for {url}: {err} (Status Code: {response.status_code})")
     except requests.exceptions.RequestException as e:
         print(f"[!] An unexpected error occurred during the request for {url}: {e}")
     except Exception as e:
         print(f"[!] An unexpected error occurred: {e}")
 
+def iter_web_info(urls, workers=20, timeout=5, max_bytes=MAX_BYTES, session=None, scheduler=None):
+    """
+    Runs fetch_web_info over many URLs with up to `workers` requests in flight
+    over one pooled session. Yields (url, info dict or exception) in
+    completion order. URLs are read lazily, a bounded number at a time, and
+    requests go through a ProbeScheduler (the process-wide one if configured)
+    so its rate and per-host limits apply.
+    """
+    session = session or make_session(workers, hosts=workers)
+    own_scheduler = scheduler is None and get_scheduler() is None
+    scheduler = scheduler or get_scheduler() or ProbeScheduler(workers=workers)
+
+    def fetch(url):
+        try:
+            return url, fetch_web_info(url, session, timeout, max_bytes)
+        except Exception as e:
+            return url, e
+
+    urls = iter(urls)
+    in_flight = set()
+    try:
+        while True:
+            while len(in_flight) < workers * 2:
+                url = next(urls, None)
+                if url is None:
+                    break
+                in_flight.add(scheduler.submit(urlparse(url).netloc, fetch, url))
+            if not in_flight:
+                return
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+        if own_scheduler:
+            scheduler.shutdown()
+
+def report_web_info(url, result):
+    """
+    Reports one bulk result. Returns True if the server answered.
+    """
+    if isinstance(result, requests.exceptions.Timeout):
+        emit("web", f"[-] {url}: timed out", url=url, error="timed out")
+        return False
+    if isinstance(result, requests.exceptions.ConnectionError):
+        emit("web", f"[-] {url}: connection failed", url=url, error="connection failed")
+        return False
+    if isinstance(result, Exception):
+        emit("web", f"[!] {url}: {result}", url=url, error=str(result))
+        return False
+    server = result["headers"].get("Server")
+    details = f" [{server}]" if server else ""
+    emit("web", f"[+] {url} ({result['status']} {result['reason']}){details} Title: {result['title'] or 'Not Found'}",
+         url=url, final_url=result["final_url"], status=result["status"], server=server, title=result["title"])
+    return True
+
+def read_urls(stream):
+    """
+    Yields URLs from lines of text, adding http:// to bare host names.
+    """
+    for line in stream:
+        url = line.strip()
+        if not url or url.startswith("#"):
+            continue
+        yield url if "://" in url else "http://" + url
+
 if __name__ == "__main__":
     print("--- Tech Fortress Web Info Gatherer Module ---")
     print("This tool fetches HTTP headers and page titles from a given URL.")
 
+    parser = argparse.ArgumentParser(description="Web Info Gatherer. With no URLs, asks for them one at a time.")
+    parser.add_argument("urls", nargs="*", help="URLs to check (e.g., http://example.com)")
+    parser.add_argument("-f", "--file", help="Read URLs (one per line) from a file, or '-' for stdin")
+    parser.add_argument("-c", "--workers", type=int, default=20, help="Requests in flight for bulk checks (default: 20)")
+    parser.add_argument("--timeout", type=float, default=5, help="Per-request timeout in seconds (default: 5)")
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES, help=f"Most body bytes to read per page (default: {MAX_BYTES})")
+    add_output_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    start_metrics(args)
+
+    if args.file or len(args.urls) > 1:
+        urls = list(read_urls(args.urls))
+        if args.file:
+            stream = sys.stdin if args.file == "-" else open(args.file, "r")
+            urls = read_urls(stream) if not urls else urls + list(read_urls(stream))
+        answered = total = 0
+        for url, result in iter_web_info(urls, args.workers, args.timeout, args.max_bytes):
+            total += 1
+            answered += report_web_info(url, result)
+        flush_results()
+        print(f"\n[*] {answered} of {total} URLs answered.")
+        sys.exit(0)
+    if args.urls:
+        get_web_info(next(read_urls(args.urls)))
+        sys.exit(0)
+
     while True:
         target_url = input("Enter target URL (e.g., http://example.com or 'exit' to quit): ").strip()
 
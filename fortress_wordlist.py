@@ -0,0 +1,137 @@
+import os
+import mmap
+
+class BloomFilter:
+    """
+    Blocked Bloom filter: each entry sets 7 bits inside one 64-bit word of a
+    bytearray, so a lookup is a single read-modify-write. At one word per
+    expected entry roughly 3 in 100,000 new entries are wrongly reported as
+    seen (measured on a full million-entry filter); in exchange a
+    million-entry wordlist needs 8 MB instead of a set of Python strings.
+    Uses the per-process hash(), so a filter never outlives the process
+    that built it.
+    """
+
+    def __init__(self, expected):
+        self.blocks = max(1024, expected)
+        self.words = memoryview(bytearray(8 * self.blocks)).cast("Q")
+
+    def add(self, item):
+        """
+        Adds `item` (bytes). Returns True if it was (probably) already present.
+        """
+        h = hash(item)
+        block = h % self.blocks
+        m = h >> 20
+        mask = ((1 << (m & 63)) | (1 << ((m >> 6) & 63)) | (1 << ((m >> 12) & 63)) | (1 << ((m >> 18) & 63))
+                | (1 << ((m >> 24) & 63)) | (1 << ((m >> 30) & 63)) | (1 << ((m >> 36) & 63)))
+        word = self.words[block]
+        if word & mask == mask:
+            return True
+        self.words[block] = word | mask
+        return False
+
+class Wordlist:
+    """
+    A wordlist streamed lazily from a memory-mapped file.
+
+    Entries are stripped, blank lines are skipped and (optionally) duplicates are
+    dropped via a Bloom filter. `offset` starts at a byte position (rounded up to
+    the next line), `shard=(n, m)` selects the n-th of m byte-balanced slices
+    (0-based; a line belongs to the slice its first byte falls in). Iterating
+    twice re-reads the file, so recursion and retries can reuse one object.
+    Call close() (or use it in a with block) to release the mapping.
+    """
+
+    def __init__(self, path, dedupe=True, offset=0, shard=None):
+        self.path = path
+        self.dedupe = dedupe
+        with open(path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # The mapping keeps its own reference to the file, so it can be closed right away
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        start, stop = offset, self.size
+        if shard is not None:
+            index, total = shard
+            if not 0 <= index < total:
+                raise ValueError(f"Invalid shard {index} of {total}")
+            start = max(start, self.size * index // total)
+            stop = self.size * (index + 1) // total
+        self.start = self._align(start)
+        self.stop = self._align(stop)
+        self._count = None
+
+    def _align(self, position):
+        # Round a byte position up to the start of the next line
+        if position <= 0:
+            return 0
+        if position >= self.size:
+            return self.size
+        newline = self._mm.find(b"\n", position - 1)
+        return self.size if newline < 0 else newline + 1
+
+    def iter_with_offsets(self, start=0):
+        """
+        Yields (offset, entry) where offset is the byte position just past the
+        entry's line, i.e. where a resumed run should start. `start` skips
+        ahead to such an offset.
+        """
+        mm = self._mm
+        position, stop = max(self.start, self._align(start)), self.stop
+        seen = BloomFilter(len(self)) if self.dedupe else None
+        while position < stop:
+            newline = mm.find(b"\n", position, stop)
+            end = stop if newline < 0 else newline + 1
+            raw = mm[position:end].strip()
+            position = end
+            if not raw or (seen is not None and seen.add(raw)):
+                continue
+            yield position, raw.decode("utf-8", errors="ignore")
+
+    def __iter__(self):
+        for _, entry in self.iter_with_offsets():
+            yield entry
+
+    def count(self):
+        """
+        Number of lines in the selected range, counted straight from the mapping
+        (blank lines and duplicates included; nothing is decoded or stored).
+        """
+        if self._count is None:
+            chunk = 1 << 20
+            total = 0
+            for position in range(self.start, self.stop, chunk):
+                total += self._mm[position:min(position + chunk, self.stop)].count(b"\n")
+            if self.stop > self.start and self._mm[self.stop - 1:self.stop] != b"\n":
+                total += 1 # Last line without a trailing newline
+            self._count = total
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def close(self):
+        if self.size:
+            self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_wordlist(filepath, dedupe=True, offset=0, shard=None):
+    """
+    Opens a wordlist for lazy iteration (see Wordlist).
+    Returns an empty list if the file cannot be opened.
+    """
+    try:
+        wordlist = Wordlist(filepath, dedupe, offset, shard)
+        print(f"[*] Loaded {len(wordlist)} items from wordlist: {filepath}")
+        return wordlist
+    except FileNotFoundError:
+        print(f"[!] Error: Wordlist file not found at '{filepath}'.")
+        return [] # Return empty list instead of sys.exit for integration
+    except Exception as e:
+        print(f"[!] An error occurred while loading wordlist: {e}")
+        return [] # Return empty list for integration